@@ -1,14 +1,20 @@
+import math
 import uuid
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, WebSocketException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
+from app.core.config import settings
 from app.core.database import get_db
+from app.core.rate_limit import MemorySlidingWindow, RedisSlidingWindow
 from app.core.security import decode_token
 from app.core.redis_client import get_redis
+from app.models.group import GroupMember
 from app.models.user import User
+from app.services import sessions
+from app.services.presence import presence
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
@@ -27,10 +33,132 @@ async def get_current_user(
     user_id = payload.get("sub")
     if not user_id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido")
+    # Logout de todas as sessões: consulta só o cache local do worker
+    if sessions.revocations.is_revoked(user_id, payload.get("iat")):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Sessão encerrada")
 
     result = await db.execute(select(User).where(User.id == uuid.UUID(user_id)))
     user = result.scalar_one_or_none()
     if user is None or not user.is_active:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Usuário não encontrado")
 
+    # get_db fixa o usuário no primário se a requisição gravar algo (read-your-writes)
+    db.info["user_id"] = user.id
+    # last_seen_at vai para o banco no flush periódico da presença, não nesta requisição
+    presence.touch(user.id)
     return user
+
+
+async def is_group_member(db: AsyncSession, group_id: uuid.UUID, user_id: uuid.UUID) -> bool:
+    result = await db.execute(
+        select(GroupMember.id).where(
+            GroupMember.group_id == group_id,
+            GroupMember.user_id == user_id,
+        )
+    )
+    return result.scalar_one_or_none() is not None
+
+
+async def require_group_member(db: AsyncSession, group_id: str, user: User) -> uuid.UUID:
+    """Valida o group_id e garante que o usuário é membro. Retorna o UUID do grupo."""
+    try:
+        gid = uuid.UUID(group_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ID de grupo inválido")
+
+    if not await is_group_member(db, gid, user.id):
+        raise HTTPException(status_code=403, detail="Você não é membro deste grupo")
+    return gid
+
+
+async def user_group_ids(db: AsyncSession, user_id: uuid.UUID) -> list[uuid.UUID]:
+    result = await db.execute(select(GroupMember.group_id).where(GroupMember.user_id == user_id))
+    return list(result.scalars().all())
+
+
+async def authenticate_ws_user(db: AsyncSession, token: str) -> User:
+    """Autentica um WebSocket (token via query param). Fecha com 4001 se o token/usuário for inválido."""
+    try:
+        payload = decode_token(token)
+        uid = uuid.UUID(payload.get("sub") or "")
+    except (HTTPException, ValueError):
+        raise WebSocketException(code=4001)
+    if sessions.revocations.is_revoked(str(uid), payload.get("iat")):
+        raise WebSocketException(code=4001)
+
+    result = await db.execute(select(User).where(User.id == uid))
+    user = result.scalar_one_or_none()
+    if user is None or not user.is_active:
+        raise WebSocketException(code=4001)
+    db.info["user_id"] = user.id
+    return user
+
+
+async def authenticate_ws(db: AsyncSession, token: str, group_id: str) -> tuple[User, uuid.UUID]:
+    """
+    Autentica um WebSocket (token via query param) e verifica membership no grupo.
+    Fecha com 4001 se o token/usuário for inválido e 4003 se não for membro.
+    """
+    user = await authenticate_ws_user(db, token)
+    try:
+        gid = uuid.UUID(group_id)
+    except ValueError:
+        raise WebSocketException(code=4003)
+
+    if not await is_group_member(db, gid, user.id):
+        raise WebSocketException(code=4003)
+
+    return user, gid
+
+
+# ── Rate limiting ────────────────────────────────────────────────────────────
+
+_rate_limiter: RedisSlidingWindow | None = None
+
+
+async def get_rate_limiter() -> RedisSlidingWindow | MemorySlidingWindow:
+    """Limiter compartilhado (script Lua registrado uma vez). Os testes trocam pelo MemorySlidingWindow."""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RedisSlidingWindow(await get_redis())
+    return _rate_limiter
+
+
+async def _request_email(request: Request) -> str | None:
+    """E-mail da tentativa: campo username (form do login) ou email (JSON do register)."""
+    try:
+        if request.headers.get("content-type", "").startswith("application/json"):
+            email = (await request.json()).get("email")
+        else:
+            email = (await request.form()).get("username")
+    except (ValueError, AttributeError):
+        return None
+    return email.strip().lower() if isinstance(email, str) and email.strip() else None
+
+
+def rate_limit(scope: str, by_email: bool = True):
+    """
+    Dependency que limita as tentativas por IP e, com by_email, pelo e-mail do
+    corpo — uma única verificação atômica no Redis (app/core/rate_limit.py).
+    Acima do limite: 429 com Retry-After.
+    """
+    async def check(
+        request: Request,
+        limiter: RedisSlidingWindow | MemorySlidingWindow = Depends(get_rate_limiter),
+    ) -> None:
+        if not settings.RATE_LIMIT_ENABLED:
+            return
+        ip = request.client.host if request.client else "unknown"
+        limits = [(f"rl:{scope}:ip:{ip}", settings.AUTH_RATE_LIMIT_PER_IP)]
+        if by_email and (email := await _request_email(request)):
+            limits.append((f"rl:{scope}:email:{email}", settings.AUTH_RATE_LIMIT_PER_EMAIL))
+
+        retry = await limiter.hit(limits, settings.AUTH_RATE_WINDOW_SECONDS)
+        if retry:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Muitas tentativas; tente novamente mais tarde",
+                headers={"Retry-After": str(math.ceil(retry))},
+            )
+
+    return check
@@ -13,12 +13,14 @@ from app.core.config import settings
 from app.core.database import get_db
 from app.core.security import (
     hash_password, verify_password,
-    create_access_token, create_refresh_token, decode_token,
+    create_access_token, create_refresh_token, decode_token, get_token_service,
     OAUTH_PROVIDERS,
 )
 from app.core.redis_client import get_redis
-from app.api.dependencies import get_current_user
+from app.api.dependencies import get_current_user, rate_limit
 from app.models.user import User
+from app.services import sessions
+from app.services.presence import presence
 
 router = APIRouter()
 
@@ -55,11 +57,14 @@ class RefreshRequest(BaseModel):
 
 # ── Helper ───────────────────────────────────────────────
 
-def _build_login_response(user: User) -> LoginResponse:
+async def _build_login_response(user: User, session: dict | None = None) -> LoginResponse:
+    """Par de tokens; sem session (fid/jti de uma rotação), abre uma sessão nova."""
     user_id = str(user.id)
+    if session is None:
+        session = await sessions.start(await get_redis(), user.id)
     return LoginResponse(
-        access_token=create_access_token({"sub": user_id}),
-        refresh_token=create_refresh_token({"sub": user_id}),
+        access_token=create_access_token({"sub": user_id, "sid": session["fid"]}),
+        refresh_token=create_refresh_token({"sub": user_id, **session}),
         user=UserOut(
             id=user_id,
             name=user.name,
@@ -71,7 +76,8 @@ def _build_login_response(user: User) -> LoginResponse:
 
 # ── Endpoints ────────────────────────────────────────────
 
-@router.post("/register", response_model=LoginResponse, status_code=201)
+@router.post("/register", response_model=LoginResponse, status_code=201,
+             dependencies=[Depends(rate_limit("register"))])
 async def register(data: RegisterRequest, db: AsyncSession = Depends(get_db)):
     """Cadastro com e-mail e senha."""
     result = await db.execute(select(User).where(User.email == data.email))
@@ -89,10 +95,10 @@ async def register(data: RegisterRequest, db: AsyncSession = Depends(get_db)):
     await db.flush()
     await db.refresh(user)
 
-    return _build_login_response(user)
+    return await _build_login_response(user)
 
 
-@router.post("/login", response_model=LoginResponse)
+@router.post("/login", response_model=LoginResponse, dependencies=[Depends(rate_limit("login"))])
 async def login(
     form: OAuth2PasswordRequestForm = Depends(),
     db: AsyncSession = Depends(get_db),
@@ -107,12 +113,13 @@ async def login(
     if not user.is_active:
         raise HTTPException(status_code=403, detail="Conta desativada")
 
-    user.last_seen_at = datetime.now(UTC).replace(tzinfo=None)
+    presence.touch(user.id)
 
-    return _build_login_response(user)
+    return await _build_login_response(user)
 
 
-@router.post("/social-login", response_model=LoginResponse)
+@router.post("/social-login", response_model=LoginResponse,
+             dependencies=[Depends(rate_limit("social-login", by_email=False))])
 async def social_login(data: SocialLoginRequest, db: AsyncSession = Depends(get_db)):
     """Login/cadastro via provedor OAuth."""
     verify_fn = OAUTH_PROVIDERS.get(data.provider)
@@ -136,12 +143,15 @@ async def social_login(data: SocialLoginRequest, db: AsyncSession = Depends(get_
         await db.flush()
         await db.refresh(user)
 
-    return _build_login_response(user)
+    return await _build_login_response(user)
 
 
 @router.post("/refresh", response_model=LoginResponse)
 async def refresh_token(data: RefreshRequest, db: AsyncSession = Depends(get_db)):
-    """Renova o access token usando o refresh token."""
+    """
+    Renova o par de tokens. O refresh token é de uso único: a resposta traz
+    outro, e reapresentar o antigo encerra a sessão (app/services/sessions.py).
+    """
     payload = decode_token(data.refresh_token)
     if payload.get("type") != "refresh":
         raise HTTPException(status_code=401, detail="Token inválido")
@@ -152,12 +162,13 @@ async def refresh_token(data: RefreshRequest, db: AsyncSession = Depends(get_db)
     if user is None or not user.is_active:
         raise HTTPException(status_code=401, detail="Usuário não encontrado")
 
-    return _build_login_response(user)
+    session = await sessions.rotate(await get_redis(), payload)
+    return await _build_login_response(user, session)
 
 
 @router.post("/logout", status_code=204)
 async def logout(authorization: str = Header(...)):
-    """Invalida o access token adicionando-o à blacklist no Redis."""
+    """Invalida o access token (blacklist no Redis) e encerra a sessão do dispositivo."""
     if not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Header Authorization inválido")
 
@@ -169,10 +180,29 @@ async def logout(authorization: str = Header(...)):
         now = int(datetime.now(UTC).timestamp())
         ttl = max(exp - now, 1)
     except HTTPException:
+        payload = {}
         ttl = 3600  # fallback: blacklista por 1h mesmo expirado
 
     redis = await get_redis()
     await redis.setex(f"bl:{token}", ttl, "1")
+    # Encerra também a sessão (refresh token) deste dispositivo
+    if payload.get("sid"):
+        await sessions.end(redis, payload["sub"], payload["sid"])
+
+
+@router.post("/logout-all", status_code=204)
+async def logout_all(current_user: User = Depends(get_current_user)):
+    """Encerra todas as sessões do usuário (todos os dispositivos, inclusive este)."""
+    await sessions.revoke_all(await get_redis(), current_user.id)
+
+
+@router.get("/jwks")
+async def jwks():
+    """Chave pública para outros serviços validarem os tokens (só com EdDSA/ES256)."""
+    service = get_token_service()
+    if not service.asymmetric:
+        raise HTTPException(status_code=404, detail="Tokens assinados com chave simétrica")
+    return service.jwks()
 
 
 @router.get("/me", response_model=UserOut)
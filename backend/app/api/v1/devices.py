@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.dependencies import get_current_user
+from app.core.database import get_db
+from app.core.redis_client import get_redis
+from app.models.user import User
+from app.services import devices
+
+router = APIRouter()
+
+
+class RegisterDeviceRequest(BaseModel):
+    device_id: str = Field(..., min_length=1, max_length=128)
+    token:     str = Field(..., min_length=1, max_length=512)
+    platform:  str | None = None   # android | ios
+
+
+@router.post("/", status_code=200)
+async def register_device(
+    data: RegisterDeviceRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Cadastra ou atualiza o token FCM do dispositivo (idempotente)."""
+    device = await devices.register(
+        db, await get_redis(), current_user.id, data.device_id, data.token, data.platform,
+    )
+    return {"device_id": device.device_id, "platform": device.platform}
+
+
+@router.delete("/{device_id}", status_code=204)
+async def unregister_device(
+    device_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Remove o token do dispositivo (logout ou push desativado)."""
+    if not await devices.unregister(db, await get_redis(), current_user.id, device_id):
+        raise HTTPException(status_code=404, detail="Dispositivo não encontrado")
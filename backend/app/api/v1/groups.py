@@ -5,13 +5,16 @@ from typing import List
 from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
 from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from app.api.dependencies import get_current_user
-from app.core.database import get_db
+from app.api.dependencies import get_current_user, require_group_member
+from app.core.database import get_db, get_read_db
+from app.core.redis_client import get_redis
 from app.models.group import Group, GroupMember, GroupRole
 from app.models.user import User
+from app.services import devices, presence, roster
 
 router = APIRouter()
 
@@ -114,7 +117,7 @@ async def create_group(
 
 @router.get("/", status_code=200)
 async def list_groups(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_user),
 ):
     """Listar grupos do usuário autenticado."""
@@ -128,6 +131,17 @@ async def list_groups(
     return [_group_to_out(g) for g in groups]
 
 
+@router.get("/{group_id}/online", status_code=200)
+async def online_members(
+    group_id: str,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Membros com heartbeat recente no grupo (um ZRANGEBYSCORE no Redis)."""
+    gid = await require_group_member(db, group_id, current_user)
+    return {"group_id": group_id, "online": await presence.online(await get_redis(), gid)}
+
+
 @router.post("/join", status_code=200)
 async def join_group(
     data: JoinGroupRequest,
@@ -156,7 +170,15 @@ async def join_group(
         role=GroupRole.member,
     )
     db.add(member)
-    await db.flush()
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Duas requisições simultâneas: uq_group_members_group_user barra a segunda
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Você já é membro deste grupo")
+    redis = await get_redis()
+    await devices.invalidate_groups(redis, [group.id])
+    await roster.invalidate_groups(redis, [group.id])
 
     result = await db.execute(
         select(Group)
@@ -193,3 +215,7 @@ async def leave_group(
         )
 
     await db.delete(member)
+    await db.commit()
+    redis = await get_redis()
+    await devices.invalidate_groups(redis, [gid])
+    await roster.invalidate_groups(redis, [gid])
@@ -1,63 +1,56 @@
-import json
-import math
+import logging
 import uuid
-from datetime import datetime, UTC
+from dataclasses import asdict
+from datetime import date, datetime, UTC
 
-from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from sqlalchemy import desc, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.dependencies import get_current_user
-from app.core.database import get_db
+from app.api.dependencies import (
+    authenticate_ws,
+    authenticate_ws_user,
+    get_current_user,
+    is_group_member,
+    require_group_member,
+    user_group_ids,
+)
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, get_db, get_read_db
 from app.core.redis_client import get_redis
-from app.core.security import decode_token
-from app.models.group import GroupMember
+from app.core.sse import SSEConnection, format_event
+from app.core.ws_interest import Viewport
+from app.core.ws_manager import ConnectionManager
 from app.models.location import Location
 from app.models.user import User
+from app.services import location_events, location_ingest, location_last, location_stats, location_track, roster
+from app.services.location_ingest import haversine, should_persist  # noqa: F401 (haversine reexportado)
+from app.services.location_last import LastPosition
+from app.services.location_sampling import SamplingController
+from app.services.location_throttle import FrameThrottle
+from app.services.location_writer import LocationWriter
+from app.services.presence import presence
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
-
-# ── Haversine ────────────────────────────────────────────────────────────────
-
-def haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
-    """Distância em metros entre dois pontos geográficos (fórmula de Haversine)."""
-    R = 6371000.0  # raio da Terra em metros
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lng2 - lng1)
-    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
-    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+WS_CLOSE_UNSUPPORTED_DATA = 1003
+WS_CLOSE_INTERNAL_ERROR = 1011
+MAX_EPOCH = 253402300799  # 9999-12-31T23:59:59Z, limite do datetime
 
 
 # ── WebSocket Manager ────────────────────────────────────────────────────────
 
-class ConnectionManager:
-    def __init__(self):
-        self.active: dict[str, list[WebSocket]] = {}
-
-    async def connect(self, group_id: str, ws: WebSocket):
-        await ws.accept()
-        self.active.setdefault(group_id, []).append(ws)
-
-    def disconnect(self, group_id: str, ws: WebSocket):
-        connections = self.active.get(group_id, [])
-        if ws in connections:
-            connections.remove(ws)
-
-    async def broadcast(self, group_id: str, data: dict):
-        dead = []
-        for ws in self.active.get(group_id, []):
-            try:
-                await ws.send_json(data)
-            except Exception:
-                dead.append(ws)
-        for ws in dead:
-            self.disconnect(group_id, ws)
-
-
-manager = ConnectionManager()
+manager = ConnectionManager(
+    max_pending=settings.WS_MAX_PENDING_FRAMES,
+    ping_interval=settings.WS_PING_INTERVAL_SECONDS,
+    idle_timeout=settings.WS_IDLE_TIMEOUT_SECONDS,
+    viewport_cell_deg=settings.WS_VIEWPORT_CELL_DEG,
+    viewport_max_cells=settings.WS_VIEWPORT_MAX_CELLS,
+)
+writer = LocationWriter(AsyncSessionLocal)
+sampling = SamplingController()
 
 
 # ── WebSocket de localização ─────────────────────────────────────────────────
@@ -66,162 +59,330 @@ manager = ConnectionManager()
 async def location_ws(
     ws: WebSocket,
     token: str = Query(...),
-    group_id: str = Query(...),
-    db: AsyncSession = Depends(get_db),
+    group_id: str | None = Query(None),
 ):
     """
     WebSocket de localização em tempo real.
-    Auth via query param: ?token=<access_token>&group_id=<uuid>
+    Auth via query param: ?token=<access_token>[&group_id=<uuid>]
+    Sem group_id, a conexão assina todos os grupos do usuário: um socket por
+    aparelho, cada posição processada uma vez e enviada a todos os grupos.
     Payload recebido: {"lat": float, "lng": float, "ts": float (epoch seconds)}
+    Controle (em banda): {"type": "subscribe" | "unsubscribe", "group_id": str}
+      → resposta {"type": "subscriptions", "group_ids": [...]} ou
+        {"type": "error", "detail": str}
+    Mapa aberto/fechado: {"type": "watch", "active": bool}
+    Área de interesse (só recebe posições dentro dela, em todos os grupos):
+      {"type": "viewport", "bbox": [south, west, north, east]}
+      {"type": "viewport", "lat": float, "lng": float, "radius_m": float}
+      {"type": "viewport"} — volta a receber tudo
+      → resposta {"type": "viewport", "active": bool} ou {"type": "error", "detail": str}
+    Intervalo de envio pedido pelo servidor (app/services/location_sampling.py):
+      {"type": "config", "interval": segundos} — na conexão e quando muda
     Payload broadcast: {"type": "location_update", "user_id": str, "user_name": str,
-                        "lat": float, "lng": float, "ts": float}
+                        "lat": float, "lng": float, "ts": float, "event_id": str}
+    event_id é o id da posição no buffer do grupo (ver GET /group/{id}/stream).
+    A sessão do banco só existe durante a autenticação; as posições são
+    gravadas em lote pelo LocationWriter (app/services/location_writer.py).
+    Frames acima do limite por conexão/usuário são agregados pelo FrameThrottle
+    (app/services/location_throttle.py): só a posição mais recente é processada.
+    Heartbeat: o servidor envia {"type": "ping"}; o cliente responde {"type": "pong"}.
+    Sem frames por WS_IDLE_TIMEOUT_SECONDS, o socket é fechado (4008).
     """
-    # Autenticar via token no query param
-    try:
-        payload = decode_token(token)
-    except HTTPException:
-        await ws.close(code=4001)
-        return
-
-    user_id_str = payload.get("sub")
-    if not user_id_str:
-        await ws.close(code=4001)
-        return
+    async with AsyncSessionLocal() as db:
+        if group_id is None:
+            user = await authenticate_ws_user(db, token)
+            group_ids = await user_group_ids(db, user.id)
+        else:
+            user, gid = await authenticate_ws(db, token, group_id)
+            group_ids = [gid]
+    user_id_str = str(user.id)
+    channels = {str(gid) for gid in group_ids}
+
+    await manager.connect_many(channels, ws)
+    redis = await get_redis()
 
-    # Verificar usuário
+    async def process(data: dict) -> None:
+        lat = float(data["lat"])
+        lng = float(data["lng"])
+        now = datetime.now(UTC).replace(tzinfo=None)
+        await presence.heartbeat(redis, user.id, channels)
+
+        accuracy = float(data["accuracy"]) if data.get("accuracy") is not None else None
+
+        # Throttle: persiste se moveu ≥ 10m ou Δt ≥ 30s
+        last = await location_last.read(redis, user_id_str)
+        if should_persist(last and (last.ts, last.lat, last.lng), (now.timestamp(), lat, lng)):
+            await writer.add(user.id, lat, lng, now)
+
+        # Atualiza Redis com posição atual (sempre)
+        await location_last.write(redis, user_id_str, LastPosition(now.timestamp(), lat, lng, accuracy))
+
+        # Broadcast para quem tem a posição no viewport, em todos os grupos assinados
+        frame = {
+            "type": "location_update",
+            "user_id": user_id_str,
+            "user_name": user.name,
+            "lat": lat,
+            "lng": lng,
+            "ts": now.timestamp(),
+        }
+        targets = list(channels)  # control() pode alterar o set durante os awaits
+        event_ids = await location_events.append(redis, targets, frame)
+        for channel in targets:
+            await manager.broadcast(channel, {**frame, "event_id": event_ids[channel]}, at=(lat, lng))
+
+    async def control(data: dict) -> None:
+        try:
+            gid = uuid.UUID(str(data.get("group_id")))
+        except ValueError:
+            await manager.send(ws, {"type": "error", "detail": "ID de grupo inválido"})
+            return
+        channel = str(gid)
+        if data["type"] == "subscribe" and channel not in channels:
+            async with AsyncSessionLocal() as db:
+                member = await is_group_member(db, gid, user.id)
+            if not member:
+                await manager.send(ws, {"type": "error", "detail": "Você não é membro deste grupo"})
+                return
+            channels.add(channel)
+            manager.subscribe(channel, ws)
+        elif data["type"] == "unsubscribe" and channel in channels:
+            channels.discard(channel)
+            manager.unsubscribe(channel, ws)
+        await manager.send(ws, {"type": "subscriptions", "group_ids": sorted(channels)})
+        await sampling.update(ws)
+
+    async def set_viewport(data: dict) -> None:
+        try:
+            viewport = _parse_viewport(data)
+        except (KeyError, TypeError, ValueError):
+            await manager.send(ws, {"type": "error", "detail": "Viewport inválido"})
+            return
+        manager.set_viewport(ws, viewport)
+        await manager.send(ws, {"type": "viewport", "active": viewport is not None})
+
+    # Frames acima do limite são adiados e substituídos pelo mais recente
+    throttle = FrameThrottle(user_id_str, process, redis)
     try:
-        uid = uuid.UUID(user_id_str)
-    except ValueError:
-        await ws.close(code=4001)
-        return
+        await sampling.register(redis, manager, ws, channels)
+        while True:
+            data = await manager.receive_json(ws)
+            if data.get("type") in ("subscribe", "unsubscribe"):
+                await control(data)
+            elif data.get("type") == "viewport":
+                await set_viewport(data)
+            elif data.get("type") == "watch":
+                await sampling.set_watching(ws, bool(data.get("active")))
+            else:
+                await throttle.submit(data)
 
-    result = await db.execute(select(User).where(User.id == uid))
-    user = result.scalar_one_or_none()
-    if user is None or not user.is_active:
-        await ws.close(code=4001)
-        return
+    except WebSocketDisconnect:
+        pass
+    except (KeyError, TypeError, ValueError, AttributeError):
+        # Frame fora do formato (JSON inválido, sem lat/lng, não-objeto)
+        await _close_quietly(ws, WS_CLOSE_UNSUPPORTED_DATA)
+    except Exception:
+        logger.exception("WebSocket de localização de %s encerrado por erro", user_id_str)
+        await _close_quietly(ws, WS_CLOSE_INTERNAL_ERROR)
+    finally:
+        manager.close(ws)
+        await sampling.unregister(ws)
+        await throttle.close()
 
-    # Verificar membership no grupo
-    try:
-        gid = uuid.UUID(group_id)
-    except ValueError:
-        await ws.close(code=4003)
-        return
 
-    result = await db.execute(
-        select(GroupMember).where(
-            GroupMember.group_id == gid,
-            GroupMember.user_id == user.id,
-        )
-    )
-    if result.scalar_one_or_none() is None:
-        await ws.close(code=4003)
-        return
+def _parse_viewport(data: dict) -> Viewport | None:
+    if "bbox" in data:
+        south, west, north, east = (float(v) for v in data["bbox"])
+        return Viewport.from_bbox(south, west, north, east)
+    if "radius_m" in data:
+        return Viewport.from_radius(float(data["lat"]), float(data["lng"]), float(data["radius_m"]))
+    return None
 
-    await manager.connect(group_id, ws)
-    redis = await get_redis()
 
+async def _close_quietly(ws: WebSocket, code: int) -> None:
     try:
-        while True:
-            data = await ws.receive_json()
-            lat = float(data["lat"])
-            lng = float(data["lng"])
-            now = datetime.now(UTC).replace(tzinfo=None)
-
-            # Throttle: persiste se moveu ≥ 10m ou Δt ≥ 30s
-            redis_key = f"loc:last:{user_id_str}"
-            last_raw = await redis.get(redis_key)
-            should_persist = True
-
-            if last_raw:
-                last = json.loads(last_raw)
-                dist = haversine(last["lat"], last["lng"], lat, lng)
-                dt = now.timestamp() - last.get("ts", 0)
-                should_persist = dist >= 10 or dt >= 30
-
-            if should_persist:
-                location = Location(
-                    user_id=user.id,
-                    latitude=lat,
-                    longitude=lng,
-                    recorded_at=now,
-                )
-                db.add(location)
-                await db.flush()
-
-            # Atualiza Redis com posição atual (sempre)
-            loc_data = {
-                "user_id": user_id_str,
-                "user_name": user.name,
-                "lat": lat,
-                "lng": lng,
-                "ts": now.timestamp(),
-            }
-            await redis.set(redis_key, json.dumps(loc_data), ex=3600)
-
-            # Broadcast para o grupo
-            await manager.broadcast(group_id, {"type": "location_update", **loc_data})
-
-    except WebSocketDisconnect:
-        manager.disconnect(group_id, ws)
+        await ws.close(code=code)
     except Exception:
-        manager.disconnect(group_id, ws)
+        pass  # o cliente pode já ter ido embora
 
 
 # ── REST endpoints ───────────────────────────────────────────────────────────
 
+@router.post("/batch")
+async def upload_location_batch(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Upload do buffer offline: JSON {"points": [{"lat", "lng", "ts"}, ...]} ou,
+    com Content-Type application/x-minhaturma-locations, registros binários
+    de 3 doubles little-endian (ts, lat, lng). Reenvios são idempotentes.
+    Retorna contadores: received, invalid, duplicates, throttled, stored.
+    """
+    body = await location_ingest.read_body(request)
+    if request.headers.get("content-type", "").startswith(location_ingest.BINARY_CONTENT_TYPE):
+        points = location_ingest.parse_binary(body)
+    else:
+        points = location_ingest.parse_json(body)
+
+    redis = await get_redis()
+    result = await location_ingest.ingest(db, redis, current_user.id, points)
+    return asdict(result)
+
+
 @router.get("/history/{user_id}")
 async def get_location_history(
     user_id: str,
-    limit: int = 100,
-    db: AsyncSession = Depends(get_db),
+    limit: int = Query(100, ge=1),
+    start: float | None = Query(None, ge=0, le=MAX_EPOCH),
+    end: float | None = Query(None, ge=0, le=MAX_EPOCH),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_user),
 ):
-    """Histórico de localização de um usuário (últimos N registros)."""
+    """
+    Histórico de localização de um usuário: até `limit` posições com
+    start ≤ ts ≤ end (epoch em segundos, opcionais), da mais recente para a
+    mais antiga. O trecho coberto pelo trajeto recente vem do Redis; o que é
+    anterior a ele, do Postgres.
+    """
     try:
         uid = uuid.UUID(user_id)
     except ValueError:
         raise HTTPException(status_code=400, detail="ID de usuário inválido")
 
-    result = await db.execute(
-        select(Location)
-        .where(Location.user_id == uid)
-        .order_by(desc(Location.recorded_at))
-        .limit(limit)
+    # Na precisão de recorded_at, para o Redis e o Postgres filtrarem igual
+    start, end = (location_track.rounded(t) for t in (start, end))
+    redis = await get_redis()
+    points, covered_from = await location_track.read(
+        redis, uid,
+        start if start is not None else float("-inf"),
+        end if end is not None else float("inf"),
+        limit,
+    )
+    complete = len(points) == limit or (
+        covered_from is not None and start is not None and start >= covered_from
+    )
+    if not complete:
+        stmt = (
+            select(Location.recorded_at, Location.latitude, Location.longitude)
+            .where(Location.user_id == uid)
+            .order_by(desc(Location.recorded_at))
+            .limit(limit - len(points))
+        )
+        if start is not None:
+            stmt = stmt.where(Location.recorded_at >= location_track.recorded_at(start))
+        if end is not None:
+            stmt = stmt.where(Location.recorded_at <= location_track.recorded_at(end))
+        if covered_from is not None:
+            stmt = stmt.where(Location.recorded_at < location_track.recorded_at(covered_from))
+        result = await db.execute(stmt)
+        points += [(location_track.stored_ts(at), lat, lng) for at, lat, lng in result.all()]
+    return [{"lat": lat, "lng": lng, "ts": ts} for ts, lat, lng in points]
+
+
+@router.get("/stats/{user_id}")
+async def get_location_stats(
+    user_id: str,
+    day: date | None = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Deslocamento de um usuário num dia UTC (padrão: hoje): distância,
+    tempo em movimento e parado, velocidade máxima e número de posições.
+    Um HGETALL no Redis (ou uma linha de location_daily_stats), sem varrer
+    as posições do dia.
+    """
+    try:
+        uid = uuid.UUID(user_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ID de usuário inválido")
+
+    day = day or datetime.now(UTC).date()
+    stats = await location_stats.day_stats(db, await get_redis(), uid, day)
+    return {
+        "user_id": user_id,
+        "day": day.isoformat(),
+        "distance_m": stats.distance_m,
+        "moving_seconds": stats.moving_seconds,
+        "stopped_seconds": stats.stopped_seconds,
+        "max_speed": stats.max_speed,
+        "points": stats.points,
+    }
+
+
+@router.get("/group/{group_id}/stream")
+async def stream_group_locations(
+    group_id: str,
+    last_event_id: str | None = Header(None),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Posições do grupo em tempo real via Server-Sent Events (somente leitura).
+    Autenticação pelo header Authorization, como os demais endpoints REST.
+    Eventos: location_update (com id: para retomar) e sos; ": ping" a cada
+    WS_PING_INTERVAL_SECONDS. Ao reconectar com Last-Event-ID, as posições
+    perdidas vêm do buffer curto do grupo; se ele já não cobre o intervalo,
+    chega um evento "reset" e o cliente deve recarregar GET /group/{id}/last.
+    """
+    gid = await require_group_member(db, group_id, current_user)
+    if manager.draining:
+        raise HTTPException(status_code=503, detail="Servidor reiniciando", headers={"Retry-After": "1"})
+    channel = str(gid)
+    conn = SSEConnection()
+    # Assina antes de ler o buffer: nada publicado entre os dois passos se perde
+    await manager.connect(channel, conn)
+    redis = await get_redis()
+
+    async def events():
+        try:
+            yield f"retry: {settings.WS_RECONNECT_BASE_MS}\n\n"
+            last = None
+            if last_event_id:
+                replay = await location_events.since(redis, channel, last_event_id)
+                if replay is None:
+                    yield format_event({"type": "reset"})
+                else:
+                    for event_id, frame in replay:
+                        yield format_event(frame)
+                    last = location_events.parse_event_id(replay[-1][0] if replay else last_event_id)
+            async for frame in conn.frames():
+                event_id = frame.get("event_id")
+                if last is not None and event_id and location_events.parse_event_id(event_id) <= last:
+                    continue  # já entregue pelo replay
+                yield format_event(frame)
+        finally:
+            manager.close(conn)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    locations = result.scalars().all()
-    return [
-        {
-            "lat": loc.latitude,
-            "lng": loc.longitude,
-            "ts": loc.recorded_at.timestamp() if loc.recorded_at else None,
-        }
-        for loc in locations
-    ]
 
 
 @router.get("/group/{group_id}/last")
 async def get_group_last_locations(
     group_id: str,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_user),
 ):
-    """Última posição de cada membro do grupo (via Redis)."""
+    """Última posição de cada membro do grupo (roster e loc:last via Redis)."""
     try:
         gid = uuid.UUID(group_id)
     except ValueError:
         raise HTTPException(status_code=400, detail="ID de grupo inválido")
 
-    result = await db.execute(
-        select(GroupMember).where(GroupMember.group_id == gid)
-    )
-    members = result.scalars().all()
-
     redis = await get_redis()
-    positions = []
-    for member in members:
-        raw = await redis.get(f"loc:last:{member.user_id}")
-        if raw:
-            positions.append(json.loads(raw))
-
-    return {"group_id": group_id, "members": positions}
+    names = await roster.group_roster(db, redis, gid)
+    positions = await location_last.read_many(redis, names)
+    members = []
+    for user_id, pos in positions.items():
+        member = {"user_id": user_id, "user_name": names[user_id], "lat": pos.lat, "lng": pos.lng, "ts": pos.ts}
+        if pos.accuracy is not None:
+            member["accuracy"] = pos.accuracy
+        members.append(member)
+
+    return {"group_id": group_id, "members": members}
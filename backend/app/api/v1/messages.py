@@ -1,38 +1,245 @@
-from fastapi import APIRouter, Depends, UploadFile, File
-from sqlalchemy.ext.asyncio import AsyncSession
+import base64
+import uuid
+from datetime import datetime, UTC
+
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
+from app.api.dependencies import authenticate_ws, get_current_user, require_group_member
+from app.core import storage
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, get_db, get_read_db
+from app.core.redis_client import get_redis
+from app.core.ws_manager import ConnectionManager
+from app.models.message import Message, MessageType
+from app.models.user import User
+from app.services import media, message_cache
 
 router = APIRouter()
 
+chat_manager = ConnectionManager(
+    ping_interval=settings.WS_PING_INTERVAL_SECONDS,
+    idle_timeout=settings.WS_IDLE_TIMEOUT_SECONDS,
+)
+
+
+# ── Schemas ──────────────────────────────────────────────────────────────────
 
 class SendMessageRequest(BaseModel):
     group_id:  str
-    sender_id: str
-    content:   str
-    type:      str = "text"  # text | image | video
+    content:   str | None = None
+    type:      MessageType = MessageType.text
+    media_key: str | None = None   # obrigatório para image | video
+
+
+class PresignUploadRequest(BaseModel):
+    group_id:     str
+    content_type: str
+
+
+# ── Helpers ──────────────────────────────────────────────────────────────────
+
+def _message_to_out(msg: Message, sender_name: str) -> dict:
+    return {
+        "id": str(msg.id),
+        "group_id": str(msg.group_id),
+        "sender_id": str(msg.sender_id),
+        "sender_name": sender_name,
+        "type": msg.type.value,
+        "content": msg.content,
+        "media_key": msg.media_key,
+        "thumbnail_key": msg.thumbnail_key,
+        "poster_key": msg.poster_key,
+        "created_at": msg.created_at.isoformat(),
+    }
+
+
+def _encode_cursor(item: dict) -> str:
+    raw = f"{item['created_at']}|{item['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    try:
+        created_at, msg_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), uuid.UUID(msg_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+def _page(group_id: str, items: list[dict], limit: int) -> dict:
+    """Monta a página a partir de até limit+1 itens (o excedente só indica que há mais)."""
+    has_more = len(items) > limit
+    items = items[:limit]
+    return {
+        "group_id": group_id,
+        "messages": items,
+        "next_cursor": _encode_cursor(items[-1]) if has_more else None,
+    }
+
+
+# ── Endpoints ────────────────────────────────────────────────────────────────
+
+@router.post("/", status_code=201)
+async def send_message(
+    data: SendMessageRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Salva a mensagem, atualiza o cache de recentes e faz broadcast no WebSocket do chat."""
+    gid = await require_group_member(db, data.group_id, current_user)
+
+    if data.type in (MessageType.sos, MessageType.system):
+        raise HTTPException(status_code=400, detail="Tipo de mensagem não permitido")
+    if data.type == MessageType.text and not (data.content or "").strip():
+        raise HTTPException(status_code=400, detail="Mensagem vazia")
+    if data.type in (MessageType.image, MessageType.video) and not data.media_key:
+        raise HTTPException(status_code=400, detail="media_key obrigatório para mídia")
+    if data.media_key and not data.media_key.startswith(f"grupos/{gid}/"):
+        raise HTTPException(status_code=400, detail="media_key não pertence a este grupo")
+
+    message = Message(
+        group_id=gid,
+        sender_id=current_user.id,
+        type=data.type,
+        content=data.content,
+        media_key=data.media_key,
+        created_at=datetime.now(UTC).replace(tzinfo=None),
+    )
+    db.add(message)
+    # Comita antes do fan-out: cache e WebSocket nunca mostram mensagem não persistida
+    await db.commit()
 
+    out = _message_to_out(message, current_user.name)
 
-@router.post("/")
-async def send_message(data: SendMessageRequest, db: AsyncSession = Depends(get_db)):
-    # TODO: salvar mensagem no banco e fazer broadcast via WebSocket
-    return {"message": "Mensagem enviada"}
+    redis = await get_redis()
+    await message_cache.push(redis, gid, out)
+    await chat_manager.broadcast(str(gid), {"type": "message", "message": out})
+
+    if message.media_key:
+        media.schedule_processing(message.id, message.media_key)
+    return out
 
 
 @router.post("/upload")
-async def upload_media(group_id: str, file: UploadFile = File(...)):
+async def upload_media(
+    group_id: str,
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Upload de foto ou vídeo para o S3, em streaming (multipart).
+    Retorna a media_key para uso em POST /messages/ e uma URL de leitura.
+    """
+    gid = await require_group_member(db, group_id, current_user)
+    content_type = storage.check_content_type(file.content_type)
+
+    key = storage.media_key(gid, content_type)
+    size = await storage.stream_upload(file, key, content_type)
+    return {"media_key": key, "url": storage.media_url(key), "size": size}
+
+
+@router.post("/upload/presign")
+async def presign_upload(
+    data: PresignUploadRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
     """
-    Upload de foto ou vídeo para o S3.
-    Retorna a URL pública para uso na mensagem.
+    Upload direto do app para o S3 (vídeos grandes não passam pela API).
+    O cliente faz POST multipart/form-data em upload.url com upload.fields + o arquivo,
+    e depois envia a mensagem com a media_key retornada.
     """
-    # TODO: validar tipo e tamanho (MAX 50MB)
-    # TODO: fazer upload para AWS S3 com chave: grupos/{group_id}/{uuid}.{ext}
-    # TODO: retornar URL pré-assinada ou URL pública do S3
-    return {"url": "https://s3.amazonaws.com/bucket/placeholder.jpg"}
+    gid = await require_group_member(db, data.group_id, current_user)
+    content_type = storage.check_content_type(data.content_type)
+
+    key = storage.media_key(gid, content_type)
+    return {
+        "media_key": key,
+        "upload": storage.presigned_upload(key, content_type),
+        "expires_in": settings.S3_PRESIGN_EXPIRE_SECONDS,
+    }
 
 
 @router.get("/{group_id}")
-async def get_messages(group_id: str, page: int = 1, limit: int = 50, db: AsyncSession = Depends(get_db)):
-    # TODO: buscar mensagens paginadas do grupo
-    return {"group_id": group_id, "messages": [], "page": page}
+async def get_messages(
+    group_id: str,
+    before: str | None = None,
+    limit: int = Query(50, ge=1, le=settings.CHAT_PAGE_SIZE_MAX),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Mensagens do grupo, da mais recente para a mais antiga (paginação keyset).
+    Primeira página: ?limit=50 — servida do Redis quando o cache está quente.
+    Próximas páginas: ?before=<next_cursor> — sempre do banco, via índice
+    (group_id, created_at, id), com custo constante independente da profundidade.
+    """
+    gid = await require_group_member(db, group_id, current_user)
+    redis = await get_redis()
+    cache_size = settings.CHAT_RECENT_CACHE_SIZE
+
+    # O cache guarda min(total, cache_size) mensagens. Com limit < cache_size,
+    # limit+1 itens lidos bastam para saber se existe próxima página.
+    if before is None and limit < cache_size:
+        cached = await message_cache.read(redis, gid, limit + 1)
+        if cached:
+            return _page(group_id, cached, limit)
+
+    stmt = (
+        select(Message, User.name)
+        .join(User, User.id == Message.sender_id)
+        .where(Message.group_id == gid, Message.is_deleted == False)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+    )
+    if before is not None:
+        created_at, message_id = _decode_cursor(before)
+        stmt = stmt.where(tuple_(Message.created_at, Message.id) < (created_at, message_id))
+        fetch = limit + 1
+    else:
+        # Busca o suficiente para também aquecer o cache numa única query
+        fetch = max(limit + 1, cache_size)
+        generation = await message_cache.generation(redis, gid)
+
+    result = await db.execute(stmt.limit(fetch))
+    items = [_message_to_out(message, name) for message, name in result.all()]
+
+    # Da réplica, a página pode estar atrasada: serve, mas não vira cache
+    if before is None and items and not db.info.get("replica"):
+        await message_cache.rebuild(redis, gid, items, generation)
+
+    return _page(group_id, items, limit)
+
+
+# ── WebSocket do chat ────────────────────────────────────────────────────────
+
+@router.websocket("/ws")
+async def chat_ws(
+    ws: WebSocket,
+    token: str = Query(...),
+    group_id: str = Query(...),
+):
+    """
+    WebSocket do chat do grupo (somente recebimento — o envio é via POST /messages/).
+    Auth via query param: ?token=<access_token>&group_id=<uuid>
+    Payload broadcast: {"type": "message", "message": {mesmo formato de GET /messages/{group_id}}}
+    O cliente só precisa responder aos pings ({"type": "pong"}); sem isso o
+    socket é fechado após WS_IDLE_TIMEOUT_SECONDS (4008).
+    """
+    # Sessão só para autenticar: o socket aberto não segura conexão do pool
+    async with AsyncSessionLocal() as db:
+        _, gid = await authenticate_ws(db, token, group_id)
+    channel = str(gid)
+    await chat_manager.connect(channel, ws)
+
+    try:
+        while True:
+            await chat_manager.receive_json(ws)
+    except (WebSocketDisconnect, ValueError):
+        pass  # cliente saiu ou mandou frame que não é JSON
+    finally:
+        # Também em cancelamento ou erro inesperado: o socket não fica em `active`
+        chat_manager.close(ws)
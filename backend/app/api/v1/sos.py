@@ -1,43 +1,113 @@
-from fastapi import APIRouter, Depends
+import uuid
+
+from datetime import datetime, UTC
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from sqlalchemy import desc, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 
-from app.core.database import get_db
+from app.api.dependencies import get_current_user, is_group_member, require_group_member
+from app.core.config import settings
+from app.core.database import get_db, get_read_db
+from app.core.redis_client import get_redis
+from app.models.message import SOSEvent
+from app.models.user import User
+from app.services import sos, sos_stream
 
 router = APIRouter()
 
 
 class SOSRequest(BaseModel):
-    user_id:   str
     group_id:  str
     latitude:  float
     longitude: float
     message:   str | None = None
 
 
-@router.post("/trigger")
-async def trigger_sos(data: SOSRequest, db: AsyncSession = Depends(get_db)):
+def _event_to_out(event: SOSEvent) -> dict:
+    return {
+        "id": str(event.id),
+        "user_id": str(event.user_id),
+        "lat": event.latitude,
+        "lng": event.longitude,
+        "message": event.message,
+        "resolved": event.resolved,
+        "ts": event.created_at.timestamp(),
+    }
+
+
+@router.post("/trigger", status_code=202)
+async def trigger_sos(
+    data: SOSRequest,
+    idempotency_key: str | None = Header(default=None, max_length=128),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
     """
-    Aciona o SOS:
-    1. Salva evento no banco
-    2. Envia push notification a todos do grupo via Firebase FCM
-    3. Transmite pelo WebSocket de localização
+    Aciona o SOS: grava o evento no log durável (Redis Stream sos:events) e responde.
+    Persistência, push FCM e broadcast no WebSocket são feitos pelos consumidores
+    (app/services/sos.py), de forma independente e com reentrega em caso de falha.
+    Repetir a requisição com o mesmo Idempotency-Key devolve o mesmo event_id.
     """
-    # TODO: salvar SOSEvent no banco
-    # TODO: buscar tokens FCM dos membros do grupo
-    # TODO: enviar push via Firebase Admin SDK
-    # TODO: broadcast via WebSocket
-    return {"status": "SOS acionado", "notified": 0}
+    gid = await require_group_member(db, data.group_id, current_user)
+
+    entry = sos.triggered_entry(current_user, gid, data.latitude, data.longitude, data.message)
+    event_id, duplicate = await sos_stream.append(await get_redis(), entry, idempotency_key)
+    return {"status": "SOS acionado", "event_id": event_id, "duplicate": duplicate}
 
 
 @router.post("/resolve/{sos_id}")
-async def resolve_sos(sos_id: str, db: AsyncSession = Depends(get_db)):
-    """Marca o evento SOS como resolvido."""
-    # TODO: atualizar campo resolved no banco
+async def resolve_sos(
+    sos_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Marca o evento SOS como resolvido (também via log: persist + broadcast)."""
+    try:
+        sid = uuid.UUID(sos_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ID de SOS inválido")
+
+    redis = await get_redis()
+    group_id = await sos_stream.event_group(redis, sos_id)
+    if group_id is None:
+        # Evento mais antigo que o índice do Redis
+        event = await db.get(SOSEvent, sid)
+        group_id = event.group_id if event is not None else None
+    if group_id is None or not await is_group_member(db, uuid.UUID(str(group_id)), current_user.id):
+        raise HTTPException(status_code=404, detail="SOS não encontrado")
+
+    await sos_stream.append(redis, sos.resolved_entry(sid, uuid.UUID(str(group_id)), current_user))
     return {"status": "SOS resolvido"}
 
 
 @router.get("/history/{group_id}")
-async def get_sos_history(group_id: str, db: AsyncSession = Depends(get_db)):
-    """Histórico de eventos SOS do grupo."""
-    return {"group_id": group_id, "events": []}
+async def get_sos_history(
+    group_id: str,
+    limit: int = Query(50, ge=1, le=settings.SOS_HISTORY_SIZE),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Histórico de eventos SOS do grupo (mais recentes primeiro), lido do stream
+    limitado sos:history:{group_id}. Se o índice tem menos que `limit`
+    eventos (Redis reiniciado, TTL), os anteriores a ele vêm da consulta
+    indexada no banco.
+    """
+    gid = await require_group_member(db, group_id, current_user)
+
+    indexed = await sos_stream.history(await get_redis(), str(gid), limit)
+    events = [sos.entry_to_out(e, resolved) for e, resolved in indexed]
+    if len(events) < limit:
+        query = select(SOSEvent).where(SOSEvent.group_id == gid)
+        if events:
+            oldest = datetime.fromtimestamp(events[-1]["ts"], UTC).replace(tzinfo=None)
+            # <= e exclusão por id: created_at é o ts arredondado ao µs
+            query = query.where(
+                SOSEvent.created_at <= oldest,
+                SOSEvent.id.notin_([uuid.UUID(e["id"]) for e in events]),
+            )
+        result = await db.execute(query.order_by(desc(SOSEvent.created_at)).limit(limit - len(events)))
+        events.extend(_event_to_out(e) for e in result.scalars().all())
+    return {"group_id": group_id, "events": events}
@@ -14,11 +14,33 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
     REFRESH_TOKEN_EXPIRE_DAYS: int = 30
+    # EdDSA / ES256: chaves PEM (a pública é publicada em /auth/jwks); HS*: usa SECRET_KEY
+    JWT_PRIVATE_KEY: str = ""
+    JWT_PUBLIC_KEY: str = ""
+    JWT_KEY_ID: str = ""
+    JWT_VERIFY_CACHE_SIZE: int = 10_000      # tokens já verificados mantidos em memória (LRU)
+    JWT_VERIFY_CACHE_SECONDS: int = 30       # por quanto tempo um token verificado dispensa reverificação
+
+    # Rate limiting de /auth (janela deslizante no Redis)
+    RATE_LIMIT_ENABLED: bool = True
+    AUTH_RATE_WINDOW_SECONDS: int = 300
+    AUTH_RATE_LIMIT_PER_IP: int = 30         # tentativas por IP na janela (NAT: vários usuários)
+    AUTH_RATE_LIMIT_PER_EMAIL: int = 10      # tentativas por e-mail na janela
 
     # Banco de Dados (AWS RDS PostgreSQL)
     DATABASE_URL: str
+    DATABASE_REPLICA_URL: str = ""           # réplica de leitura; vazio = tudo no primário
+    DB_REPLICA_PIN_SECONDS: int = 5          # após gravar, o usuário lê do primário (lag da réplica)
     DB_POOL_SIZE: int = 10
     DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_SECONDS: float = 5       # espera por conexão livre antes de falhar
+    DB_POOL_RECYCLE_SECONDS: int = 1800      # recicla antes do idle timeout do RDS/proxy
+    DB_POOL_PRE_PING: bool = True            # SELECT 1 no checkout: detecta conexões mortas
+    DB_STATEMENT_CACHE_SIZE: int = 100       # prepared statements por conexão (0 com PgBouncer transaction)
+    DB_STATEMENT_TIMEOUT_MS: int = 15_000    # statement_timeout no servidor; 0 = sem limite
+    DB_ECHO: bool = False                    # loga todo SQL — só para depuração
+    # verify: só confere a revisão do Alembic no startup | create: create_all (dev) | off
+    DB_SCHEMA_MODE: str = "verify"
 
     # Redis (AWS ElastiCache)
     REDIS_URL: str = "redis://localhost:6379"
@@ -28,6 +50,10 @@ class Settings(BaseSettings):
     AWS_SECRET_ACCESS_KEY: str = ""
     AWS_REGION: str = "us-east-1"
     AWS_S3_BUCKET: str = ""
+    S3_ENDPOINT_URL: str = ""             # vazio = AWS; ex.: http://localhost:9000 (MinIO)
+    S3_MULTIPART_CHUNK_MB: int = 5        # tamanho de cada parte (mínimo do S3: 5)
+    S3_UPLOAD_CONCURRENCY: int = 2        # partes enviadas em paralelo por upload
+    S3_PRESIGN_EXPIRE_SECONDS: int = 900
     AWS_COGNITO_USER_POOL_ID: str = ""
     AWS_COGNITO_APP_CLIENT_ID: str = ""
     AWS_COGNITO_REGION: str = "us-east-1"
@@ -52,6 +78,26 @@ class Settings(BaseSettings):
     FIREBASE_PROJECT_ID: str = ""
     FIREBASE_CREDENTIALS_PATH: str = "firebase-credentials.json"
 
+    # Push (envio em lote via FCM multicast)
+    PUSH_PROVIDER: str = "firebase"        # firebase | fake (desenvolvimento / benchmarks)
+    PUSH_BATCH_SIZE: int = 500             # limite do FCM por multicast
+    PUSH_CONCURRENCY: int = 4              # lotes enviados em paralelo
+    PUSH_MAX_RETRIES: int = 3
+    PUSH_RETRY_BASE_SECONDS: float = 0.2   # backoff exponencial: base × 2^tentativa
+    PUSH_TOKEN_CACHE_TTL_SECONDS: int = 86400
+    GROUP_ROSTER_CACHE_TTL_SECONDS: int = 86400  # nomes dos membros (GET /locations/group/{id}/last)
+
+    # SOS (log de eventos em Redis Streams)
+    SOS_WORKERS_ENABLED: bool = True          # consumidores persist/notify/broadcast neste processo
+    SOS_STREAM_MAXLEN: int = 100_000          # entradas mantidas em sos:events (aproximado)
+    SOS_HISTORY_SIZE: int = 200               # eventos por grupo em sos:history:{group_id}
+    SOS_HISTORY_TTL_SECONDS: int = 30 * 86400
+    SOS_IDEMPOTENCY_TTL_SECONDS: int = 86400
+    SOS_CONSUMER_BATCH: int = 50
+    SOS_CONSUMER_BLOCK_MS: int = 5000
+    SOS_CLAIM_IDLE_MS: int = 30_000           # pendentes há mais tempo são reassumidos (consumidor morto)
+    SOS_MAX_DELIVERIES: int = 5               # tentativas do handler antes de ir para sos:dead:{consumer group}
+
     # Google Maps
     GOOGLE_MAPS_API_KEY: str = ""
 
@@ -62,10 +108,58 @@ class Settings(BaseSettings):
     # Localização
     LOCATION_UPDATE_INTERVAL_SECONDS: int = 30
     LOCATION_HISTORY_DAYS: int = 7
+    WS_MAX_PENDING_FRAMES: int = 256      # frames normais enfileirados por conexão lenta
+    WS_PING_INTERVAL_SECONDS: float = 25     # ping do servidor; o cliente responde com pong
+    WS_IDLE_TIMEOUT_SECONDS: float = 75      # sem frames do cliente por mais tempo = socket morto
+    WS_RECONNECT_BASE_MS: int = 1000         # drain: reconexão sugerida em base + U(0, jitter)
+    WS_RECONNECT_JITTER_MS: int = 15_000
+    WS_VIEWPORT_CELL_DEG: float = 0.05      # célula da grade de viewports (~5,5 km)
+    WS_VIEWPORT_MAX_CELLS: int = 400         # viewport maior que isso é testado a cada posição
+    LOCATION_FRAME_BURST: int = 5            # frames seguidos aceitos antes de limitar
+    LOCATION_FRAMES_PER_INTERVAL: int = 10   # por conexão, a cada LOCATION_UPDATE_INTERVAL_SECONDS
+    LOCATION_USER_FRAMES_PER_INTERVAL: int = 20  # por usuário, somando as conexões
+    LOCATION_GLOBAL_LIMIT: bool = False      # limite por usuário também no Redis (todos os workers)
+    LOCATION_WRITE_BATCH_SIZE: int = 200  # posições por INSERT multi-linha
+    LOCATION_WRITE_MAX_DELAY_MS: int = 1000  # espera máxima de uma posição no buffer
+    LOCATION_WRITE_MAX_PENDING: int = 20000  # buffer com o banco fora: acima disso, descarta as mais antigas
+    LOCATION_WRITE_RETRY_BASE_MS: int = 500  # 1ª nova tentativa após falha; dobra a cada falha seguida
+    LOCATION_WRITE_RETRY_MAX_SECONDS: float = 30
+    LOCATION_BATCH_MAX_POINTS: int = 20000   # posições por POST /locations/batch
+    LOCATION_BATCH_MAX_BYTES: int = 4 * 1024 * 1024  # corpo do POST /locations/batch (~200 B por posição em JSON)
+    LOCATION_WATCHED_INTERVAL_SECONDS: int = 5   # intervalo pedido aos aparelhos com o grupo observado/SOS
+    LOCATION_IDLE_INTERVAL_SECONDS: int = 120    # intervalo pedido quando nenhum grupo é observado
+    LOCATION_WATCH_POLL_SECONDS: float = 5       # consulta dos observadores (todos os workers) no Redis
+    LOCATION_WATCHER_TTL_SECONDS: int = 30       # observador some se o worker dele parar de renovar
+    LOCATION_SOS_FAST_SECONDS: int = 1800        # alta frequência de um SOS não resolvido
+    LOCATION_EVENT_BUFFER_SIZE: int = 500        # posições por grupo guardadas para Last-Event-ID
+    LOCATION_EVENT_BUFFER_SECONDS: int = 300     # buffer do grupo expira sem posições novas
+    LOCATION_TRACK_MAX_POINTS: int = 1000        # trajeto recente no Redis, por usuário
+    LOCATION_TRACK_TTL_SECONDS: int = 86400      # trajeto some após um dia sem posições
+    LOCATION_STATS_MOVING_SPEED: float = 0.5     # m/s: abaixo disso o trecho conta como parado
+    LOCATION_STATS_MAX_GAP_SECONDS: int = 600    # trecho mais longo (aparelho desligado) não conta
+    LOCATION_STATS_TTL_SECONDS: int = 172800     # agregados do dia no Redis; depois, só a tabela
+    LOCATION_STATS_ROLLUP_SECONDS: int = 300     # intervalo do rollup para location_daily_stats
+
+    # Presença
+    PRESENCE_ONLINE_SECONDS: int = 90        # sem heartbeat há mais tempo = offline
+    PRESENCE_HEARTBEAT_SECONDS: int = 15     # no máximo um ZADD por usuário/grupo nesse intervalo
+    PRESENCE_FLUSH_SECONDS: int = 60         # last_seen_at gravado em lote nesse intervalo
+
+    # Chat
+    CHAT_PAGE_SIZE_MAX: int = 100
+    CHAT_RECENT_CACHE_SIZE: int = 100     # mensagens mais recentes mantidas no Redis por grupo
+    CHAT_RECENT_CACHE_TTL_SECONDS: int = 86400
 
     # Mídia
     MAX_UPLOAD_SIZE_MB: int = 50
     ALLOWED_MEDIA_TYPES: List[str] = ["image/jpeg", "image/png", "video/mp4"]
+    MEDIA_PROCESSING_BACKEND: str = "celery"  # celery | process (ProcessPool local, sem broker)
+    MEDIA_PROCESS_WORKERS: int = 2
+    MEDIA_THUMBNAIL_SIZE: int = 320           # lado maior, em pixels
+    MEDIA_POSTER_SIZE: int = 1280
+
+    # Celery
+    CELERY_BROKER_URL: str = ""               # vazio = REDIS_URL
 
     class Config:
         env_file = ".env"
@@ -1,23 +1,134 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+import uuid
+from dataclasses import dataclass
+
+import redis.asyncio as aioredis
+from fastapi import HTTPException, Request
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
 from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.core.security import decode_token
+
+
+@dataclass(frozen=True)
+class DatabaseProfile:
+    """Parâmetros do engine (pool, cache de statements, timeouts), lidos de DB_* no Settings."""
+    pool_size: int
+    max_overflow: int
+    pool_timeout: float
+    pool_recycle: int
+    pool_pre_ping: bool
+    statement_cache_size: int
+    statement_timeout_ms: int
+    echo: bool
+
+    @classmethod
+    def from_settings(cls) -> "DatabaseProfile":
+        return cls(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+            pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+            statement_cache_size=settings.DB_STATEMENT_CACHE_SIZE,
+            statement_timeout_ms=settings.DB_STATEMENT_TIMEOUT_MS,
+            echo=settings.DB_ECHO,
+        )
+
+    def engine_kwargs(self, url: str) -> dict:
+        parsed = make_url(url)
+        kwargs = {"echo": self.echo, "pool_pre_ping": self.pool_pre_ping, "pool_recycle": self.pool_recycle}
+        if parsed.get_backend_name() != "sqlite":
+            kwargs.update(pool_size=self.pool_size, max_overflow=self.max_overflow, pool_timeout=self.pool_timeout)
+        if parsed.get_driver_name() == "asyncpg":
+            server_settings = {}
+            if self.statement_timeout_ms:
+                server_settings["statement_timeout"] = str(self.statement_timeout_ms)
+            kwargs["connect_args"] = {
+                "statement_cache_size": self.statement_cache_size,
+                "server_settings": server_settings,
+            }
+        return kwargs
+
+
+def make_engine(url: str, profile: DatabaseProfile | None = None) -> AsyncEngine:
+    profile = profile or DatabaseProfile.from_settings()
+    if make_url(url).get_driver_name() == "asyncpg":
+        # Cache de prepared statements do próprio SQLAlchemy (além do cache do asyncpg)
+        url = make_url(url).update_query_dict(
+            {"prepared_statement_cache_size": str(profile.statement_cache_size)}
+        )
+    return create_async_engine(url, **profile.engine_kwargs(str(url)))
+
+
+engine = make_engine(settings.DATABASE_URL)
+# Sem réplica configurada, as leituras usam o primário
+read_engine = make_engine(settings.DATABASE_REPLICA_URL) if settings.DATABASE_REPLICA_URL else engine
+
+
+
+class WriteSession(Session):
+    """Session do primário que marca em info["wrote"] se algo foi gravado (flush)."""
+
+
+@event.listens_for(WriteSession, "after_flush")
+def _mark_written(session: Session, flush_context) -> None:
+    session.info["wrote"] = True
 
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    pool_size=settings.DB_POOL_SIZE,
-    max_overflow=settings.DB_MAX_OVERFLOW,
-    echo=(settings.ENVIRONMENT == "development"),
-)
 
 AsyncSessionLocal = sessionmaker(
     bind=engine,
     class_=AsyncSession,
+    sync_session_class=WriteSession,
+    expire_on_commit=False,
+)
+
+ReadSessionLocal = sessionmaker(
+    bind=read_engine,
+    class_=AsyncSession,
     expire_on_commit=False,
 )
 
 Base = declarative_base()
 
 
+# ── Read-your-writes ─────────────────────────────────────────────────────────
+# Quem acabou de gravar lê do primário por DB_REPLICA_PIN_SECONDS (maior que o
+# lag típico da réplica); os demais usuários continuam lendo da réplica.
+
+def has_replica() -> bool:
+    return read_engine is not engine
+
+
+def _pin_key(user_id) -> str:
+    return f"db:pin:{user_id}"
+
+
+async def pin_to_primary(redis: aioredis.Redis, user_id: uuid.UUID) -> None:
+    await redis.set(_pin_key(user_id), "1", ex=settings.DB_REPLICA_PIN_SECONDS)
+
+
+async def is_pinned(redis: aioredis.Redis, user_id: uuid.UUID | str) -> bool:
+    return bool(await redis.exists(_pin_key(user_id)))
+
+
+def _bearer_subject(request: Request) -> str | None:
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return decode_token(token).get("sub")
+    except HTTPException:
+        # Token inválido: get_current_user rejeita a requisição de qualquer forma
+        return None
+
+
+def read_session_factory(pinned: bool) -> sessionmaker:
+    return AsyncSessionLocal if pinned else ReadSessionLocal
+
+
 async def get_db():
     async with AsyncSessionLocal() as session:
         try:
@@ -26,5 +137,31 @@ async def get_db():
         except Exception:
             await session.rollback()
             raise
+        else:
+            # user_id é preenchido por get_current_user / authenticate_ws
+            user_id = session.info.get("user_id")
+            if has_replica() and user_id and session.info.get("wrote"):
+                await pin_to_primary(await get_redis(), user_id)
         finally:
             await session.close()
+
+
+async def get_read_db(request: Request):
+    """
+    Sessão para endpoints somente leitura (réplica, se configurada). Nunca faz commit.
+    Usuário que gravou há menos de DB_REPLICA_PIN_SECONDS lê do primário.
+    """
+    pinned = False
+    if has_replica():
+        subject = _bearer_subject(request)
+        pinned = subject is not None and await is_pinned(await get_redis(), subject)
+    async with read_session_factory(pinned)() as session:
+        # Caches montados a partir desta sessão podem herdar o lag da réplica
+        session.info["replica"] = has_replica() and not pinned
+        yield session
+
+
+async def dispose_engines() -> None:
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
@@ -0,0 +1,176 @@
+import asyncio
+import random
+from dataclasses import dataclass, field
+from typing import Dict, List, Protocol
+
+from app.core.config import settings
+
+
+# Resultado de cada token num envio em lote
+OK      = "ok"
+INVALID = "invalid"   # token expirado/desinstalado — deve ser removido do cadastro
+RETRY   = "retry"     # falha transitória (indisponível, cota) — vale tentar de novo
+ERROR   = "error"
+
+
+@dataclass
+class PushNotification:
+    title: str
+    body: str
+    data: Dict[str, str] = field(default_factory=dict)
+    high_priority: bool = False
+
+
+@dataclass
+class PushResult:
+    sent: int = 0
+    failed: int = 0
+    invalid_tokens: List[str] = field(default_factory=list)
+
+
+class PushProvider(Protocol):
+    async def send_batch(self, tokens: List[str], notification: PushNotification) -> List[str]:
+        """Envia um lote (≤ PUSH_BATCH_SIZE) e retorna o status de cada token, na mesma ordem."""
+        ...
+
+
+# ─────────────────────────────────────────────
+# Firebase Cloud Messaging
+# ─────────────────────────────────────────────
+
+class FirebasePushProvider:
+    def __init__(self):
+        # Import tardio: firebase-admin só é carregado quando o provedor é criado
+        # (primeiro push), não no boot de todo worker da API
+        import firebase_admin
+        from firebase_admin import credentials, exceptions, messaging
+
+        self._firebase_admin = firebase_admin
+        self._credentials = credentials
+        self._exceptions = exceptions
+        self._messaging = messaging
+        self._app = None
+
+    def _firebase_app(self):
+        if self._app is None:
+            self._app = self._firebase_admin.initialize_app(
+                self._credentials.Certificate(settings.FIREBASE_CREDENTIALS_PATH),
+                {"projectId": settings.FIREBASE_PROJECT_ID} if settings.FIREBASE_PROJECT_ID else None,
+                name="minhaturma",
+            )
+        return self._app
+
+    def _status(self, response) -> str:
+        messaging, exceptions = self._messaging, self._exceptions
+        if response.success:
+            return OK
+        exc = response.exception
+        if isinstance(exc, (messaging.UnregisteredError, messaging.SenderIdMismatchError,
+                            exceptions.InvalidArgumentError)):
+            return INVALID
+        if isinstance(exc, (exceptions.UnavailableError, exceptions.InternalError,
+                            messaging.QuotaExceededError)):
+            return RETRY
+        return ERROR
+
+    async def send_batch(self, tokens: List[str], notification: PushNotification) -> List[str]:
+        messaging, exceptions = self._messaging, self._exceptions
+        message = messaging.MulticastMessage(
+            tokens=tokens,
+            notification=messaging.Notification(title=notification.title, body=notification.body),
+            data=notification.data,
+            android=messaging.AndroidConfig(priority="high" if notification.high_priority else "normal"),
+            apns=messaging.APNSConfig(
+                headers={"apns-priority": "10" if notification.high_priority else "5"},
+            ),
+        )
+        try:
+            batch = await asyncio.to_thread(
+                messaging.send_each_for_multicast, message, app=self._firebase_app()
+            )
+        except (exceptions.UnavailableError, exceptions.InternalError):
+            return [RETRY] * len(tokens)
+        return [self._status(r) for r in batch.responses]
+
+
+# ─────────────────────────────────────────────
+# Provedor falso (desenvolvimento e benchmarks)
+# ─────────────────────────────────────────────
+
+class FakePushProvider:
+    """
+    Simula o FCM localmente: latência fixa por lote e status configurável por token.
+    Tokens com prefixo "invalid" retornam INVALID; os demais, OK.
+    """
+
+    def __init__(self, latency_seconds: float = 0.0):
+        self.latency_seconds = latency_seconds
+        self.batches: List[List[str]] = []
+        self.overrides: Dict[str, List[str]] = {}   # token → statuses por tentativa
+
+    async def send_batch(self, tokens: List[str], notification: PushNotification) -> List[str]:
+        self.batches.append(list(tokens))
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        statuses = []
+        for token in tokens:
+            if self.overrides.get(token):
+                statuses.append(self.overrides[token].pop(0))
+            else:
+                statuses.append(INVALID if token.startswith("invalid") else OK)
+        return statuses
+
+
+_provider: PushProvider | None = None
+
+
+def get_push_provider() -> PushProvider:
+    global _provider
+    if _provider is None:
+        _provider = FakePushProvider() if settings.PUSH_PROVIDER == "fake" else FirebasePushProvider()
+    return _provider
+
+
+# ─────────────────────────────────────────────
+# Envio em lote com concorrência limitada e retries
+# ─────────────────────────────────────────────
+
+async def send_multicast(
+    provider: PushProvider, tokens: List[str], notification: PushNotification,
+) -> PushResult:
+    """
+    Divide os tokens em lotes de PUSH_BATCH_SIZE, envia até PUSH_CONCURRENCY
+    lotes em paralelo e reenvia só os tokens com falha transitória
+    (backoff exponencial com jitter, até PUSH_MAX_RETRIES).
+    """
+    result = PushResult()
+    slots = asyncio.Semaphore(settings.PUSH_CONCURRENCY)
+
+    async def _send(batch: List[str]) -> None:
+        pending = batch
+        for attempt in range(settings.PUSH_MAX_RETRIES + 1):
+            if attempt:
+                delay = settings.PUSH_RETRY_BASE_SECONDS * 2 ** (attempt - 1)
+                await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+            async with slots:
+                statuses = await provider.send_batch(pending, notification)
+
+            retry = []
+            for token, status in zip(pending, statuses):
+                if status == OK:
+                    result.sent += 1
+                elif status == INVALID:
+                    result.failed += 1
+                    result.invalid_tokens.append(token)
+                elif status == RETRY:
+                    retry.append(token)
+                else:
+                    result.failed += 1
+            if not retry:
+                return
+            pending = retry
+        result.failed += len(pending)
+
+    size = settings.PUSH_BATCH_SIZE
+    await asyncio.gather(*[_send(tokens[i:i + size]) for i in range(0, len(tokens), size)])
+    return result
@@ -0,0 +1,108 @@
+import secrets
+import time
+from collections import deque
+from typing import Callable, Dict, List, Tuple
+
+import redis.asyncio as aioredis
+
+
+class TokenBucket:
+    """
+    Token bucket em memória: até `capacity` eventos seguidos, repostos a `rate`
+    por segundo. Não é thread-safe — cada bucket vive no event loop de um worker.
+    """
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self) -> bool:
+        self._refill()
+        return self.tokens >= 1
+
+    def take(self) -> bool:
+        if not self.available():
+            return False
+        self.tokens -= 1
+        return True
+
+    def wait_time(self) -> float:
+        """Segundos até haver um token disponível."""
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+# ── Janela deslizante (limites de API) ───────────────────────────────────────
+# Uma verificação cobre várias chaves (ex.: IP e e-mail): a tentativa só é
+# contada se couber em todas. Retorno: 0 = permitido, senão segundos até liberar.
+
+Limits = List[Tuple[str, int]]  # [(chave, máximo de tentativas na janela)]
+
+# KEYS: chaves (sorted sets) | ARGV: agora_ms, janela_ms, membro, limite de cada chave
+SLIDING_WINDOW_LUA = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local retry = 0
+for i, key in ipairs(KEYS) do
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+    if redis.call('ZCARD', key) >= tonumber(ARGV[3 + i]) then
+        local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+        retry = math.max(retry, tonumber(oldest[2]) + window - now)
+    end
+end
+if retry > 0 then
+    return retry
+end
+for _, key in ipairs(KEYS) do
+    redis.call('ZADD', key, now, ARGV[3])
+    redis.call('PEXPIRE', key, window)
+end
+return 0
+"""
+
+
+class RedisSlidingWindow:
+    """Janela deslizante num sorted set por chave; um EVALSHA (atômico) por verificação."""
+
+    def __init__(self, redis: aioredis.Redis):
+        self._script = redis.register_script(SLIDING_WINDOW_LUA)
+
+    async def hit(self, limits: Limits, window_seconds: float) -> float:
+        now_ms = int(time.time() * 1000)
+        member = f"{now_ms}-{secrets.token_hex(4)}"
+        retry_ms = await self._script(
+            keys=[key for key, _ in limits],
+            args=[now_ms, int(window_seconds * 1000), member, *(limit for _, limit in limits)],
+        )
+        return int(retry_ms) / 1000
+
+
+class MemorySlidingWindow:
+    """Mesma semântica do RedisSlidingWindow, em memória (testes e benchmark)."""
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self._hits: Dict[str, deque] = {}
+
+    async def hit(self, limits: Limits, window_seconds: float) -> float:
+        now = self.clock()
+        retry = 0.0
+        for key, limit in limits:
+            hits = self._hits.setdefault(key, deque())
+            while hits and hits[0] <= now - window_seconds:
+                hits.popleft()
+            if len(hits) >= limit:
+                retry = max(retry, hits[0] + window_seconds - now)
+        if retry > 0:
+            return retry
+        for key, _ in limits:
+            self._hits[key].append(now)
+        return 0.0
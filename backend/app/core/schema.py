@@ -0,0 +1,53 @@
+"""
+Checagem do schema no startup (DB_SCHEMA_MODE).
+
+  verify — padrão: uma única query em alembic_version. As migrações rodam fora
+           dos workers (`alembic upgrade head` no deploy), então N workers
+           subindo juntos não disputam DDL nem varrem o catálogo.
+  create — Base.metadata.create_all, para desenvolvimento sem Alembic
+  off    — nenhuma checagem
+
+As revisões são numeradas em sequência (0001, 0002, ...). Um banco numa
+revisão mais nova que a do código é aceito: durante um rolling deploy os
+workers antigos continuam subindo depois que a migração (compatível com a
+versão anterior) já foi aplicada.
+"""
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.config import settings
+from app.core.database import Base
+
+# Head de migrations/versions — atualizar junto com cada nova migração
+SCHEMA_REVISION = "0003"
+
+
+class SchemaMismatchError(RuntimeError):
+    pass
+
+
+async def current_revision(engine: AsyncEngine) -> str | None:
+    async with engine.connect() as conn:
+        try:
+            return (await conn.execute(text("SELECT version_num FROM alembic_version"))).scalar_one_or_none()
+        except DBAPIError:
+            return None   # banco nunca migrado
+
+
+async def verify_schema(engine: AsyncEngine) -> None:
+    revision = await current_revision(engine)
+    if revision is None or revision < SCHEMA_REVISION:
+        raise SchemaMismatchError(
+            f"Banco na revisão {revision or '(nenhuma)'}, o código requer {SCHEMA_REVISION}: "
+            "rode `alembic upgrade head`"
+        )
+
+
+async def prepare_schema(engine: AsyncEngine, mode: str | None = None) -> None:
+    mode = mode or settings.DB_SCHEMA_MODE
+    if mode == "verify":
+        await verify_schema(engine)
+    elif mode == "create":
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
@@ -1,8 +1,14 @@
-from datetime import datetime, timedelta, UTC
+import binascii
+import json
+import secrets
+import time
+from collections import OrderedDict
+from datetime import timedelta
 from typing import Optional, Dict, Any
 import bcrypt
-import httpx
 import jwt
+from jwt.algorithms import get_default_algorithms
+from jwt.utils import base64url_decode, base64url_encode
 from fastapi import HTTPException, status
 
 from app.core.config import settings
@@ -23,34 +29,162 @@ def verify_password(plain: str, hashed: str) -> bool:
 # JWT Tokens
 # ─────────────────────────────────────────────
 
+def _invalid(detail: str = "Token inválido") -> HTTPException:
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=detail)
+
+
+class TokenService:
+    """
+    Emite e verifica os JWT da API com chaves e algoritmo preparados uma vez.
+
+    - HS256 (padrão) usa SECRET_KEY; EdDSA/ES256 usam JWT_PRIVATE_KEY para
+      assinar e JWT_PUBLIC_KEY para verificar — outros serviços validam os
+      tokens só com a chave pública (GET /auth/jwks), sem o SECRET_KEY.
+    - O header é serializado uma vez; emitir um token é só payload + assinatura.
+    - Verificação: assinatura + exp (as únicas claims que a API usa). Tokens já
+      verificados ficam num LRU por até JWT_VERIFY_CACHE_SECONDS (nunca além do
+      exp), e a mesma bearer em requisições seguidas não é reverificada.
+    """
+
+    def __init__(
+        self,
+        algorithm: str,
+        signing_key: str,
+        verifying_key: str,
+        key_id: str = "",
+        cache_size: int = 10_000,
+        cache_ttl: float = 30,
+    ):
+        try:
+            self._alg = get_default_algorithms()[algorithm]
+        except KeyError:
+            raise ValueError(f"Algoritmo JWT não suportado: {algorithm}")
+        self.algorithm = algorithm
+        self.key_id = key_id
+        self._signing_key = self._alg.prepare_key(signing_key) if signing_key else None
+        self._verifying_key = self._alg.prepare_key(verifying_key)
+        header = {"alg": algorithm, "typ": "JWT", **({"kid": key_id} if key_id else {})}
+        self._header = base64url_encode(json.dumps(header, separators=(",", ":"), sort_keys=True).encode())
+        self._cache: OrderedDict[str, tuple[float, Dict[str, Any]]] = OrderedDict()
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+
+    @classmethod
+    def from_settings(cls) -> "TokenService":
+        if settings.ALGORITHM.startswith("HS"):
+            signing_key = verifying_key = settings.SECRET_KEY
+        else:
+            signing_key, verifying_key = settings.JWT_PRIVATE_KEY, settings.JWT_PUBLIC_KEY
+        return cls(
+            settings.ALGORITHM,
+            signing_key,
+            verifying_key,
+            key_id=settings.JWT_KEY_ID,
+            cache_size=settings.JWT_VERIFY_CACHE_SIZE,
+            cache_ttl=settings.JWT_VERIFY_CACHE_SECONDS,
+        )
+
+    @property
+    def asymmetric(self) -> bool:
+        return not self.algorithm.startswith("HS")
+
+    def encode(self, claims: Dict[str, Any], token_type: str, expires_in: timedelta) -> str:
+        if self._signing_key is None:
+            raise RuntimeError("TokenService sem chave privada: só verifica tokens")
+        now = time.time()
+        payload = {
+            "jti": secrets.token_urlsafe(12),
+            **claims,
+            "iat": now,
+            "exp": int(now + expires_in.total_seconds()),
+            "type": token_type,
+        }
+        signing_input = self._header + b"." + base64url_encode(
+            json.dumps(payload, separators=(",", ":")).encode()
+        )
+        signature = self._alg.sign(signing_input, self._signing_key)
+        return (signing_input + b"." + base64url_encode(signature)).decode()
+
+    def decode(self, token: str) -> Dict[str, Any]:
+        now = time.time()
+        cached = self._cache.get(token)
+        if cached is not None:
+            if cached[0] > now:
+                self._cache.move_to_end(token)
+                return dict(cached[1])
+            del self._cache[token]
+
+        payload = self._verify(token)
+        exp = payload.get("exp")
+        if exp is not None:
+            if not isinstance(exp, (int, float)):
+                raise _invalid()
+            if exp <= now:
+                raise _invalid("Token expirado")
+
+        self._cache[token] = (min(now + self.cache_ttl, exp if exp is not None else now + self.cache_ttl), payload)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return dict(payload)
+
+    def _verify(self, token: str) -> Dict[str, Any]:
+        try:
+            header_b64, payload_b64, signature_b64 = token.encode().split(b".")
+            if header_b64 != self._header:
+                # Header de outro emissor (ex.: sem kid): só o algoritmo precisa bater
+                if json.loads(base64url_decode(header_b64)).get("alg") != self.algorithm:
+                    raise _invalid()
+            if not self._alg.verify(header_b64 + b"." + payload_b64, self._verifying_key,
+                                    base64url_decode(signature_b64)):
+                raise _invalid()
+            payload = json.loads(base64url_decode(payload_b64))
+        except (ValueError, binascii.Error, AttributeError, UnicodeError):
+            raise _invalid()
+        if not isinstance(payload, dict):
+            raise _invalid()
+        return payload
+
+    def jwks(self) -> Dict[str, Any]:
+        """Chave pública em formato JWKS (só para algoritmos assimétricos)."""
+        jwk = self._alg.to_jwk(self._verifying_key, as_dict=True)
+        jwk.update(alg=self.algorithm, use="sig", **({"kid": self.key_id} if self.key_id else {}))
+        return {"keys": [jwk]}
+
+
+_token_service: TokenService | None = None
+
+
+def get_token_service() -> TokenService:
+    global _token_service
+    if _token_service is None:
+        _token_service = TokenService.from_settings()
+    return _token_service
+
+
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
-    to_encode = data.copy()
-    expire = datetime.now(UTC).replace(tzinfo=None) + (expires_delta or timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire, "type": "access"})
-    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    expires = expires_delta or timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    return get_token_service().encode(data, "access", expires)
 
 def create_refresh_token(data: Dict[str, Any]) -> str:
-    to_encode = data.copy()
-    expire = datetime.now(UTC).replace(tzinfo=None) + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"exp": expire, "type": "refresh"})
-    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    return get_token_service().encode(data, "refresh", timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS))
 
 def decode_token(token: str) -> Dict[str, Any]:
-    try:
-        return jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token expirado")
-    except jwt.InvalidTokenError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido")
+    return get_token_service().decode(token)
 
 
 # ─────────────────────────────────────────────
 # OAuth Providers — Verificação de tokens externos
 # ─────────────────────────────────────────────
 
+def _http_client():
+    # Import tardio: httpx só é usado no login social e pesa no boot do worker
+    import httpx
+    return httpx.AsyncClient()
+
+
 async def verify_google_token(token: str) -> Dict[str, Any]:
     """Verifica token ID do Google e retorna dados do usuário."""
-    async with httpx.AsyncClient() as client:
+    async with _http_client() as client:
         resp = await client.get(
             "https://oauth2.googleapis.com/tokeninfo",
             params={"id_token": token}
@@ -70,7 +204,7 @@ async def verify_google_token(token: str) -> Dict[str, Any]:
 
 async def verify_facebook_token(token: str) -> Dict[str, Any]:
     """Verifica token do Facebook e retorna dados do usuário."""
-    async with httpx.AsyncClient() as client:
+    async with _http_client() as client:
         resp = await client.get(
             "https://graph.facebook.com/me",
             params={"access_token": token, "fields": "id,name,email,picture"}
@@ -104,7 +238,7 @@ async def verify_apple_token(token: str) -> Dict[str, Any]:
 
 async def verify_microsoft_token(token: str) -> Dict[str, Any]:
     """Verifica token Microsoft/Azure AD."""
-    async with httpx.AsyncClient() as client:
+    async with _http_client() as client:
         resp = await client.get(
             "https://graph.microsoft.com/v1.0/me",
             headers={"Authorization": f"Bearer {token}"}
@@ -0,0 +1,66 @@
+"""
+Server-Sent Events sobre o ConnectionManager dos WebSockets.
+
+SSEConnection imita a parte de WebSocket que o manager usa (accept, send_json,
+close), então um stream SSE entra nos mesmos grupos, recebe o mesmo broadcast
+(com a mesma fila de saída por conexão, limite de pendentes e prioridade do
+SOS) e participa do heartbeat e do drain:
+
+  ping      → comentário ": ping" (mantém proxies e load balancers abertos)
+  reconnect → "retry: <ms>" e fim do stream (o EventSource reconecta sozinho)
+  demais    → "event: <type>" + "data: <json>", com "id:" quando o frame tem event_id
+"""
+import asyncio
+import json
+from typing import AsyncIterator
+
+_CLOSED = object()
+
+
+def format_event(frame: dict) -> str:
+    kind = frame.get("type")
+    if kind == "ping":
+        return ": ping\n\n"
+    if kind == "reconnect":
+        return f"retry: {int(frame['retry_after_ms'])}\n\n"
+    lines = []
+    if "event_id" in frame:
+        lines.append(f"id: {frame['event_id']}")
+    if kind:
+        lines.append(f"event: {kind}")
+    lines.append(f"data: {json.dumps(frame)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class SSEConnection:
+    """Destino de broadcast que entrega os frames a um gerador de resposta HTTP."""
+
+    def __init__(self) -> None:
+        # Uma vaga só: o excesso fica na fila de saída do manager, que descarta
+        # as posições mais antigas de um cliente lento
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self.closed = False
+
+    async def accept(self) -> None:
+        pass
+
+    async def send_json(self, data: dict) -> None:
+        if self.closed:
+            raise RuntimeError("stream encerrado")
+        await self._queue.put(data)
+
+    async def close(self, code: int = 1000) -> None:
+        if not self.closed:
+            self.closed = True
+            # Sem esperar: com a fila cheia, frames() vê `closed` depois de ler o frame
+            if not self._queue.full():
+                self._queue.put_nowait(_CLOSED)
+
+    async def frames(self) -> AsyncIterator[dict]:
+        while True:
+            if self.closed and self._queue.empty():
+                return
+            data = await self._queue.get()
+            if data is _CLOSED:
+                return
+            yield data
@@ -0,0 +1,204 @@
+import asyncio
+import uuid
+from typing import Any, Dict
+
+from fastapi import HTTPException, UploadFile
+
+from app.core.config import settings
+
+# O S3 exige partes de no mínimo 5 MiB (exceto a última)
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+MEDIA_EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/png":  "png",
+    "video/mp4":  "mp4",
+}
+
+_s3_client = None
+
+
+def get_s3():
+    """Cliente S3 singleton (boto3 é thread-safe; chamadas rodam via asyncio.to_thread)."""
+    global _s3_client
+    if _s3_client is None:
+        # Import tardio: boto3 só é carregado no primeiro acesso ao S3, não no boot
+        import boto3
+        from botocore.config import Config
+
+        _s3_client = boto3.client(
+            "s3",
+            region_name=settings.AWS_REGION,
+            endpoint_url=settings.S3_ENDPOINT_URL or None,   # MinIO / S3 local
+            aws_access_key_id=settings.AWS_ACCESS_KEY_ID or None,
+            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY or None,
+            config=Config(signature_version="s3v4"),
+        )
+    return _s3_client
+
+
+# ─────────────────────────────────────────────
+# Validação
+# ─────────────────────────────────────────────
+
+def _max_upload_bytes() -> int:
+    return settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024
+
+
+def check_content_type(content_type: str | None) -> str:
+    if content_type not in settings.ALLOWED_MEDIA_TYPES or content_type not in MEDIA_EXTENSIONS:
+        raise HTTPException(status_code=415, detail="Tipo de mídia não permitido")
+    return content_type
+
+
+def _check_signature(head: bytes, content_type: str) -> None:
+    """Confere os magic bytes do início do arquivo contra o content-type declarado."""
+    if content_type == "image/jpeg":
+        valid = head.startswith(b"\xff\xd8\xff")
+    elif content_type == "image/png":
+        valid = head.startswith(b"\x89PNG\r\n\x1a\n")
+    elif content_type == "video/mp4":
+        valid = head[4:8] == b"ftyp"
+    else:
+        valid = False
+    if not valid:
+        raise HTTPException(status_code=415, detail="Conteúdo não corresponde ao tipo de mídia")
+
+
+def media_key(group_id: uuid.UUID, content_type: str) -> str:
+    return f"grupos/{group_id}/{uuid.uuid4()}.{MEDIA_EXTENSIONS[content_type]}"
+
+
+# ─────────────────────────────────────────────
+# Upload em streaming (multipart)
+# ─────────────────────────────────────────────
+
+async def _upload_part(
+    s3, key: str, upload_id: str, part_number: int, body: bytes, slots: asyncio.Semaphore,
+) -> Dict[str, Any]:
+    try:
+        resp = await asyncio.to_thread(
+            s3.upload_part,
+            Bucket=settings.AWS_S3_BUCKET,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=body,
+        )
+        return {"PartNumber": part_number, "ETag": resp["ETag"]}
+    finally:
+        slots.release()
+
+
+async def stream_upload(file: UploadFile, key: str, content_type: str) -> int:
+    """
+    Envia o arquivo ao S3 lendo uma parte por vez, sem carregar o arquivo inteiro.
+    Tipo (magic bytes) e tamanho são validados durante a leitura.
+
+    Arquivos menores que uma parte vão num PUT simples; os demais em multipart,
+    com até S3_UPLOAD_CONCURRENCY partes em voo. Memória por request:
+    no máximo (S3_UPLOAD_CONCURRENCY + 1) × parte. Retorna o total de bytes.
+    """
+    s3 = get_s3()
+    max_bytes = _max_upload_bytes()
+    part_size = max(settings.S3_MULTIPART_CHUNK_MB * 1024 * 1024, MIN_PART_SIZE)
+
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail="Arquivo excede o tamanho máximo")
+
+    chunk = await file.read(part_size)
+    if not chunk:
+        raise HTTPException(status_code=400, detail="Arquivo vazio")
+    _check_signature(chunk, content_type)
+
+    if len(chunk) < part_size:
+        await asyncio.to_thread(
+            s3.put_object,
+            Bucket=settings.AWS_S3_BUCKET,
+            Key=key,
+            Body=chunk,
+            ContentType=content_type,
+        )
+        return len(chunk)
+
+    upload = await asyncio.to_thread(
+        s3.create_multipart_upload,
+        Bucket=settings.AWS_S3_BUCKET,
+        Key=key,
+        ContentType=content_type,
+    )
+    upload_id = upload["UploadId"]
+    slots = asyncio.Semaphore(settings.S3_UPLOAD_CONCURRENCY)
+    tasks: list[asyncio.Task] = []
+    total = 0
+
+    try:
+        part_number = 1
+        while chunk:
+            total += len(chunk)
+            if total > max_bytes:
+                raise HTTPException(status_code=413, detail="Arquivo excede o tamanho máximo")
+
+            # Backpressure: só lê a próxima parte quando houver vaga para enviá-la
+            await slots.acquire()
+            tasks.append(asyncio.create_task(
+                _upload_part(s3, key, upload_id, part_number, chunk, slots)
+            ))
+            failed = [t for t in tasks if t.done() and t.exception() is not None]
+            if failed:
+                raise failed[0].exception()
+
+            part_number += 1
+            chunk = await file.read(part_size)
+
+        parts = await asyncio.gather(*tasks)
+        await asyncio.to_thread(
+            s3.complete_multipart_upload,
+            Bucket=settings.AWS_S3_BUCKET,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.to_thread(
+            s3.abort_multipart_upload,
+            Bucket=settings.AWS_S3_BUCKET,
+            Key=key,
+            UploadId=upload_id,
+        )
+        raise
+
+    return total
+
+
+# ─────────────────────────────────────────────
+# URLs pré-assinadas
+# ─────────────────────────────────────────────
+
+def presigned_upload(key: str, content_type: str) -> Dict[str, Any]:
+    """
+    POST pré-assinado para o cliente enviar direto ao S3 (vídeos grandes não
+    passam pelos workers da API). O S3 impõe tipo e tamanho máximo.
+    """
+    return get_s3().generate_presigned_post(
+        Bucket=settings.AWS_S3_BUCKET,
+        Key=key,
+        Fields={"Content-Type": content_type},
+        Conditions=[
+            {"Content-Type": content_type},
+            ["content-length-range", 1, _max_upload_bytes()],
+        ],
+        ExpiresIn=settings.S3_PRESIGN_EXPIRE_SECONDS,
+    )
+
+
+def media_url(key: str) -> str:
+    """URL pré-assinada de leitura da mídia."""
+    return get_s3().generate_presigned_url(
+        "get_object",
+        Params={"Bucket": settings.AWS_S3_BUCKET, "Key": key},
+        ExpiresIn=settings.S3_PRESIGN_EXPIRE_SECONDS,
+    )
@@ -0,0 +1,144 @@
+"""
+Área de interesse das conexões: cada socket pode registrar o viewport do mapa
+(retângulo) ou um raio em volta de um ponto, e só recebe as posições que caem
+dentro dele.
+
+Cada grupo tem um InterestIndex: grade de células de WS_VIEWPORT_CELL_DEG
+graus, célula → conexões cujo viewport a cobre. Uma posição consulta só a
+célula onde caiu (e confirma o contains exato), então o custo do broadcast
+acompanha quantos estão olhando aquele ponto, não o tamanho do grupo.
+
+  - conexão sem viewport: recebe tudo (comportamento anterior)
+  - viewport que cobriria mais de WS_VIEWPORT_MAX_CELLS células (mapa muito
+    afastado): fica numa lista à parte, testada a cada posição
+"""
+import math
+from dataclasses import dataclass
+from typing import Dict, Hashable, Iterator, List, Set, Tuple
+
+Cell = Tuple[int, int]
+
+_M_PER_DEG_LAT = 111_320.0
+
+
+@dataclass(frozen=True)
+class Viewport:
+    south: float
+    west: float
+    north: float
+    east: float   # east < west: o retângulo cruza o antimeridiano
+    center: Tuple[float, float] | None = None
+    radius_m: float | None = None
+
+    @classmethod
+    def from_bbox(cls, south: float, west: float, north: float, east: float) -> "Viewport":
+        if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+            raise ValueError("bbox inválido")
+        return cls(south, west, north, east)
+
+    @classmethod
+    def from_radius(cls, lat: float, lng: float, radius_m: float) -> "Viewport":
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180 and radius_m > 0):
+            raise ValueError("raio inválido")
+        dlat = radius_m / _M_PER_DEG_LAT
+        south, north = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+        cos_lat = math.cos(math.radians(max(abs(south), abs(north))))
+        dlng = radius_m / (_M_PER_DEG_LAT * cos_lat) if cos_lat > 1e-9 else 360.0
+        if dlng >= 180:
+            west, east = -180.0, 180.0
+        else:
+            west, east = _wrap(lng - dlng), _wrap(lng + dlng)
+        return cls(south, west, north, east, center=(lat, lng), radius_m=radius_m)
+
+    def contains(self, lat: float, lng: float) -> bool:
+        if not self.south <= lat <= self.north:
+            return False
+        if self.west <= self.east:
+            if not self.west <= lng <= self.east:
+                return False
+        elif not (lng >= self.west or lng <= self.east):
+            return False
+        if self.radius_m is None:
+            return True
+        return _distance_m(self.center[0], self.center[1], lat, lng) <= self.radius_m
+
+    def _lng_ranges(self) -> List[Tuple[float, float]]:
+        if self.west <= self.east:
+            return [(self.west, self.east)]
+        return [(self.west, 180.0), (-180.0, self.east)]
+
+    def cell_count(self, cell_deg: float) -> int:
+        rows = _index(self.north, cell_deg) - _index(self.south, cell_deg) + 1
+        cols = sum(_index(e, cell_deg) - _index(w, cell_deg) + 1 for w, e in self._lng_ranges())
+        return rows * cols
+
+    def cells(self, cell_deg: float) -> Iterator[Cell]:
+        for row in range(_index(self.south, cell_deg), _index(self.north, cell_deg) + 1):
+            for west, east in self._lng_ranges():
+                for col in range(_index(west, cell_deg), _index(east, cell_deg) + 1):
+                    yield row, col
+
+
+def _wrap(lng: float) -> float:
+    return (lng + 180.0) % 360.0 - 180.0
+
+
+def _index(deg: float, cell_deg: float) -> int:
+    return math.floor(deg / cell_deg)
+
+
+def _distance_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    # Equiretangular: erro desprezível nas distâncias de um viewport
+    dlng = abs(lng2 - lng1)
+    dlng = min(dlng, 360.0 - dlng)
+    x = math.radians(dlng) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return math.hypot(x, y) * 6_371_000.0
+
+
+class InterestIndex:
+    """Conexões de um grupo indexadas pelo viewport."""
+
+    def __init__(self, cell_deg: float, max_cells: int):
+        self.cell_deg = cell_deg
+        self.max_cells = max_cells
+        self.open: Set[Hashable] = set()                       # sem viewport: recebem tudo
+        self.wide: Dict[Hashable, Viewport] = {}               # viewports grandes demais para a grade
+        self.grid: Dict[Cell, Dict[Hashable, Viewport]] = {}
+        self._cells: Dict[Hashable, List[Cell]] = {}
+
+    def __len__(self) -> int:
+        return len(self.open) + len(self.wide) + len(self._cells)
+
+    def add(self, conn: Hashable, viewport: Viewport | None) -> None:
+        """Inclui (ou reposiciona) a conexão com o viewport atual dela."""
+        self.remove(conn)
+        if viewport is None:
+            self.open.add(conn)
+        elif viewport.cell_count(self.cell_deg) > self.max_cells:
+            self.wide[conn] = viewport
+        else:
+            cells = list(viewport.cells(self.cell_deg))
+            for cell in cells:
+                self.grid.setdefault(cell, {})[conn] = viewport
+            self._cells[conn] = cells
+
+    def remove(self, conn: Hashable) -> None:
+        self.open.discard(conn)
+        self.wide.pop(conn, None)
+        for cell in self._cells.pop(conn, ()):
+            members = self.grid[cell]
+            members.pop(conn, None)
+            if not members:
+                del self.grid[cell]
+
+    def receivers(self, lat: float, lng: float) -> Iterator[Hashable]:
+        """Conexões interessadas numa posição (cada uma no máximo uma vez)."""
+        yield from self.open
+        cell = (_index(lat, self.cell_deg), _index(lng, self.cell_deg))
+        for conn, viewport in self.grid.get(cell, {}).items():
+            if viewport.contains(lat, lng):
+                yield conn
+        for conn, viewport in self.wide.items():
+            if viewport.contains(lat, lng):
+                yield conn
@@ -0,0 +1,250 @@
+"""
+Conexões WebSocket por grupo: fila de saída por conexão, heartbeat e drain.
+
+Heartbeat: o ASGI não expõe ping/pong do protocolo, então o servidor envia
+{"type": "ping", "ts"} a cada ping_interval e o cliente responde com
+{"type": "pong"} (qualquer frame serve). receive_json() fecha com
+WS_CLOSE_IDLE o socket que passar idle_timeout sem mandar nada — conexões
+meio-abertas de celular saem de `active` sem depender de um broadcast falhar.
+
+Área de interesse: set_viewport() registra o viewport da conexão e
+broadcast(..., at=(lat, lng)) entrega só a quem tem a posição dentro dele
+(InterestIndex por grupo, app/core/ws_interest.py). Frames sem `at` (SOS,
+chat) continuam indo para todos.
+
+Drain (shutdown/deploy): cada cliente recebe {"type": "reconnect",
+"retry_after_ms"} com atraso sorteado e o socket é fechado com 1012, de modo
+que os clientes voltam espalhados no tempo, não todos no mesmo instante.
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Iterable
+
+from fastapi import WebSocket, WebSocketDisconnect, WebSocketException
+
+from app.core.ws_interest import InterestIndex, Viewport
+
+logger = logging.getLogger(__name__)
+
+WS_CLOSE_IDLE = 4008            # sem frames do cliente por idle_timeout
+WS_CLOSE_SERVICE_RESTART = 1012
+
+
+class _Outbox:
+    """
+    Fila de saída de uma conexão, esvaziada por uma task própria.
+    Frames prioritários (SOS) saem antes de qualquer frame normal ainda não enviado.
+    """
+
+    def __init__(self, ws: WebSocket, max_pending: int | None):
+        self.ws = ws
+        self.priority: deque[dict] = deque()
+        # Com limite, o cliente lento perde os frames normais mais antigos
+        # (posições já superadas) em vez de acumular memória no servidor.
+        self.normal: deque[dict] = deque(maxlen=max_pending)
+        self.ready = asyncio.Event()
+        self.groups: set[str] = set()
+        self.viewport: Viewport | None = None
+        self.task: asyncio.Task | None = None
+
+    def put(self, data: dict, priority: bool) -> None:
+        (self.priority if priority else self.normal).append(data)
+        self.ready.set()
+
+    def next_frame(self) -> dict | None:
+        if self.priority:
+            return self.priority.popleft()
+        if self.normal:
+            return self.normal.popleft()
+        return None
+
+
+class ConnectionManager:
+    """Conexões WebSocket abertas neste worker, agrupadas por canal (group_id)."""
+
+    def __init__(
+        self,
+        max_pending: int | None = None,
+        ping_interval: float | None = None,
+        idle_timeout: float | None = None,
+        viewport_cell_deg: float = 0.05,
+        viewport_max_cells: int = 400,
+    ):
+        self.active: dict[str, list[WebSocket]] = {}
+        self.max_pending = max_pending
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        self.viewport_cell_deg = viewport_cell_deg
+        self.viewport_max_cells = viewport_max_cells
+        self._interest: dict[str, InterestIndex] = {}
+        self.draining = False
+        self._outboxes: dict[WebSocket, _Outbox] = {}
+        self._heartbeat: asyncio.Task | None = None
+
+    async def connect(self, group_id: str, ws: WebSocket):
+        await self.connect_many([group_id], ws)
+
+    async def connect_many(self, group_ids: Iterable[str], ws: WebSocket):
+        if self.draining:
+            # Worker encerrando: o cliente tenta outra instância
+            raise WebSocketException(code=WS_CLOSE_SERVICE_RESTART)
+        await ws.accept()
+        # A fila de saída (e o ping) pertence à conexão, mesmo sem nenhum grupo
+        self._open(ws)
+        for group_id in group_ids:
+            self.subscribe(group_id, ws)
+
+    def _open(self, ws: WebSocket) -> _Outbox:
+        outbox = self._outboxes.get(ws)
+        if outbox is None:
+            outbox = self._outboxes[ws] = _Outbox(ws, self.max_pending)
+            outbox.task = asyncio.create_task(self._writer(outbox))
+        if self.ping_interval and (self._heartbeat is None or self._heartbeat.done()):
+            self._heartbeat = asyncio.create_task(self._ping_loop())
+        return outbox
+
+    def subscribe(self, group_id: str, ws: WebSocket):
+        """Inclui uma conexão em mais um grupo (WebSocket multiplexado)."""
+        if ws not in self.active.setdefault(group_id, []):
+            self.active[group_id].append(ws)
+        outbox = self._open(ws)
+        outbox.groups.add(group_id)
+        index = self._interest.get(group_id)
+        if index is None:
+            index = self._interest[group_id] = InterestIndex(self.viewport_cell_deg, self.viewport_max_cells)
+        index.add(ws, outbox.viewport)
+
+    def unsubscribe(self, group_id: str, ws: WebSocket):
+        """Tira a conexão do grupo; ela continua aberta (fila de saída e ping)."""
+        connections = self.active.get(group_id, [])
+        if ws in connections:
+            connections.remove(ws)
+        if not connections:
+            self.active.pop(group_id, None)
+        index = self._interest.get(group_id)
+        if index is not None:
+            index.remove(ws)
+            if not len(index):
+                del self._interest[group_id]
+        outbox = self._outboxes.get(ws)
+        if outbox is not None:
+            outbox.groups.discard(group_id)
+
+    def disconnect(self, group_id: str, ws: WebSocket):
+        """Sai do grupo; a conexão é encerrada quando não resta nenhum (sockets de um grupo só)."""
+        self.unsubscribe(group_id, ws)
+        outbox = self._outboxes.get(ws)
+        if outbox is not None and not outbox.groups:
+            self.close(ws)
+
+    def close(self, ws: WebSocket):
+        """Conexão encerrada: sai de todos os grupos e descarta a fila de saída."""
+        outbox = self._outboxes.pop(ws, None)
+        if outbox is not None:
+            for group_id in list(outbox.groups):
+                self.unsubscribe(group_id, ws)
+            if outbox.task is not None and outbox.task is not asyncio.current_task():
+                outbox.task.cancel()
+        if not self._outboxes and self._heartbeat is not None:
+            self._heartbeat.cancel()
+
+    def set_viewport(self, ws: WebSocket, viewport: Viewport | None):
+        """Área de interesse da conexão em todos os grupos dela (None = tudo)."""
+        outbox = self._outboxes.get(ws)
+        if outbox is None:
+            return
+        outbox.viewport = viewport
+        for group_id in outbox.groups:
+            self._interest[group_id].add(ws, viewport)
+
+    async def send(self, ws: WebSocket, data: dict):
+        """Frame só para esta conexão (respostas de controle), pela mesma fila de saída."""
+        outbox = self._outboxes.get(ws)
+        if outbox is not None:
+            outbox.put(data, priority=True)
+        else:
+            await ws.send_json(data)
+
+    async def broadcast(
+        self, group_id: str, data: dict, priority: bool = False, at: tuple[float, float] | None = None,
+    ):
+        """
+        Enfileira o frame para as conexões do grupo (não espera o envio). Com
+        at=(lat, lng), só para as que têm a posição dentro do viewport.
+        """
+        if at is None:
+            targets = self.active.get(group_id, [])
+        else:
+            index = self._interest.get(group_id)
+            targets = index.receivers(*at) if index is not None else ()
+        for ws in targets:
+            outbox = self._outboxes.get(ws)
+            if outbox is not None:
+                outbox.put(data, priority)
+
+    async def receive_json(self, ws: WebSocket) -> dict:
+        """
+        Próximo frame do cliente, já sem os pongs. Fecha com WS_CLOSE_IDLE e
+        levanta WebSocketDisconnect se nada chegar em idle_timeout.
+        """
+        while True:
+            try:
+                async with asyncio.timeout(self.idle_timeout):
+                    data = await ws.receive_json()
+            except TimeoutError:
+                try:
+                    await ws.close(code=WS_CLOSE_IDLE)
+                except Exception:
+                    pass  # socket meio-aberto: o close pode falhar
+                raise WebSocketDisconnect(WS_CLOSE_IDLE)
+            if not (isinstance(data, dict) and data.get("type") == "pong"):
+                return data
+
+    async def _ping_loop(self):
+        # Uma task por manager (não por socket); cancelada quando a última conexão sai
+        while self._outboxes:
+            await asyncio.sleep(self.ping_interval)
+            ping = {"type": "ping", "ts": time.time()}
+            for outbox in list(self._outboxes.values()):
+                outbox.put(ping, priority=True)
+
+    async def drain(self, base_ms: int = 0, jitter_ms: int = 0, timeout: float = 1.0) -> int:
+        """
+        Encerra todas as conexões pedindo reconexão em base_ms + U(0, jitter_ms).
+        Novas conexões são recusadas a partir daqui. Retorna quantas fechou.
+        """
+        self.draining = True
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+        outboxes = list(self._outboxes.values())
+
+        async def _close(outbox: _Outbox) -> None:
+            if outbox.task is not None:
+                outbox.task.cancel()
+            retry_after_ms = base_ms + random.randint(0, jitter_ms)
+            try:
+                async with asyncio.timeout(timeout):
+                    await outbox.ws.send_json({"type": "reconnect", "retry_after_ms": retry_after_ms})
+                    await outbox.ws.close(code=WS_CLOSE_SERVICE_RESTART)
+            except Exception:
+                pass  # cliente lento ou já desconectado: o close do servidor resolve
+            self.close(outbox.ws)
+
+        await asyncio.gather(*(_close(outbox) for outbox in outboxes))
+        if outboxes:
+            logger.info("Drain: %s conexões WebSocket encerradas", len(outboxes))
+        return len(outboxes)
+
+    async def _writer(self, outbox: _Outbox):
+        while True:
+            await outbox.ready.wait()
+            outbox.ready.clear()
+            while (frame := outbox.next_frame()) is not None:
+                try:
+                    await outbox.ws.send_json(frame)
+                except Exception:
+                    self.close(outbox.ws)
+                    return
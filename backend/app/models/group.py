@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Text, Enum
+from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Text, Enum, Index, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 import enum
@@ -32,6 +32,11 @@ class Group(Base):
 
 class GroupMember(Base):
     __tablename__ = "group_members"
+    __table_args__ = (
+        # Uma filiação por usuário/grupo; também atende "membros do grupo" (prefixo group_id)
+        UniqueConstraint("group_id", "user_id", name="uq_group_members_group_user"),
+        Index("ix_group_members_user_id", "user_id"),
+    )
 
     id         = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     group_id   = Column(UUID(as_uuid=True), ForeignKey("groups.id"), nullable=False)
@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, Float, DateTime, ForeignKey, String, Boolean, Integer
+from sqlalchemy import Column, Date, Float, DateTime, ForeignKey, String, Boolean, Integer, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 
@@ -9,6 +9,10 @@ from app.core.database import Base
 
 class Location(Base):
     __tablename__ = "locations"
+    __table_args__ = (
+        # Histórico do usuário: WHERE user_id = ? AND recorded_at >= ? ORDER BY recorded_at
+        Index("ix_locations_user_recorded", "user_id", "recorded_at"),
+    )
 
     id         = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id    = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
@@ -24,6 +28,20 @@ class Location(Base):
     user = relationship("User", back_populates="locations")
 
 
+class LocationDailyStats(Base):
+    """Agregados diários por usuário, gravados pelo rollup de app/services/location_stats.py."""
+    __tablename__ = "location_daily_stats"
+
+    user_id    = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    day        = Column(Date, primary_key=True)   # dia UTC
+    distance_m = Column(Float, nullable=False, default=0)
+    moving_seconds  = Column(Float, nullable=False, default=0)
+    stopped_seconds = Column(Float, nullable=False, default=0)
+    max_speed  = Column(Float, nullable=False, default=0)   # m/s
+    points     = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
 class Geofence(Base):
     __tablename__ = "geofences"
 
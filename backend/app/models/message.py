@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Enum, Boolean, Float
+from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Enum, Boolean, Float, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 import enum
@@ -18,6 +18,10 @@ class MessageType(str, enum.Enum):
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # Paginação keyset: WHERE group_id = ? AND (created_at, id) < (?, ?)
+        Index("ix_messages_group_created_id", "group_id", "created_at", "id"),
+    )
 
     id         = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     group_id   = Column(UUID(as_uuid=True), ForeignKey("groups.id"), nullable=False)
@@ -25,6 +29,8 @@ class Message(Base):
     type       = Column(Enum(MessageType), default=MessageType.text)
     content    = Column(Text, nullable=True)       # texto ou URL da mídia (S3)
     media_key  = Column(String(500), nullable=True) # chave no S3
+    thumbnail_key = Column(String(500), nullable=True) # miniatura gerada após o upload
+    poster_key    = Column(String(500), nullable=True) # quadro de capa (vídeos)
     is_deleted = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow, index=True)
 
@@ -34,9 +40,13 @@ class Message(Base):
 
 class SOSEvent(Base):
     __tablename__ = "sos_events"
+    __table_args__ = (
+        Index("ix_sos_events_group_created", "group_id", "created_at"),
+    )
 
     id         = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id    = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    group_id   = Column(UUID(as_uuid=True), ForeignKey("groups.id"), nullable=False)
     latitude   = Column(Float,  nullable=False)
     longitude  = Column(Float,  nullable=False)
     message    = Column(Text,   nullable=True)
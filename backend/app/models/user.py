@@ -38,3 +38,4 @@ class User(Base):
     locations         = relationship("Location",    back_populates="user")
     messages          = relationship("Message",     back_populates="sender")
     sos_events        = relationship("SOSEvent",    back_populates="user")
+    device_tokens     = relationship("DeviceToken", back_populates="user")
@@ -0,0 +1,167 @@
+"""
+Cadastro de tokens de push (FCM) por usuário/dispositivo.
+
+Os tokens de cada grupo ficam em cache num hash Redis push:tokens:{group_id}
+(token → user_id), de modo que notificar um grupo custa uma leitura de cache.
+O cache é invalidado quando a composição do grupo muda (join/leave) ou quando
+um membro cadastra/remove/perde um token. Cada invalidação incrementa
+push:tokens:gen:{group_id}; quem preenche o cache leu a geração antes da
+query e só grava se ela não mudou (WATCH/MULTI), então uma query que correu
+com a invalidação não deixa tokens velhos em cache até o TTL.
+"""
+import uuid
+from typing import Iterable, List
+
+import redis.asyncio as aioredis
+from redis.exceptions import WatchError
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.device import DeviceToken
+from app.models.group import GroupMember
+
+# Campo marcador: distingue "grupo sem tokens" de "cache ausente"
+_EMPTY = ""
+
+
+def group_tokens_key(group_id: uuid.UUID) -> str:
+    return f"push:tokens:{group_id}"
+
+
+def generation_key(group_id: uuid.UUID) -> str:
+    return f"push:tokens:gen:{group_id}"
+
+
+# ─────────────────────────────────────────────
+# Consulta
+# ─────────────────────────────────────────────
+
+async def group_tokens(
+    db: AsyncSession,
+    redis: aioredis.Redis,
+    group_id: uuid.UUID,
+    exclude_user_id: uuid.UUID | None = None,
+) -> List[str]:
+    """Tokens de todos os membros do grupo — cache Redis, ou uma única query (join)."""
+    key = group_tokens_key(group_id)
+    cached = await redis.hgetall(key)
+
+    if not cached:
+        seen = await redis.get(generation_key(group_id))
+        result = await db.execute(
+            select(DeviceToken.token, DeviceToken.user_id)
+            .join(GroupMember, GroupMember.user_id == DeviceToken.user_id)
+            .where(GroupMember.group_id == group_id)
+        )
+        cached = {token: str(user_id) for token, user_id in result.all()} or {_EMPTY: _EMPTY}
+        await _fill(redis, group_id, seen, cached)
+
+    excluded = str(exclude_user_id) if exclude_user_id is not None else None
+    return [token for token, user_id in cached.items() if token != _EMPTY and user_id != excluded]
+
+
+async def _fill(redis: aioredis.Redis, group_id: uuid.UUID, seen: str | None, tokens: dict) -> None:
+    """Grava o cache só se nenhuma invalidação aconteceu desde a leitura de `seen`."""
+    key = group_tokens_key(group_id)
+    async with redis.pipeline(transaction=True) as pipe:
+        try:
+            await pipe.watch(generation_key(group_id))
+            if await pipe.get(generation_key(group_id)) != seen:
+                return
+            pipe.multi()
+            pipe.delete(key)
+            pipe.hset(key, mapping=tokens)
+            pipe.expire(key, settings.PUSH_TOKEN_CACHE_TTL_SECONDS)
+            await pipe.execute()
+        except WatchError:
+            pass  # invalidado durante a gravação: o próximo leitor preenche
+
+
+# ─────────────────────────────────────────────
+# Invalidação
+# ─────────────────────────────────────────────
+
+async def invalidate_groups(redis: aioredis.Redis, group_ids: Iterable[uuid.UUID]) -> None:
+    group_ids = set(group_ids)
+    if not group_ids:
+        return
+    async with redis.pipeline(transaction=False) as pipe:
+        for gid in group_ids:
+            pipe.delete(group_tokens_key(gid))
+            pipe.incr(generation_key(gid))
+            pipe.expire(generation_key(gid), settings.PUSH_TOKEN_CACHE_TTL_SECONDS)
+        await pipe.execute()
+
+
+async def invalidate_users(db: AsyncSession, redis: aioredis.Redis, user_ids: Iterable[uuid.UUID]) -> None:
+    """Invalida o cache de todos os grupos dos usuários informados."""
+    user_ids = list(set(user_ids))
+    if not user_ids:
+        return
+    result = await db.execute(
+        select(GroupMember.group_id).where(GroupMember.user_id.in_(user_ids)).distinct()
+    )
+    await invalidate_groups(redis, result.scalars().all())
+
+
+# ─────────────────────────────────────────────
+# Cadastro
+# ─────────────────────────────────────────────
+
+async def register(
+    db: AsyncSession,
+    redis: aioredis.Redis,
+    user_id: uuid.UUID,
+    device_id: str,
+    token: str,
+    platform: str | None,
+) -> DeviceToken:
+    """Cadastra (ou atualiza) o token do dispositivo. Um token pertence a um só usuário."""
+    result = await db.execute(
+        delete(DeviceToken)
+        .where(DeviceToken.token == token, DeviceToken.user_id != user_id)
+        .returning(DeviceToken.user_id)
+    )
+    previous_owners = list(result.scalars().all())
+
+    result = await db.execute(
+        select(DeviceToken).where(DeviceToken.user_id == user_id, DeviceToken.device_id == device_id)
+    )
+    device = result.scalar_one_or_none()
+    if device is None:
+        device = DeviceToken(user_id=user_id, device_id=device_id, token=token, platform=platform)
+        db.add(device)
+    else:
+        device.token = token
+        device.platform = platform or device.platform
+    await db.commit()
+
+    await invalidate_users(db, redis, [user_id, *previous_owners])
+    return device
+
+
+async def unregister(db: AsyncSession, redis: aioredis.Redis, user_id: uuid.UUID, device_id: str) -> bool:
+    result = await db.execute(
+        delete(DeviceToken)
+        .where(DeviceToken.user_id == user_id, DeviceToken.device_id == device_id)
+        .returning(DeviceToken.id)
+    )
+    removed = result.scalar_one_or_none() is not None
+    await db.commit()
+    if removed:
+        await invalidate_users(db, redis, [user_id])
+    return removed
+
+
+async def prune(db: AsyncSession, redis: aioredis.Redis, tokens: List[str]) -> int:
+    """Remove em lote os tokens recusados pelo provedor de push (um DELETE)."""
+    if not tokens:
+        return 0
+    result = await db.execute(
+        delete(DeviceToken).where(DeviceToken.token.in_(tokens)).returning(DeviceToken.user_id)
+    )
+    owners = list(result.scalars().all())
+    await db.commit()
+    await invalidate_users(db, redis, owners)
+    return len(owners)
@@ -0,0 +1,65 @@
+"""
+Buffer curto das posições enviadas a cada grupo, para retomar streams.
+
+Cada posição transmitida entra em loc:events:{group_id} (Redis Stream com
+MAXLEN ≈ LOCATION_EVENT_BUFFER_SIZE, expira após LOCATION_EVENT_BUFFER_SECONDS
+sem escrita). O id da entrada vira o event_id do frame location_update — o
+`id:` do SSE —, então um cliente que reconecta com Last-Event-ID recebe o que
+perdeu sem passar pelo Postgres.
+"""
+import json
+from typing import Dict, Iterable, List, Tuple
+
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+
+Event = Tuple[str, dict]  # (event_id, frame location_update)
+
+
+def events_key(group_id: str) -> str:
+    return f"loc:events:{group_id}"
+
+
+def parse_event_id(event_id: str) -> Tuple[int, int]:
+    """Ids de Redis Stream ("ms-seq") como tupla comparável. ValueError se inválido."""
+    ms, sep, seq = event_id.partition("-")
+    if not sep:
+        raise ValueError(event_id)
+    return int(ms), int(seq)
+
+
+async def append(redis: aioredis.Redis, channels: Iterable[str], frame: dict) -> Dict[str, str]:
+    """Registra o frame em todos os grupos num único round trip. Retorna group_id → event_id."""
+    channels = list(channels)
+    payload = json.dumps(frame)
+    async with redis.pipeline(transaction=False) as pipe:
+        for channel in channels:
+            key = events_key(channel)
+            pipe.xadd(key, {"frame": payload}, maxlen=settings.LOCATION_EVENT_BUFFER_SIZE, approximate=True)
+            pipe.expire(key, settings.LOCATION_EVENT_BUFFER_SECONDS)
+        results = await pipe.execute()
+    return dict(zip(channels, results[::2]))
+
+
+async def since(redis: aioredis.Redis, group_id: str, last_event_id: str) -> List[Event] | None:
+    """
+    Eventos do grupo posteriores a last_event_id, em ordem. None se o buffer
+    não cobre mais esse ponto (lacuna): o cliente deve recarregar o estado.
+    """
+    try:
+        last = parse_event_id(last_event_id)
+    except ValueError:
+        return None
+    key = events_key(group_id)
+    oldest = await redis.xrange(key, count=1)
+    if not oldest or parse_event_id(oldest[0][0]) > last:
+        # Buffer vazio/expirado ou já podado além do último evento visto
+        return None
+    response = await redis.xread({key: last_event_id}, count=settings.LOCATION_EVENT_BUFFER_SIZE)
+    if not response:
+        return []
+    return [
+        (event_id, {**json.loads(fields["frame"]), "event_id": event_id})
+        for event_id, fields in response[0][1]
+    ]
@@ -0,0 +1,233 @@
+"""
+Ingestão de posições: regra de throttle (comum ao WebSocket) e upload em lote.
+
+POST /locations/batch recebe o buffer offline do celular — milhares de fixes
+— em JSON ({"points": [{"lat", "lng", "ts"}, ...]}) ou binário
+(BINARY_CONTENT_TYPE: registros little-endian de 3 doubles ts, lat, lng).
+O corpo é lido em partes e recusado (413) ao passar de
+LOCATION_BATCH_MAX_BYTES — pelo Content-Length, antes de ler, quando vier.
+O lote é:
+  1. validado numa única passada (coordenadas, ts finito e não futuro);
+  2. ordenado e deduplicado contra o que já está gravado no intervalo
+     (reenvio do mesmo lote não duplica nada);
+  3. filtrado pela mesma regra do WebSocket (≥ 10 m ou ≥ 30 s desde o último);
+  4. gravado com um COPY (asyncpg) ou um INSERT multi-linha (demais drivers).
+loc:last:{user_id} só é atualizado se o fix mais novo do lote for mais
+recente que o valor atual. As posições gravadas também entram no trajeto
+recente do Redis (app/services/location_track.py) e nas estatísticas do dia
+(app/services/location_stats.py).
+"""
+import json
+import math
+import struct
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, UTC
+from typing import Iterable, List, Tuple
+
+import redis.asyncio as aioredis
+from fastapi import HTTPException, Request
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.location import Location
+from app.services import location_last, location_stats, location_track
+from app.services.location_last import LastPosition
+
+BINARY_CONTENT_TYPE = "application/x-minhaturma-locations"
+_RECORD = struct.Struct("<ddd")  # ts, lat, lng
+
+MIN_DISTANCE_M = 10
+MAX_INTERVAL_S = 30
+
+Point = Tuple[float, float, float]  # (ts, lat, lng)
+
+
+def haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Distância em metros entre dois pontos geográficos (fórmula de Haversine)."""
+    R = 6371000.0  # raio da Terra em metros
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def should_persist(last: Point | None, point: Point) -> bool:
+    """Throttle: persiste se moveu ≥ 10 m ou se passaram ≥ 30 s desde o último gravado."""
+    if last is None:
+        return True
+    return (
+        point[0] - last[0] >= MAX_INTERVAL_S
+        or haversine(last[1], last[2], point[1], point[2]) >= MIN_DISTANCE_M
+    )
+
+
+# ─────────────────────────────────────────────
+# Parsing e validação
+# ─────────────────────────────────────────────
+
+async def read_body(request: Request) -> bytes:
+    """Corpo do POST /batch, limitado a LOCATION_BATCH_MAX_BYTES sem carregar o excesso."""
+    max_bytes = settings.LOCATION_BATCH_MAX_BYTES
+    too_large = HTTPException(status_code=413, detail=f"Lote excede {max_bytes} bytes")
+    try:
+        declared = int(request.headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Content-Length inválido")
+    if declared > max_bytes:
+        raise too_large
+
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        # Content-Length ausente (chunked) ou menor que o corpo real
+        if len(body) > max_bytes:
+            raise too_large
+    return bytes(body)
+
+
+def parse_json(body: bytes) -> List[Point]:
+    try:
+        points = json.loads(body)["points"]
+        return [(float(p["ts"]), float(p["lat"]), float(p["lng"])) for p in points]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Lote inválido")
+
+
+def parse_binary(body: bytes) -> List[Point]:
+    if len(body) % _RECORD.size:
+        raise HTTPException(status_code=400, detail="Lote binário com tamanho inválido")
+    return list(_RECORD.iter_unpack(body))
+
+
+def validate(points: Iterable[Point], now: float) -> List[Point]:
+    """Mantém só fixes plausíveis: coordenadas válidas, ts finito, dentro do histórico e não futuro."""
+    oldest = now - settings.LOCATION_HISTORY_DAYS * 86400
+    newest = now + 60  # tolerância para relógio do aparelho adiantado
+    return [
+        p for p in points
+        if oldest <= p[0] <= newest and -90 <= p[1] <= 90 and -180 <= p[2] <= 180
+    ]
+
+
+def _naive_utc(ts: float) -> datetime:
+    return datetime.fromtimestamp(ts, UTC).replace(tzinfo=None)
+
+
+def _ts_key(ts: float) -> datetime:
+    # O instante como será gravado em recorded_at (precisão de microssegundos).
+    # round(ts * 1e6) não serve: o float lido do banco pode diferir em 1 µs.
+    return _naive_utc(ts)
+
+
+def select_points(points: List[Point], stored: List[Point]) -> Tuple[List[Point], int, int]:
+    """
+    Intercala o lote (ordenado) com os pontos já gravados no intervalo e aplica
+    o throttle. Retorna (a gravar, duplicados, descartados pelo throttle).
+    """
+    stored_ts = {_ts_key(p[0]) for p in stored}
+    timeline = sorted([(p, True) for p in points] + [(p, False) for p in stored], key=lambda e: e[0][0])
+
+    kept: List[Point] = []
+    duplicates = throttled = 0
+    last: Point | None = None
+    seen_ts: set[datetime] = set()
+    for point, is_new in timeline:
+        if not is_new:
+            last = point
+            continue
+        key = _ts_key(point[0])
+        if key in stored_ts or key in seen_ts:
+            duplicates += 1
+            continue
+        seen_ts.add(key)
+        if should_persist(last, point):
+            kept.append(point)
+            last = point
+        else:
+            throttled += 1
+    return kept, duplicates, throttled
+
+
+# ─────────────────────────────────────────────
+# Gravação
+# ─────────────────────────────────────────────
+
+async def _stored_between(db: AsyncSession, user_id: uuid.UUID, start: float, end: float) -> List[Point]:
+    # A referência do throttle é o último ponto gravado até 30 s antes do lote
+    result = await db.execute(
+        select(Location.recorded_at, Location.latitude, Location.longitude)
+        .where(
+            Location.user_id == user_id,
+            Location.recorded_at >= _naive_utc(start) - timedelta(seconds=MAX_INTERVAL_S),
+            Location.recorded_at <= _naive_utc(end),
+        )
+        .order_by(Location.recorded_at)
+    )
+    return [(at.replace(tzinfo=UTC).timestamp(), lat, lng) for at, lat, lng in result.all()]
+
+
+async def _insert(db: AsyncSession, user_id: uuid.UUID, points: List[Point]) -> None:
+    conn = await db.connection()
+    if conn.dialect.driver == "asyncpg":
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            Location.__tablename__,
+            columns=["id", "user_id", "latitude", "longitude", "recorded_at"],
+            records=[(uuid.uuid4(), user_id, lat, lng, _naive_utc(ts)) for ts, lat, lng in points],
+        )
+    else:
+        await db.execute(
+            insert(Location),
+            [{"user_id": user_id, "latitude": lat, "longitude": lng, "recorded_at": _naive_utc(ts)}
+             for ts, lat, lng in points],
+        )
+    # COPY não passa pelo flush do ORM: marca a sessão para o read-your-writes
+    db.info["wrote"] = True
+
+
+@dataclass
+class BatchResult:
+    received: int
+    invalid: int
+    duplicates: int
+    throttled: int
+    stored: int
+
+
+async def ingest(
+    db: AsyncSession,
+    redis: aioredis.Redis,
+    user_id: uuid.UUID,
+    points: List[Point],
+) -> BatchResult:
+    received = len(points)
+    if received > settings.LOCATION_BATCH_MAX_POINTS:
+        raise HTTPException(status_code=413, detail=f"Máximo de {settings.LOCATION_BATCH_MAX_POINTS} posições por lote")
+
+    valid = sorted(validate(points, time.time()))
+    result = BatchResult(received=received, invalid=received - len(valid), duplicates=0, throttled=0, stored=0)
+    if not valid:
+        return result
+
+    stored = await _stored_between(db, user_id, valid[0][0], valid[-1][0])
+    kept, result.duplicates, result.throttled = select_points(valid, stored)
+    if kept:
+        await _insert(db, user_id, kept)
+        # Comita antes do trajeto recente: o Redis só recebe o que está no banco
+        await db.commit()
+        result.stored = len(kept)
+        tracks = {user_id: [(location_track.stored_ts(_naive_utc(ts)), lat, lng) for ts, lat, lng in kept]}
+        await location_track.append(redis, tracks)
+        await location_stats.record(redis, tracks)
+
+    # loc:last só avança: o WebSocket pode já ter enviado uma posição mais nova
+    newest = valid[-1]
+    current = await location_last.read(redis, user_id)
+    if current is None or current.ts < newest[0]:
+        await location_last.write(redis, user_id, LastPosition(*newest))
+    return result
@@ -0,0 +1,83 @@
+"""
+Última posição de cada usuário: loc:last:{user_id} em formato compacto.
+
+Versão 1 (atual): registro de 21 bytes em base64 (28 caracteres) —
+versão (uint8), ts (double), lat/lng em 1e-7 grau (int32) e precisão em
+metros (float32, NaN se o aparelho não informou). O nome não vai mais no
+valor: quem monta a resposta busca no roster do grupo (app/services/roster.py).
+
+Versão 0 (legado): JSON {"user_id", "user_name", "lat", "lng", "ts"}.
+decode() aceita os dois; toda escrita usa a versão atual, e os valores
+antigos somem sozinhos com o TTL (LAST_TTL_SECONDS).
+"""
+import base64
+import binascii
+import json
+import math
+import struct
+import uuid
+from typing import Dict, Iterable, NamedTuple
+
+import redis.asyncio as aioredis
+
+VERSION = 1
+LAST_TTL_SECONDS = 3600
+
+_RECORD = struct.Struct("<Bdiif")  # versão, ts, lat·1e7, lng·1e7, precisão
+_SCALE = 10_000_000
+
+
+class LastPosition(NamedTuple):
+    # NamedTuple e não dataclass: decode() roda em toda decisão de throttle e
+    # a construção de um dataclass frozen custa mais que o próprio unpack
+    ts: float
+    lat: float
+    lng: float
+    accuracy: float | None = None
+
+
+def last_key(user_id: uuid.UUID | str) -> str:
+    return f"loc:last:{user_id}"
+
+
+def encode(position: LastPosition) -> str:
+    accuracy = math.nan if position.accuracy is None else position.accuracy
+    record = _RECORD.pack(
+        VERSION, position.ts, round(position.lat * _SCALE), round(position.lng * _SCALE), accuracy,
+    )
+    return base64.b64encode(record).decode("ascii")
+
+
+def decode(raw: str | None) -> LastPosition | None:
+    """Valor de loc:last em qualquer versão conhecida. None se ausente ou ilegível."""
+    if not raw:
+        return None
+    if raw[0] == "{":
+        data = json.loads(raw)
+        return LastPosition(float(data.get("ts", 0)), data["lat"], data["lng"], data.get("accuracy"))
+    try:
+        record = binascii.a2b_base64(raw)
+    except ValueError:  # binascii.Error ou texto não ASCII
+        return None
+    if len(record) != _RECORD.size or record[0] != VERSION:
+        return None
+    _, ts, lat, lng, accuracy = _RECORD.unpack(record)
+    return LastPosition(ts, lat / _SCALE, lng / _SCALE, None if math.isnan(accuracy) else accuracy)
+
+
+async def read(redis: aioredis.Redis, user_id: uuid.UUID | str) -> LastPosition | None:
+    return decode(await redis.get(last_key(user_id)))
+
+
+async def read_many(redis: aioredis.Redis, user_ids: Iterable[uuid.UUID | str]) -> Dict[str, LastPosition]:
+    """Últimas posições de vários usuários num único MGET; quem não tem fica de fora."""
+    uids = [str(uid) for uid in user_ids]
+    if not uids:
+        return {}
+    raws = await redis.mget([last_key(uid) for uid in uids])
+    positions = {uid: decode(raw) for uid, raw in zip(uids, raws)}
+    return {uid: pos for uid, pos in positions.items() if pos is not None}
+
+
+async def write(redis: aioredis.Redis, user_id: uuid.UUID | str, position: LastPosition) -> None:
+    await redis.set(last_key(user_id), encode(position), ex=LAST_TTL_SECONDS)
@@ -0,0 +1,210 @@
+"""
+Amostragem adaptativa: o servidor diz a cada aparelho de quanto em quanto
+tempo mandar posição.
+
+Um aparelho só reporta em alta frequência (fast_interval(), por padrão
+LOCATION_WATCHED_INTERVAL_SECONDS) enquanto algum dos seus grupos está sendo
+observado — alguém com o mapa aberto — ou tem um SOS ativo; fora isso, a cada
+LOCATION_IDLE_INTERVAL_SECONDS. O intervalo chega pelo próprio WebSocket de
+localização: {"type": "config", "interval": segundos}, na conexão e só quando
+muda.
+
+Observadores (frame {"type": "watch", "active": bool}) ficam no sorted set
+loc:watchers:{group_id} (membro = id do observador, score = validade), para
+que todos os workers enxerguem. Um loop por worker, a cada
+LOCATION_WATCH_POLL_SECONDS, renova os observadores locais e consulta os
+grupos com conexões neste worker num único pipeline. SOS ativo vem do log do
+SOS que todo worker já acompanha (broadcast_entry → record_sos), e acelera os
+aparelhos do grupo na hora, sem esperar o loop.
+"""
+import asyncio
+import logging
+import time
+import uuid
+import weakref
+from typing import Dict, Iterable, Set
+
+import redis.asyncio as aioredis
+from fastapi import WebSocket
+
+from app.core.config import settings
+from app.core.ws_manager import ConnectionManager
+from app.services import sos_stream
+
+logger = logging.getLogger(__name__)
+
+
+def watchers_key(group_id: str) -> str:
+    return f"loc:watchers:{group_id}"
+
+
+def fast_interval() -> int:
+    """Intervalo dos grupos observados/em SOS, nunca abaixo do que o FrameThrottle admite."""
+    throttle_floor = settings.LOCATION_UPDATE_INTERVAL_SECONDS / settings.LOCATION_FRAMES_PER_INTERVAL
+    return max(settings.LOCATION_WATCHED_INTERVAL_SECONDS, round(throttle_floor))
+
+
+# group_id → {event_id: início}; alimentado pelo log do SOS em cada worker
+_active_sos: Dict[str, Dict[str, float]] = {}
+
+# Controllers vivos neste worker, avisados quando um SOS muda
+_controllers: "weakref.WeakSet[SamplingController]" = weakref.WeakSet()
+
+
+async def record_sos(entry: sos_stream.Entry) -> None:
+    group_id = entry["group_id"]
+    events = _active_sos.setdefault(group_id, {})
+    if entry["kind"] == sos_stream.TRIGGERED:
+        events[entry["event_id"]] = float(entry["ts"])
+    else:
+        events.pop(entry["event_id"], None)
+    if not events:
+        _active_sos.pop(group_id, None)
+    for controller in list(_controllers):
+        try:
+            await controller.update_group(group_id)
+        except Exception:
+            logger.exception("Amostragem: falha ao reconfigurar aparelhos do grupo %s", group_id)
+
+
+def sos_active(group_id: str, now: float) -> bool:
+    # SOS sem resolução volta ao normal depois de LOCATION_SOS_FAST_SECONDS
+    events = _active_sos.get(group_id)
+    if not events:
+        return False
+    horizon = now - settings.LOCATION_SOS_FAST_SECONDS
+    for event_id in [e for e, started in events.items() if started < horizon]:
+        del events[event_id]
+    if not events:
+        del _active_sos[group_id]
+        return False
+    return True
+
+
+class _Device:
+    def __init__(self, manager: ConnectionManager, channels: Set[str]):
+        self.manager = manager
+        self.channels = channels     # o mesmo set do location_ws (subscribe/unsubscribe)
+        self.interval: int | None = None
+        self.viewer_id: str | None = None
+
+
+class SamplingController:
+    def __init__(self) -> None:
+        self._devices: Dict[WebSocket, _Device] = {}
+        self._watched: Set[str] = set()
+        self._redis: aioredis.Redis | None = None
+        self._task: asyncio.Task | None = None
+        _controllers.add(self)
+
+    def interval_for(self, channels: Iterable[str], now: float | None = None) -> int:
+        now = time.time() if now is None else now
+        fast = any(c in self._watched or sos_active(c, now) for c in channels)
+        return fast_interval() if fast else settings.LOCATION_IDLE_INTERVAL_SECONDS
+
+    async def register(
+        self, redis: aioredis.Redis, manager: ConnectionManager, ws: WebSocket, channels: Set[str],
+    ) -> None:
+        """Aparelho conectado: recebe o intervalo atual e entra no loop de atualização."""
+        self._redis = redis
+        self._devices[ws] = _Device(manager, channels)
+        await self.update(ws)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def unregister(self, ws: WebSocket) -> None:
+        device = self._devices.pop(ws, None)
+        if device is not None and device.viewer_id is not None:
+            try:
+                await self._unwatch(device)
+            except Exception:
+                # O registro expira sozinho em LOCATION_WATCHER_TTL_SECONDS
+                logger.exception("Amostragem: falha ao remover observador")
+        if not self._devices and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def close(self) -> None:
+        """Shutdown: para o loop e espera ele terminar."""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def update(self, ws: WebSocket) -> None:
+        """Envia o intervalo ao aparelho se ele mudou."""
+        device = self._devices.get(ws)
+        if device is None:
+            return
+        interval = self.interval_for(device.channels)
+        if interval != device.interval:
+            device.interval = interval
+            await device.manager.send(ws, {"type": "config", "interval": interval})
+
+    async def update_group(self, group_id: str) -> None:
+        for ws, device in list(self._devices.items()):
+            if group_id in device.channels:
+                await self.update(ws)
+
+    async def set_watching(self, ws: WebSocket, active: bool) -> None:
+        """Mapa aberto/fechado nesta conexão (frame {"type": "watch"})."""
+        device = self._devices.get(ws)
+        if device is None:
+            return
+        if active and device.viewer_id is None:
+            device.viewer_id = uuid.uuid4().hex
+            await self._publish_viewers([device])
+            # Os aparelhos deste worker aceleram já; os dos outros, no próximo poll
+            self._watched.update(device.channels)
+            await self._update_all()
+        elif not active and device.viewer_id is not None:
+            await self._unwatch(device)
+
+    async def _unwatch(self, device: _Device) -> None:
+        viewer_id, device.viewer_id = device.viewer_id, None
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for channel in device.channels:
+                pipe.zrem(watchers_key(channel), viewer_id)
+            await pipe.execute()
+
+    async def _publish_viewers(self, devices) -> None:
+        expires = time.time() + settings.LOCATION_WATCHER_TTL_SECONDS
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for device in devices:
+                for channel in device.channels:
+                    pipe.zadd(watchers_key(channel), {device.viewer_id: expires})
+                    pipe.expire(watchers_key(channel), settings.LOCATION_WATCHER_TTL_SECONDS)
+            await pipe.execute()
+
+    async def refresh(self) -> None:
+        """Renova os observadores locais e recalcula quais grupos estão sendo observados."""
+        if self._redis is None:
+            return
+        viewers = [d for d in self._devices.values() if d.viewer_id is not None]
+        if viewers:
+            await self._publish_viewers(viewers)
+
+        channels = sorted({c for d in self._devices.values() for c in d.channels})
+        now = time.time()
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for channel in channels:
+                pipe.zremrangebyscore(watchers_key(channel), "-inf", now)
+                pipe.zcount(watchers_key(channel), now, "+inf")
+            results = await pipe.execute()
+        counts = results[1::2]
+        self._watched = {c for c, count in zip(channels, counts) if count}
+        await self._update_all()
+
+    async def _update_all(self) -> None:
+        for ws in list(self._devices):
+            await self.update(ws)
+
+    async def _loop(self) -> None:
+        while self._devices:
+            await asyncio.sleep(settings.LOCATION_WATCH_POLL_SECONDS)
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Amostragem: falha ao consultar observadores")
@@ -0,0 +1,238 @@
+"""
+Estatísticas diárias de deslocamento por usuário, mantidas na gravação.
+
+Cada posição gravada em `locations` (LocationWriter e POST /batch) atualiza
+loc:stats:{user_id}:{dia UTC} — hash com distância (m), tempo em movimento e
+parado (s), velocidade máxima (m/s) e número de posições —, a partir da
+última posição processada do usuário (loc:stats:last:{user_id}). Um trecho
+conta para o dia da posição final; trechos com mais de
+LOCATION_STATS_MAX_GAP_SECONDS (aparelho desligado) não somam nada, e um
+trecho é "em movimento" a partir de LOCATION_STATS_MOVING_SPEED.
+
+A atualização de um usuário é um WATCH/MULTI em loc:stats:last: dois
+workers gravando o mesmo usuário não contam o mesmo trecho duas vezes.
+
+Posições que chegam fora de ordem (lote offline enviado depois do
+WebSocket) entram na contagem e marcam o dia como `late`. run() grava os
+dias alterados em location_daily_stats a cada LOCATION_STATS_ROLLUP_SECONDS;
+os dias marcados são recalculados a partir de `locations`, e GET
+/locations/stats passa a servir essa linha.
+"""
+import asyncio
+import logging
+import uuid
+from dataclasses import asdict, dataclass, fields
+from datetime import date, datetime, time, timedelta, UTC
+from typing import Dict, Iterable, List, Tuple
+
+import redis.asyncio as aioredis
+from redis.exceptions import WatchError
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.models.location import Location, LocationDailyStats
+from app.services import location_ingest, location_track
+
+logger = logging.getLogger(__name__)
+
+Point = Tuple[float, float, float]  # (ts, lat, lng)
+
+DIRTY_KEY = "loc:stats:dirty"  # "user_id:dia" alterados desde o último rollup
+_WATCH_RETRIES = 5
+
+
+@dataclass
+class DayStats:
+    distance_m: float = 0.0
+    moving_seconds: float = 0.0
+    stopped_seconds: float = 0.0
+    max_speed: float = 0.0
+    points: int = 0
+    late: int = 0  # posições fora de ordem: só o rollup tem os números exatos
+
+    @classmethod
+    def from_hash(cls, data: Dict[str, str]) -> "DayStats":
+        return cls(**{f.name: f.type(data[f.name]) for f in fields(cls) if f.name in data})
+
+    @classmethod
+    def from_row(cls, row: LocationDailyStats) -> "DayStats":
+        return cls(row.distance_m, row.moving_seconds, row.stopped_seconds, row.max_speed, row.points)
+
+
+def stats_key(user_id: uuid.UUID | str, day: date) -> str:
+    return f"loc:stats:{user_id}:{day.isoformat()}"
+
+
+def last_key(user_id: uuid.UUID | str) -> str:
+    return f"loc:stats:last:{user_id}"
+
+
+def day_of(ts: float) -> date:
+    return datetime.fromtimestamp(ts, UTC).date()
+
+
+def accumulate(days: Dict[date, DayStats], last: Point | None, points: Iterable[Point]) -> Point | None:
+    """Soma as posições (em ordem) aos agregados por dia. Retorna a nova última posição."""
+    for point in points:
+        ts, lat, lng = point
+        stats = days.setdefault(day_of(ts), DayStats())
+        stats.points += 1
+        if last is not None and ts <= last[0]:
+            stats.late += 1
+            continue
+        if last is not None and ts - last[0] <= settings.LOCATION_STATS_MAX_GAP_SECONDS:
+            dt = ts - last[0]
+            distance = location_ingest.haversine(last[1], last[2], lat, lng)
+            speed = distance / dt
+            stats.distance_m += distance
+            stats.max_speed = max(stats.max_speed, speed)
+            if speed >= settings.LOCATION_STATS_MOVING_SPEED:
+                stats.moving_seconds += dt
+            else:
+                stats.stopped_seconds += dt
+        last = point
+    return last
+
+
+# ─────────────────────────────────────────────
+# Gravação (Redis)
+# ─────────────────────────────────────────────
+
+async def record(redis: aioredis.Redis, tracks: Dict[uuid.UUID | str, Iterable[Point]]) -> None:
+    """Soma posições já gravadas no banco aos agregados do dia de cada usuário."""
+    for uid, points in tracks.items():
+        points = sorted(points)
+        if not points:
+            continue
+        try:
+            await _record_user(redis, str(uid), points)
+        except Exception:
+            logger.exception("Estatísticas: falha ao somar %s posições de %s", len(points), uid)
+
+
+async def _record_user(redis: aioredis.Redis, uid: str, points: List[Point]) -> None:
+    ttl = settings.LOCATION_STATS_TTL_SECONDS
+    for _ in range(_WATCH_RETRIES):
+        async with redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(last_key(uid))
+                raw = await pipe.get(last_key(uid))
+                days = {}
+                for day in sorted({day_of(p[0]) for p in points}):
+                    days[day] = DayStats.from_hash(await pipe.hgetall(stats_key(uid, day)))
+                last = accumulate(days, location_track.decode(raw) if raw else None, points)
+
+                pipe.multi()
+                for day, stats in days.items():
+                    key = stats_key(uid, day)
+                    pipe.hset(key, mapping=asdict(stats))
+                    pipe.expire(key, ttl)
+                pipe.set(last_key(uid), location_track.encode(last), ex=ttl)
+                pipe.sadd(DIRTY_KEY, *(f"{uid}:{day.isoformat()}" for day in days))
+                await pipe.execute()
+                return
+            except WatchError:
+                continue  # outro worker gravou o mesmo usuário: relê e soma de novo
+    raise RuntimeError(f"loc:stats:last:{uid} alterado em {_WATCH_RETRIES} tentativas seguidas")
+
+
+# ─────────────────────────────────────────────
+# Leitura
+# ─────────────────────────────────────────────
+
+async def day_stats(db: AsyncSession, redis: aioredis.Redis, user_id: uuid.UUID, day: date) -> DayStats:
+    """Agregados do dia: o hash do Redis, ou a linha do rollup (dias antigos ou recalculados)."""
+    cached = await redis.hgetall(stats_key(user_id, day))
+    stats = DayStats.from_hash(cached) if cached else None
+    if stats is not None and not stats.late:
+        return stats
+    row = await db.get(LocationDailyStats, (user_id, day))
+    if row is not None and (stats is None or row.points >= stats.points):
+        return DayStats.from_row(row)
+    return stats or DayStats()
+
+
+# ─────────────────────────────────────────────
+# Rollup (Postgres)
+# ─────────────────────────────────────────────
+
+async def _recompute(db: AsyncSession, user_id: uuid.UUID, day: date) -> DayStats:
+    """O dia inteiro a partir de `locations` (e do trecho que termina nele)."""
+    start = datetime.combine(day, time.min)
+    result = await db.execute(
+        select(Location.recorded_at, Location.latitude, Location.longitude)
+        .where(
+            Location.user_id == user_id,
+            Location.recorded_at >= start - timedelta(seconds=settings.LOCATION_STATS_MAX_GAP_SECONDS),
+            Location.recorded_at < start + timedelta(days=1),
+        )
+        .order_by(Location.recorded_at)
+    )
+    days: Dict[date, DayStats] = {}
+    accumulate(days, None, ((location_track.stored_ts(at), lat, lng) for at, lat, lng in result.all()))
+    return days.get(day, DayStats())
+
+
+def _upsert(dialect: str):
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    stmt = insert(LocationDailyStats)
+    columns = ("distance_m", "moving_seconds", "stopped_seconds", "max_speed", "points", "updated_at")
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id", "day"],
+        set_={column: stmt.excluded[column] for column in columns},
+    )
+
+
+async def rollup(redis: aioredis.Redis, session_factory: sessionmaker) -> int:
+    """Grava em location_daily_stats os dias alterados. Retorna quantos gravou."""
+    members = list(await redis.smembers(DIRTY_KEY))
+    if not members:
+        return 0
+    await redis.srem(DIRTY_KEY, *members)
+
+    keys = []
+    for member in members:
+        uid, _, day = member.partition(":")
+        keys.append((uuid.UUID(uid), date.fromisoformat(day)))
+    async with redis.pipeline(transaction=False) as pipe:
+        for uid, day in keys:
+            pipe.hgetall(stats_key(uid, day))
+        cached = await pipe.execute()
+
+    now = datetime.now(UTC).replace(tzinfo=None)
+    try:
+        async with session_factory() as db:
+            rows = []
+            for (uid, day), data in zip(keys, cached):
+                if not data:
+                    continue  # expirou antes do rollup
+                stats = DayStats.from_hash(data)
+                if stats.late:
+                    stats = await _recompute(db, uid, day)
+                row = asdict(stats)
+                del row["late"]
+                rows.append({**row, "user_id": uid, "day": day, "updated_at": now})
+            if rows:
+                conn = await db.connection()
+                await db.execute(_upsert(conn.dialect.name), rows)
+                await db.commit()
+    except Exception:
+        logger.exception("Estatísticas: falha no rollup de %s dias", len(members))
+        # Devolve os dias ao conjunto: o próximo rollup tenta de novo
+        await redis.sadd(DIRTY_KEY, *members)
+        return 0
+    return len(rows)
+
+
+async def run(session_factory: sessionmaker) -> None:
+    """Loop do lifespan: rollup a cada LOCATION_STATS_ROLLUP_SECONDS (o último é feito no shutdown)."""
+    while True:
+        await asyncio.sleep(settings.LOCATION_STATS_ROLLUP_SECONDS)
+        try:
+            await rollup(await get_redis(), session_factory)
+        except Exception:
+            logger.exception("Estatísticas: rollup falhou")
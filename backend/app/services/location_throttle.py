@@ -0,0 +1,165 @@
+"""
+Limite de frames do WebSocket de localização, por conexão e por usuário.
+
+Cada conexão tem um token bucket próprio e divide com as outras conexões do
+mesmo usuário (neste worker) um bucket por usuário. Com LOCATION_GLOBAL_LIMIT,
+um contador no Redis também limita o usuário somando todos os workers.
+
+Frame acima do limite não é processado nem enfileirado: fica como pendente e
+é substituído pelo próximo que chegar. Quando os buckets repõem um token, só a
+posição mais recente é processada — um cliente que manda 50 frames/s custa o
+mesmo que um que respeita o intervalo.
+
+Taxas (por LOCATION_UPDATE_INTERVAL_SECONDS):
+  conexão — LOCATION_FRAMES_PER_INTERVAL, rajada de LOCATION_FRAME_BURST
+  usuário — LOCATION_USER_FRAMES_PER_INTERVAL
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List
+
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+from app.core.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FrameStats:
+    received: int = 0
+    processed: int = 0
+    throttled: int = 0   # chegaram acima do limite (viraram pendentes)
+    coalesced: int = 0   # pendentes substituídos por um frame mais novo, nunca processados
+
+
+# Totais do processo (todas as conexões)
+stats = FrameStats()
+
+# user_id → [bucket, conexões abertas]
+_user_buckets: Dict[str, list] = {}
+
+
+def _rate(frames_per_interval: int) -> float:
+    return frames_per_interval / settings.LOCATION_UPDATE_INTERVAL_SECONDS
+
+
+def _acquire_user_bucket(user_id: str) -> TokenBucket:
+    entry = _user_buckets.get(user_id)
+    if entry is None:
+        bucket = TokenBucket(_rate(settings.LOCATION_USER_FRAMES_PER_INTERVAL), settings.LOCATION_FRAME_BURST)
+        entry = _user_buckets[user_id] = [bucket, 0]
+    entry[1] += 1
+    return entry[0]
+
+
+def _release_user_bucket(user_id: str) -> None:
+    entry = _user_buckets.get(user_id)
+    if entry is not None:
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del _user_buckets[user_id]
+
+
+async def global_wait(redis: aioredis.Redis, user_id: str) -> float:
+    """
+    Janela fixa no Redis, compartilhada por todos os workers. Conta o frame e
+    retorna 0 se ele cabe na janela, senão os segundos até a próxima.
+    """
+    window = settings.LOCATION_UPDATE_INTERVAL_SECONDS
+    now = time.time()
+    slot = int(now // window)
+    key = f"loc:rl:{user_id}:{slot}"
+    async with redis.pipeline(transaction=False) as pipe:
+        count, _ = await pipe.incr(key).expire(key, window * 2).execute()
+    if count <= settings.LOCATION_USER_FRAMES_PER_INTERVAL:
+        return 0.0
+    return (slot + 1) * window - now
+
+
+class FrameThrottle:
+    """Admite ou adia os frames de uma conexão; process() nunca roda em paralelo."""
+
+    def __init__(
+        self,
+        user_id: str,
+        process: Callable[[dict], Awaitable[None]],
+        redis: aioredis.Redis | None = None,
+    ):
+        self.user_id = user_id
+        self.process = process
+        self.redis = redis if settings.LOCATION_GLOBAL_LIMIT else None
+        self.stats = FrameStats()
+        self.buckets: List[TokenBucket] = [
+            TokenBucket(_rate(settings.LOCATION_FRAMES_PER_INTERVAL), settings.LOCATION_FRAME_BURST),
+            _acquire_user_bucket(user_id),
+        ]
+        self._pending: dict | None = None
+        self._drain_task: asyncio.Task | None = None
+        self._closed = False
+
+    def _count(self, field: str) -> None:
+        setattr(self.stats, field, getattr(self.stats, field) + 1)
+        setattr(stats, field, getattr(stats, field) + 1)
+
+    async def _admit(self) -> float:
+        """Consome um token de cada bucket; retorna 0 se admitido, senão quanto esperar."""
+        if not all(b.available() for b in self.buckets):
+            return max(b.wait_time() for b in self.buckets)
+        for bucket in self.buckets:
+            bucket.take()
+        if self.redis is not None:
+            return await global_wait(self.redis, self.user_id)
+        return 0.0
+
+    async def submit(self, frame: dict) -> None:
+        self._count("received")
+        if self._drain_task is not None and not self._drain_task.done():
+            # Já há um frame esperando token: o mais novo toma o lugar dele
+            self._count("throttled")
+            self._count("coalesced")
+            self._pending = frame
+            return
+
+        wait = await self._admit()
+        if wait == 0:
+            self._count("processed")
+            await self.process(frame)
+            return
+
+        self._count("throttled")
+        self._pending = frame
+        self._drain_task = asyncio.create_task(self._drain(wait))
+
+    async def _drain(self, wait: float) -> None:
+        try:
+            while True:
+                await asyncio.sleep(wait)
+                wait = await self._admit()
+                if wait == 0:
+                    break
+            frame, self._pending = self._pending, None
+            self._count("processed")
+            await self.process(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Falha ao processar frame de localização de %s", self.user_id)
+
+    async def close(self) -> None:
+        """Descarta o pendente (a conexão acabou) e libera o bucket do usuário."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._drain_task is not None and self._drain_task is not asyncio.current_task():
+            self._drain_task.cancel()
+            await asyncio.gather(self._drain_task, return_exceptions=True)
+        _release_user_bucket(self.user_id)
+        if self.stats.throttled:
+            logger.info(
+                "Localização de %s: %s frames recebidos, %s processados, %s acima do limite",
+                self.user_id, self.stats.received, self.stats.processed, self.stats.throttled,
+            )
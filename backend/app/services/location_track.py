@@ -0,0 +1,121 @@
+"""
+Trajeto recente de cada usuário no Redis: o histórico da última hora sem
+passar pelo Postgres.
+
+Cada posição gravada em `locations` (LocationWriter e POST /batch) também
+entra em loc:track:{user_id} — sorted set com score = instante e membro =
+registro compacto (ts double + lat/lng em 1e-7 grau como int32, 16 bytes em
+base64 = 24 caracteres). O set guarda as LOCATION_TRACK_MAX_POINTS posições
+mais recentes e expira após LOCATION_TRACK_TTL_SECONDS sem escrita.
+
+Cobertura: loc:track:since:{user_id} é o instante em que o set foi criado
+(mais a tolerância de relógio adiantado). Toda posição com
+ts ≥ max(since, menor score) foi gravada depois disso e está no set; antes desse ponto, só o Postgres tem o histórico completo.
+Uma escrita que falha marca o usuário e a próxima recomeça o set do zero.
+"""
+import base64
+import logging
+import struct
+import uuid
+from datetime import datetime, timedelta, UTC
+from typing import Dict, Iterable, List, Set, Tuple
+
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+Point = Tuple[float, float, float]  # (ts, lat, lng)
+
+_RECORD = struct.Struct("<dii")  # ts, lat·1e7, lng·1e7
+_SCALE = 10_000_000
+
+# Posições gravadas antes da criação do set podem ter ts até 60 s no futuro
+# (tolerância de location_ingest.validate): a cobertura começa depois disso
+_CLOCK_SKEW = timedelta(seconds=60)
+
+# Usuários cujo set pode ter perdido uma posição (escrita falhou neste worker)
+_dirty: Set[str] = set()
+
+
+def track_key(user_id: uuid.UUID | str) -> str:
+    return f"loc:track:{user_id}"
+
+
+def since_key(user_id: uuid.UUID | str) -> str:
+    return f"loc:track:since:{user_id}"
+
+
+def encode(point: Point) -> str:
+    ts, lat, lng = point
+    return base64.b64encode(_RECORD.pack(ts, round(lat * _SCALE), round(lng * _SCALE))).decode("ascii")
+
+
+def decode(member: str) -> Point:
+    ts, lat, lng = _RECORD.unpack(base64.b64decode(member))
+    return ts, lat / _SCALE, lng / _SCALE
+
+
+def stored_ts(recorded_at: datetime) -> float:
+    """ts exatamente como gravado em recorded_at (naive UTC)."""
+    return recorded_at.replace(tzinfo=UTC).timestamp()
+
+
+def recorded_at(ts: float) -> datetime:
+    """Inverso de stored_ts: o recorded_at (naive UTC) correspondente ao ts."""
+    return datetime.fromtimestamp(ts, UTC).replace(tzinfo=None)
+
+
+def rounded(ts: float | None) -> float | None:
+    """ts na precisão de recorded_at (microssegundos)."""
+    return None if ts is None else stored_ts(recorded_at(ts))
+
+
+async def append(redis: aioredis.Redis, tracks: Dict[uuid.UUID | str, Iterable[Point]]) -> None:
+    """Acrescenta posições já gravadas no banco, de vários usuários, num único round trip."""
+    tracks = {str(uid): list(points) for uid, points in tracks.items()}
+    tracks = {uid: points for uid, points in tracks.items() if points}
+    if not tracks:
+        return
+    # Arredondado ao microssegundo, como recorded_at: a fronteira com o Postgres é exata
+    since_ts = stored_ts(datetime.now(UTC).replace(tzinfo=None) + _CLOCK_SKEW)
+    ttl = settings.LOCATION_TRACK_TTL_SECONDS
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for uid, points in tracks.items():
+                key, since = track_key(uid), since_key(uid)
+                if uid in _dirty:
+                    pipe.delete(key, since)
+                pipe.zadd(key, {encode(p): p[0] for p in points})
+                pipe.zremrangebyrank(key, 0, -settings.LOCATION_TRACK_MAX_POINTS - 1)
+                # Só na criação: o que foi gravado antes disso não está no set
+                pipe.set(since, since_ts, ex=ttl, nx=True)
+                pipe.expire(key, ttl)
+                pipe.expire(since, ttl)
+            await pipe.execute()
+    except Exception:
+        _dirty.update(tracks)
+        logger.exception("Trajeto recente: falha ao gravar posições de %s usuários", len(tracks))
+        return
+    _dirty.difference_update(tracks)
+
+
+async def read(
+    redis: aioredis.Redis, user_id: uuid.UUID | str, start: float, end: float, limit: int,
+) -> Tuple[List[Point], float | None]:
+    """
+    Até `limit` posições com start ≤ ts ≤ end, da mais recente para a mais
+    antiga, e o instante a partir do qual o set está completo (None se não
+    há set). Posições anteriores a esse instante não são retornadas.
+    """
+    key = track_key(user_id)
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.get(since_key(user_id))
+        pipe.zrange(key, 0, 0, withscores=True)
+        since, oldest = await pipe.execute()
+    if since is None or not oldest:
+        return [], None
+    covered_from = max(float(since), oldest[0][1])
+    members = await redis.zrevrangebyscore(key, end, max(start, covered_from), start=0, num=limit)
+    return [decode(m) for m in members], covered_from
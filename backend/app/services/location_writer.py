@@ -0,0 +1,142 @@
+"""
+Gravação em lote das posições recebidas pelos WebSockets de localização.
+
+Os sockets não seguram sessão do banco: cada posição a persistir entra no
+buffer do processo, gravado num único INSERT multi-linha quando chega a
+LOCATION_WRITE_BATCH_SIZE posições ou LOCATION_WRITE_MAX_DELAY_MS depois da
+primeira. Um flush por vez — o ingest ocupa no máximo uma conexão do pool por
+worker, e o número de sockets abertos fica limitado pela memória, não pelo
+DB_POOL_SIZE.
+
+Se o INSERT falha, o lote volta para o início do buffer e a nova tentativa
+espera LOCATION_WRITE_RETRY_BASE_MS, dobrando a cada falha seguida (até
+LOCATION_WRITE_RETRY_MAX_SECONDS); enquanto isso, lote cheio não dispara
+flush. O buffer fica limitado a LOCATION_WRITE_MAX_PENDING posições — acima
+disso, as mais antigas são descartadas (a última posição de cada usuário
+continua no Redis).
+
+Depois do INSERT, as posições entram no trajeto recente do Redis
+(app/services/location_track.py) e nas estatísticas do dia
+(app/services/location_stats.py).
+"""
+import asyncio
+import logging
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from app.core import database
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.models.location import Location
+from app.services import location_stats, location_track
+
+logger = logging.getLogger(__name__)
+
+
+class LocationWriter:
+    def __init__(
+        self,
+        session_factory: sessionmaker,
+        batch_size: int | None = None,
+        max_delay: float | None = None,
+        max_pending: int | None = None,
+        retry_delay: float | None = None,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size or settings.LOCATION_WRITE_BATCH_SIZE
+        self.max_delay = settings.LOCATION_WRITE_MAX_DELAY_MS / 1000 if max_delay is None else max_delay
+        self.max_pending = max_pending or settings.LOCATION_WRITE_MAX_PENDING
+        self.retry_delay = settings.LOCATION_WRITE_RETRY_BASE_MS / 1000 if retry_delay is None else retry_delay
+        self._rows: List[dict] = []
+        self._lock = asyncio.Lock()
+        self._timer: asyncio.Task | None = None
+        self._failures = 0     # falhas seguidas do INSERT
+        self._retry_at = 0.0   # loop.time() antes do qual não se tenta de novo
+        self._closed = False
+
+    @property
+    def pending(self) -> int:
+        return len(self._rows)
+
+    async def add(self, user_id: uuid.UUID, lat: float, lng: float, recorded_at: datetime) -> None:
+        self._rows.append({"user_id": user_id, "latitude": lat, "longitude": lng, "recorded_at": recorded_at})
+        if len(self._rows) >= self.batch_size and not self._backing_off():
+            # Espera o flush: o socket que enche o lote sente a contrapressão
+            await self.flush()
+        else:
+            self._schedule()
+
+    def _backing_off(self) -> bool:
+        return self._failures > 0 and asyncio.get_running_loop().time() < self._retry_at
+
+    def _schedule(self) -> None:
+        if not self._closed and (self._timer is None or self._timer.done()):
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        # Repete enquanto sobrar posição: lote devolvido por falha ou chegado durante o INSERT
+        while self._rows:
+            loop = asyncio.get_running_loop()
+            await asyncio.sleep(max(self.max_delay, self._retry_at - loop.time()))
+            # Cancelar o timer (close) não interrompe um INSERT já iniciado
+            await asyncio.shield(self.flush())
+
+    async def flush(self) -> int:
+        """Grava o que estiver no buffer numa sessão curta. Retorna quantas posições gravou."""
+        async with self._lock:
+            rows, self._rows = self._rows, []
+            if not rows:
+                return 0
+            try:
+                async with self.session_factory() as db:
+                    await db.execute(insert(Location), rows)
+                    await db.commit()
+            except Exception:
+                self._requeue(rows)
+                return 0
+            self._failures = 0
+
+            redis = await get_redis()
+            tracks = defaultdict(list)
+            for row in rows:
+                tracks[row["user_id"]].append(
+                    (location_track.stored_ts(row["recorded_at"]), row["latitude"], row["longitude"])
+                )
+            await location_track.append(redis, tracks)
+            await location_stats.record(redis, tracks)
+            if database.has_replica():
+                for user_id in tracks:
+                    await database.pin_to_primary(redis, user_id)
+            return len(rows)
+
+    def _requeue(self, rows: List[dict]) -> None:
+        """Devolve o lote ao início do buffer e agenda a nova tentativa com backoff."""
+        self._failures += 1
+        backoff = min(self.retry_delay * 2 ** (self._failures - 1), settings.LOCATION_WRITE_RETRY_MAX_SECONDS)
+        self._retry_at = asyncio.get_running_loop().time() + backoff
+        self._rows = rows + self._rows
+        logger.exception(
+            "Falha ao gravar %s posições (%sª seguida); nova tentativa em %.1f s",
+            len(rows), self._failures, backoff,
+        )
+        dropped = len(self._rows) - self.max_pending
+        if dropped > 0:
+            # A última posição de cada usuário continua no Redis; só o histórico perde as mais antigas
+            del self._rows[:dropped]
+            logger.error("Buffer de posições cheio; %s posições mais antigas descartadas", dropped)
+        self._schedule()
+
+    async def close(self) -> None:
+        """Cancela o timer e grava o restante (shutdown)."""
+        self._closed = True
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+            await asyncio.gather(self._timer, return_exceptions=True)
+        await self.flush()
+        if self._rows:
+            logger.error("Shutdown com o banco indisponível; %s posições descartadas", len(self._rows))
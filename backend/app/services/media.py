@@ -0,0 +1,203 @@
+"""
+Geração assíncrona de derivados de mídia: thumbnail (imagens) e poster +
+thumbnail (vídeos), gravados no S3 ao lado do original e referenciados em
+Message.thumbnail_key / Message.poster_key.
+
+Backends (MEDIA_PROCESSING_BACKEND):
+  - celery:  tarefa no broker (REDIS_URL), executada pelo worker Celery
+             (app/workers/media.py)
+  - process: ProcessPoolExecutor local — desenvolvimento sem broker
+
+Pillow e Celery são importados só quando usados: a API importa este módulo
+no boot apenas para agendar o processamento.
+"""
+import asyncio
+import io
+import logging
+import multiprocessing
+import shutil
+import subprocess
+import tempfile
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Dict
+
+import redis.asyncio as aioredis
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import storage
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.redis_client import get_redis
+from app.models.message import Message
+from app.services import message_cache
+
+if TYPE_CHECKING:
+    from PIL.Image import Image as PILImage
+
+logger = logging.getLogger(__name__)
+
+
+# ─────────────────────────────────────────────
+# Geração (síncrona — roda no worker ou no pool de processos)
+# ─────────────────────────────────────────────
+
+def _to_jpeg(image: "PILImage", size: int) -> bytes:
+    image = image.copy()
+    image.thumbnail((size, size))
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    buf = io.BytesIO()
+    image.save(buf, "JPEG", quality=80, optimize=True, progressive=True)
+    return buf.getvalue()
+
+
+def _put_jpeg(s3, key: str, body: bytes) -> str:
+    s3.put_object(Bucket=settings.AWS_S3_BUCKET, Key=key, Body=body, ContentType="image/jpeg")
+    return key
+
+
+def _extract_frame(video_path: str) -> bytes | None:
+    """Primeiro quadro útil do vídeo (em 1s, ou 0s se for mais curto) via ffmpeg."""
+    for offset in ("1", "0"):
+        try:
+            proc = subprocess.run(
+                ["ffmpeg", "-loglevel", "error", "-ss", offset, "-i", video_path,
+                 "-frames:v", "1", "-f", "image2pipe", "-vcodec", "mjpeg", "-"],
+                capture_output=True,
+                timeout=60,
+            )
+        except FileNotFoundError:
+            logger.warning("ffmpeg não encontrado: poster de vídeo não será gerado")
+            return None
+        if proc.returncode == 0 and proc.stdout:
+            return proc.stdout
+    return None
+
+
+def generate_derivatives(media_key: str) -> Dict[str, str]:
+    """
+    Baixa o original do S3 para disco (sem carregá-lo inteiro em memória),
+    gera os derivados e os envia ao S3. Retorna {coluna: chave} dos gerados.
+    """
+    from PIL import Image, ImageOps
+
+    s3 = storage.get_s3()
+    base, ext = media_key.rsplit(".", 1)
+    derivatives: Dict[str, str] = {}
+
+    with tempfile.NamedTemporaryFile(suffix=f".{ext}") as original:
+        body = s3.get_object(Bucket=settings.AWS_S3_BUCKET, Key=media_key)["Body"]
+        shutil.copyfileobj(body, original)
+        original.flush()
+
+        if ext == "mp4":
+            frame = _extract_frame(original.name)
+            if frame is None:
+                return derivatives
+            image = Image.open(io.BytesIO(frame))
+            derivatives["poster_key"] = _put_jpeg(
+                s3, f"{base}_poster.jpg", _to_jpeg(image, settings.MEDIA_POSTER_SIZE)
+            )
+        else:
+            original.seek(0)
+            image = Image.open(original)
+            # JPEG: decodifica direto numa escala reduzida (DCT scaling) — evita
+            # decodificar a foto inteira de 12 MP para gerar uma miniatura.
+            image.draft("RGB", (settings.MEDIA_THUMBNAIL_SIZE, settings.MEDIA_THUMBNAIL_SIZE))
+            image = ImageOps.exif_transpose(image)
+
+        derivatives["thumbnail_key"] = _put_jpeg(
+            s3, f"{base}_thumb.jpg", _to_jpeg(image, settings.MEDIA_THUMBNAIL_SIZE)
+        )
+
+    return derivatives
+
+
+# ─────────────────────────────────────────────
+# Persistência dos derivados
+# ─────────────────────────────────────────────
+
+async def save_derivatives(
+    db: AsyncSession, redis: aioredis.Redis, message_id: uuid.UUID, derivatives: Dict[str, str],
+) -> None:
+    """Grava as chaves na mensagem e invalida o cache de recentes do grupo."""
+    if not derivatives:
+        return
+    result = await db.execute(
+        update(Message)
+        .where(Message.id == message_id)
+        .values(**derivatives)
+        .returning(Message.group_id)
+    )
+    group_id = result.scalar_one_or_none()
+    await db.commit()
+    if group_id is not None:
+        await message_cache.invalidate(redis, group_id)
+
+
+async def save_derivatives_standalone(message_id: uuid.UUID, derivatives: Dict[str, str]) -> None:
+    """save_derivatives com sessão e Redis próprios (worker Celery, pool local)."""
+    async with AsyncSessionLocal() as db:
+        await save_derivatives(db, await get_redis(), message_id, derivatives)
+
+
+# ─────────────────────────────────────────────
+# Backend ProcessPool local
+# ─────────────────────────────────────────────
+
+_pool: ProcessPoolExecutor | None = None
+_running: set[asyncio.Task] = set()
+
+
+def _process_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: o filho não herda clientes boto3/asyncpg do processo da API
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.MEDIA_PROCESS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+async def _process_locally(message_id: uuid.UUID, media_key: str) -> None:
+    loop = asyncio.get_running_loop()
+    try:
+        derivatives = await loop.run_in_executor(_process_pool(), generate_derivatives, media_key)
+        await save_derivatives_standalone(message_id, derivatives)
+    except Exception:
+        logger.exception("Falha ao gerar derivados de %s", media_key)
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+# ─────────────────────────────────────────────
+# Agendamento
+# ─────────────────────────────────────────────
+
+def schedule_processing(message_id: uuid.UUID, media_key: str) -> None:
+    """Agenda a geração de derivados sem bloquear a request."""
+    if settings.MEDIA_PROCESSING_BACKEND == "process":
+        coro = _process_locally(message_id, media_key)
+    else:
+        # .delay() é I/O síncrono no broker (com retries se ele cair): fica fora do event loop
+        coro = asyncio.to_thread(_enqueue, message_id, media_key)
+    task = asyncio.create_task(coro)
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+
+
+def _enqueue(message_id: uuid.UUID, media_key: str) -> None:
+    try:
+        from app.workers.media import process_media_task   # carrega o Celery no primeiro envio
+        process_media_task.delay(str(message_id), media_key)
+    except Exception:
+        # A mensagem já foi salva: sem derivados o app exibe o original
+        logger.exception("Falha ao enfileirar processamento de %s", media_key)
@@ -0,0 +1,99 @@
+"""
+Cache das mensagens mais recentes de cada grupo (lista Redis, mais nova primeiro).
+
+Invariante: a lista ou não existe, ou contém as min(total, CHAT_RECENT_CACHE_SIZE)
+mensagens mais recentes do grupo. Escritas usam LPUSHX (só inserem em cache
+existente); um cache ausente é reconstruído inteiro a partir do banco.
+
+Corrida do rebuild: o leitor lê a geração (msg:recent:gen:{group_id}) antes
+da query, e push/invalidate a incrementam. rebuild() monta a lista numa chave
+temporária e só a troca com RENAME (WATCH/MULTI) se a geração não mudou e o
+cache não tem uma mensagem mais nova que a da query — uma leitura antiga
+nunca sobrescreve o que já foi escrito depois dela.
+"""
+import json
+import uuid
+from datetime import datetime
+
+import redis.asyncio as aioredis
+from redis.exceptions import WatchError
+
+from app.core.config import settings
+
+
+def recent_key(group_id: uuid.UUID) -> str:
+    return f"msg:recent:{group_id}"
+
+
+def generation_key(group_id: uuid.UUID) -> str:
+    return f"msg:recent:gen:{group_id}"
+
+
+async def generation(redis: aioredis.Redis, group_id: uuid.UUID) -> str | None:
+    """Lida antes da query cujo resultado vai para rebuild()."""
+    return await redis.get(generation_key(group_id))
+
+
+def _bump(pipe, group_id: uuid.UUID) -> None:
+    pipe.incr(generation_key(group_id))
+    pipe.expire(generation_key(group_id), settings.CHAT_RECENT_CACHE_TTL_SECONDS)
+
+
+async def push(redis: aioredis.Redis, group_id: uuid.UUID, item: dict) -> None:
+    key = recent_key(group_id)
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.lpushx(key, json.dumps(item))
+        pipe.ltrim(key, 0, settings.CHAT_RECENT_CACHE_SIZE - 1)
+        _bump(pipe, group_id)
+        await pipe.execute()
+
+
+async def read(redis: aioredis.Redis, group_id: uuid.UUID, count: int) -> list[dict]:
+    """Até `count` mensagens do cache; lista vazia se o cache não existe."""
+    return [json.loads(raw) for raw in await redis.lrange(recent_key(group_id), 0, count - 1)]
+
+
+def _position(item: dict) -> tuple:
+    # Mesma ordem da paginação keyset: (created_at, id)
+    return datetime.fromisoformat(item["created_at"]), uuid.UUID(item["id"])
+
+
+async def rebuild(
+    redis: aioredis.Redis, group_id: uuid.UUID, items: list[dict], seen_generation: str | None,
+) -> bool:
+    """Recria o cache com `items` lidos depois de generation(). False se desistiu."""
+    if not items:
+        return False
+    key = recent_key(group_id)
+    tmp = f"{key}:rebuild:{uuid.uuid4().hex}"
+    ttl = settings.CHAT_RECENT_CACHE_TTL_SECONDS
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.rpush(tmp, *[json.dumps(item) for item in items[:settings.CHAT_RECENT_CACHE_SIZE]])
+        pipe.expire(tmp, ttl)
+        await pipe.execute()
+
+    async with redis.pipeline(transaction=True) as pipe:
+        try:
+            await pipe.watch(generation_key(group_id), key)
+            head = await pipe.lindex(key, 0)
+            stale = (
+                await pipe.get(generation_key(group_id)) != seen_generation
+                or (head is not None and _position(json.loads(head)) > _position(items[0]))
+            )
+            if not stale:
+                pipe.multi()
+                pipe.rename(tmp, key)
+                pipe.expire(key, ttl)
+                await pipe.execute()
+                return True
+        except WatchError:
+            pass
+    await redis.delete(tmp)
+    return False
+
+
+async def invalidate(redis: aioredis.Redis, group_id: uuid.UUID) -> None:
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.delete(recent_key(group_id))
+        _bump(pipe, group_id)
+        await pipe.execute()
@@ -0,0 +1,113 @@
+"""
+Presença: quem está online em cada grupo e o last_seen_at dos usuários.
+
+Heartbeats (frames dos WebSockets) vão para um sorted set por grupo,
+presence:{group_id} (membro = user_id, score = instante); "quem está online"
+é um único ZRANGEBYSCORE a partir de agora − PRESENCE_ONLINE_SECONDS. Cada
+worker escreve no máximo um heartbeat por usuário/grupo a cada
+PRESENCE_HEARTBEAT_SECONDS, não um por frame.
+
+User.last_seen_at não é mais gravado a cada login/requisição: touch() só
+anota o instante em memória, e run() grava tudo a cada
+PRESENCE_FLUSH_SECONDS num UPDATE em lote (executemany).
+"""
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, UTC
+from typing import Dict, Iterable, List, Tuple
+
+import redis.asyncio as aioredis
+from sqlalchemy import bindparam, or_, update
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+
+def presence_key(group_id: uuid.UUID | str) -> str:
+    return f"presence:{group_id}"
+
+
+async def online(redis: aioredis.Redis, group_id: uuid.UUID | str) -> List[str]:
+    """user_ids com heartbeat no grupo nos últimos PRESENCE_ONLINE_SECONDS."""
+    since = time.time() - settings.PRESENCE_ONLINE_SECONDS
+    return await redis.zrangebyscore(presence_key(group_id), since, "+inf")
+
+
+class Presence:
+    def __init__(self) -> None:
+        self._seen: Dict[uuid.UUID, datetime] = {}
+        self._last_beat: Dict[Tuple[uuid.UUID, str], float] = {}
+
+    @property
+    def pending(self) -> int:
+        return len(self._seen)
+
+    def touch(self, user_id: uuid.UUID) -> None:
+        """Marca o usuário como visto agora; gravado no próximo flush."""
+        self._seen[user_id] = datetime.now(UTC).replace(tzinfo=None)
+
+    async def heartbeat(self, redis: aioredis.Redis, user_id: uuid.UUID, group_ids: Iterable[uuid.UUID | str]) -> None:
+        """Registra o usuário como online nos grupos (no máximo um ZADD por intervalo)."""
+        self.touch(user_id)
+        now = time.time()
+        due = [
+            str(gid) for gid in group_ids
+            if now - self._last_beat.get((user_id, str(gid)), 0) >= settings.PRESENCE_HEARTBEAT_SECONDS
+        ]
+        if not due:
+            return
+        async with redis.pipeline(transaction=False) as pipe:
+            for gid in due:
+                key = presence_key(gid)
+                pipe.zadd(key, {str(user_id): now})
+                # Poda quem já saiu da janela: o set não cresce com membros antigos
+                pipe.zremrangebyscore(key, "-inf", now - settings.PRESENCE_ONLINE_SECONDS)
+                pipe.expire(key, settings.PRESENCE_ONLINE_SECONDS * 2)
+            await pipe.execute()
+        for gid in due:
+            self._last_beat[(user_id, gid)] = now
+
+    async def flush(self, session_factory: sessionmaker) -> int:
+        """Grava os last_seen_at pendentes num UPDATE em lote. Retorna quantos usuários gravou."""
+        seen, self._seen = self._seen, {}
+        # Heartbeats antigos não servem mais para deduplicar
+        horizon = time.time() - settings.PRESENCE_HEARTBEAT_SECONDS
+        self._last_beat = {k: t for k, t in self._last_beat.items() if t >= horizon}
+        if not seen:
+            return 0
+
+        users = User.__table__
+        stmt = (
+            update(users)
+            .where(
+                users.c.id == bindparam("b_id"),
+                # Outro worker pode já ter gravado um instante mais novo
+                or_(users.c.last_seen_at.is_(None), users.c.last_seen_at < bindparam("b_seen")),
+            )
+            .values(last_seen_at=bindparam("b_seen"))
+        )
+        try:
+            async with session_factory() as db:
+                await db.execute(stmt, [{"b_id": uid, "b_seen": at} for uid, at in seen.items()])
+                await db.commit()
+        except Exception:
+            logger.exception("Presença: falha ao gravar last_seen_at de %s usuários", len(seen))
+            # Devolve ao buffer sem sobrescrever instantes mais novos
+            for uid, at in seen.items():
+                self._seen.setdefault(uid, at)
+            return 0
+        return len(seen)
+
+    async def run(self, session_factory: sessionmaker) -> None:
+        """Loop do lifespan: flush a cada PRESENCE_FLUSH_SECONDS (o último é feito no shutdown)."""
+        while True:
+            await asyncio.sleep(settings.PRESENCE_FLUSH_SECONDS)
+            await self.flush(session_factory)
+
+
+presence = Presence()
@@ -0,0 +1,80 @@
+"""
+Nomes dos membros de cada grupo, em cache num hash Redis
+group:roster:{group_id} (user_id → nome).
+
+Quem monta posições para o cliente (GET /locations/group/{id}/last) resolve
+os nomes aqui em vez de guardá-los em cada loc:last. O cache é invalidado
+quando a composição do grupo muda (join/leave) e expira após
+GROUP_ROSTER_CACHE_TTL_SECONDS. Como em app/services/devices.py, a
+invalidação incrementa uma geração e o cache só é preenchido se ela não
+mudou desde antes da query.
+"""
+import uuid
+from typing import Dict, Iterable
+
+import redis.asyncio as aioredis
+from redis.exceptions import WatchError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.group import GroupMember
+from app.models.user import User
+
+# Campo marcador: distingue "grupo sem membros" de "cache ausente"
+_EMPTY = ""
+
+
+def roster_key(group_id: uuid.UUID) -> str:
+    return f"group:roster:{group_id}"
+
+
+def generation_key(group_id: uuid.UUID) -> str:
+    return f"group:roster:gen:{group_id}"
+
+
+async def group_roster(db: AsyncSession, redis: aioredis.Redis, group_id: uuid.UUID) -> Dict[str, str]:
+    """user_id → nome de todos os membros — cache Redis, ou uma única query (join)."""
+    key = roster_key(group_id)
+    cached = await redis.hgetall(key)
+
+    if not cached:
+        seen = await redis.get(generation_key(group_id))
+        result = await db.execute(
+            select(User.id, User.name)
+            .join(GroupMember, GroupMember.user_id == User.id)
+            .where(GroupMember.group_id == group_id)
+        )
+        cached = {str(user_id): name for user_id, name in result.all()} or {_EMPTY: _EMPTY}
+        await _fill(redis, group_id, seen, cached)
+
+    return {user_id: name for user_id, name in cached.items() if user_id != _EMPTY}
+
+
+async def _fill(redis: aioredis.Redis, group_id: uuid.UUID, seen: str | None, names: dict) -> None:
+    """Grava o cache só se nenhuma invalidação aconteceu desde a leitura de `seen`."""
+    key = roster_key(group_id)
+    async with redis.pipeline(transaction=True) as pipe:
+        try:
+            await pipe.watch(generation_key(group_id))
+            if await pipe.get(generation_key(group_id)) != seen:
+                return
+            pipe.multi()
+            pipe.delete(key)
+            pipe.hset(key, mapping=names)
+            pipe.expire(key, settings.GROUP_ROSTER_CACHE_TTL_SECONDS)
+            await pipe.execute()
+        except WatchError:
+            pass  # invalidado durante a gravação: o próximo leitor preenche
+
+
+async def invalidate_groups(redis: aioredis.Redis, group_ids: Iterable[uuid.UUID]) -> None:
+    group_ids = set(group_ids)
+    if not group_ids:
+        return
+    async with redis.pipeline(transaction=False) as pipe:
+        for gid in group_ids:
+            pipe.delete(roster_key(gid))
+            pipe.incr(generation_key(gid))
+            pipe.expire(generation_key(gid), settings.GROUP_ROSTER_CACHE_TTL_SECONDS)
+        await pipe.execute()
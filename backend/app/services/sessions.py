@@ -0,0 +1,161 @@
+"""
+Sessões (refresh tokens) por usuário, com rotação e revogação.
+
+Cada login abre uma família de refresh tokens — rt:fam:{fid} guarda o
+"user_id|jti" do único refresh token válido da família, e rt:user:{user_id}
+o conjunto de famílias do usuário. Cada /auth/refresh troca o jti com um
+SET XX GET atômico: apresentar um refresh token já trocado (reuso, sinal de
+token vazado) encerra a família inteira.
+
+Encerrar todas as sessões de um usuário é uma escrita no hash
+auth:revoked_before (user_id → instante) mais um PUBLISH. Cada worker mantém
+esse hash em memória (RevocationCache, atualizado pelo canal
+auth:revocations), e get_current_user rejeita tokens com iat anterior ao
+instante sem ir ao Redis.
+"""
+import asyncio
+import logging
+import secrets
+import time
+import uuid
+from typing import Dict
+
+import redis.asyncio as aioredis
+from fastapi import HTTPException, status
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+REVOKED_BEFORE_KEY = "auth:revoked_before"
+REVOCATIONS_CHANNEL = "auth:revocations"
+
+
+def family_key(fid: str) -> str:
+    return f"rt:fam:{fid}"
+
+
+def user_sessions_key(user_id: uuid.UUID | str) -> str:
+    return f"rt:user:{user_id}"
+
+
+def _ttl() -> int:
+    return settings.REFRESH_TOKEN_EXPIRE_DAYS * 86400
+
+
+def _new_jti() -> str:
+    return secrets.token_urlsafe(12)
+
+
+def _session_ended() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Sessão encerrada")
+
+
+# ─────────────────────────────────────────────
+# Watermark "tokens emitidos antes de" (cache local)
+# ─────────────────────────────────────────────
+
+class RevocationCache:
+    """auth:revoked_before em memória: a verificação por requisição não toca o Redis."""
+
+    def __init__(self) -> None:
+        self._revoked_before: Dict[str, float] = {}
+
+    def apply(self, user_id: str, revoked_before: float) -> None:
+        if revoked_before > self._revoked_before.get(user_id, 0):
+            self._revoked_before[user_id] = revoked_before
+
+    def is_revoked(self, user_id: str, issued_at: float | None) -> bool:
+        revoked_before = self._revoked_before.get(user_id)
+        return revoked_before is not None and (issued_at or 0) < revoked_before
+
+    async def load(self, redis: aioredis.Redis) -> None:
+        """Carrega o hash inteiro e poda os instantes que nenhum token vivo pode mais anteceder."""
+        oldest_relevant = time.time() - _ttl()
+        stale = []
+        for user_id, value in (await redis.hgetall(REVOKED_BEFORE_KEY)).items():
+            if float(value) < oldest_relevant:
+                stale.append(user_id)
+            else:
+                self.apply(user_id, float(value))
+        if stale:
+            await redis.hdel(REVOKED_BEFORE_KEY, *stale)
+
+    async def listen(self, redis: aioredis.Redis) -> None:
+        """Assina o canal antes de carregar o hash (nenhuma revogação se perde no meio)."""
+        while True:
+            try:
+                async with redis.pubsub() as pubsub:
+                    await pubsub.subscribe(REVOCATIONS_CHANNEL)
+                    await self.load(redis)
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            user_id, _, revoked_before = message["data"].partition("|")
+                            self.apply(user_id, float(revoked_before))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Sessões: assinatura de %s caiu; reconectando", REVOCATIONS_CHANNEL)
+                await asyncio.sleep(1)
+
+
+revocations = RevocationCache()
+
+
+async def revoke_all(redis: aioredis.Redis, user_id: uuid.UUID) -> None:
+    """Encerra todas as sessões: tokens (access e refresh) emitidos até agora deixam de valer."""
+    now = time.time()
+    uid = str(user_id)
+    revocations.apply(uid, now)
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.hset(REVOKED_BEFORE_KEY, uid, now)
+        pipe.publish(REVOCATIONS_CHANNEL, f"{uid}|{now}")
+        await pipe.execute()
+
+    # Limpeza: as famílias já estão barradas pelo watermark
+    fids = await redis.smembers(user_sessions_key(uid))
+    await redis.delete(user_sessions_key(uid), *(family_key(fid) for fid in fids))
+
+
+# ─────────────────────────────────────────────
+# Famílias de refresh tokens
+# ─────────────────────────────────────────────
+
+async def start(redis: aioredis.Redis, user_id: uuid.UUID) -> Dict[str, str]:
+    """Abre uma família; retorna as claims (fid, jti) do primeiro refresh token."""
+    fid, jti = uuid.uuid4().hex, _new_jti()
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.set(family_key(fid), f"{user_id}|{jti}", ex=_ttl())
+        pipe.sadd(user_sessions_key(user_id), fid)
+        pipe.expire(user_sessions_key(user_id), _ttl())
+        await pipe.execute()
+    return {"fid": fid, "jti": jti}
+
+
+async def end(redis: aioredis.Redis, user_id: uuid.UUID | str, fid: str) -> None:
+    await redis.delete(family_key(fid))
+    await redis.srem(user_sessions_key(user_id), fid)
+
+
+async def rotate(redis: aioredis.Redis, payload: dict) -> Dict[str, str]:
+    """
+    Valida o refresh token (payload já decodificado) contra a família e troca o
+    jti. Retorna as claims do novo refresh token; 401 se a família acabou,
+    foi revogada ou se o token já tinha sido trocado (reuso: encerra a família).
+    """
+    user_id, fid, jti = payload.get("sub"), payload.get("fid"), payload.get("jti")
+    if not (user_id and fid and jti):
+        raise _session_ended()
+    if revocations.is_revoked(user_id, payload.get("iat")):
+        await end(redis, user_id, fid)
+        raise _session_ended()
+
+    new_jti = _new_jti()
+    previous = await redis.set(family_key(fid), f"{user_id}|{new_jti}", ex=_ttl(), xx=True, get=True)
+    if previous is None:
+        raise _session_ended()
+    if previous != f"{user_id}|{jti}":
+        logger.warning("Reuso de refresh token na família %s do usuário %s; sessão encerrada", fid, user_id)
+        await end(redis, user_id, fid)
+        raise _session_ended()
+    return {"fid": fid, "jti": new_jti}
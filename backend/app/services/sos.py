@@ -0,0 +1,239 @@
+"""
+Pipeline do SOS, dirigido pelo log em Redis Streams (app/services/sos_stream.py):
+
+  0. append    — (na request) entrada em sos:events, com Idempotency-Key
+  1. persist   — consumer group "persist": grava/atualiza o SOSEvent
+  2. broadcast — tail em cada processo: frame na faixa prioritária do WebSocket
+  3. notify    — consumer group "notify":
+       lookup — tokens FCM dos demais membros do grupo (cache Redis por grupo)
+       push   — multicast em lotes, concorrência limitada e retries
+       prune  — remoção em lote dos tokens recusados pelo provedor
+
+Cada etapa do notify é cronometrada; o benchmark (benchmarks/sos_latency.py)
+agrega os tempos de todas as etapas.
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, UTC
+from typing import Awaitable, Callable, Dict, List
+
+import redis.asyncio as aioredis
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.push import PushNotification, PushProvider, get_push_provider, send_multicast
+from app.core.redis_client import get_redis
+from app.core.ws_manager import ConnectionManager
+from app.models.message import SOSEvent
+from app.models.user import User
+from app.services import devices, location_sampling, sos_stream
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class DispatchReport:
+    event_id: str
+    notified: int = 0
+    failed: int = 0
+    invalid_tokens: List[str] = field(default_factory=list)
+    timings_ms: Dict[str, float] = field(default_factory=dict)
+
+
+class _Stopwatch:
+    def __init__(self, timings: Dict[str, float]):
+        self.timings = timings
+        self.start = self.last = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.timings[stage] = round((now - self.last) * 1000, 3)
+        self.last = now
+
+    def total(self) -> None:
+        self.timings["total"] = round((time.perf_counter() - self.start) * 1000, 3)
+
+
+# ─────────────────────────────────────────────
+# Entradas do log
+# ─────────────────────────────────────────────
+
+def triggered_entry(
+    user: User, group_id: uuid.UUID, latitude: float, longitude: float, message: str | None,
+) -> sos_stream.Entry:
+    return {
+        "kind": sos_stream.TRIGGERED,
+        "event_id": str(uuid.uuid4()),
+        "group_id": str(group_id),
+        "user_id": str(user.id),
+        "user_name": user.name,
+        "lat": repr(latitude),
+        "lng": repr(longitude),
+        "message": message or "",
+        "ts": repr(time.time()),
+    }
+
+
+def resolved_entry(event_id: uuid.UUID, group_id: uuid.UUID, user: User) -> sos_stream.Entry:
+    return {
+        "kind": sos_stream.RESOLVED,
+        "event_id": str(event_id),
+        "group_id": str(group_id),
+        "user_id": str(user.id),
+        "resolved_by": str(user.id),
+        "ts": repr(time.time()),
+    }
+
+
+def entry_to_out(entry: sos_stream.Entry, resolved: bool) -> dict:
+    return {
+        "id": entry["event_id"],
+        "user_id": entry["user_id"],
+        "lat": float(entry["lat"]),
+        "lng": float(entry["lng"]),
+        "message": entry["message"] or None,
+        "resolved": resolved,
+        "ts": float(entry["ts"]),
+    }
+
+
+def sos_frame(entry: sos_stream.Entry) -> dict:
+    if entry["kind"] == sos_stream.RESOLVED:
+        return {"type": "sos_resolved", "event_id": entry["event_id"], "resolved_by": entry["resolved_by"]}
+    return {
+        "type": "sos",
+        "event_id": entry["event_id"],
+        "user_id": entry["user_id"],
+        "user_name": entry["user_name"],
+        "lat": float(entry["lat"]),
+        "lng": float(entry["lng"]),
+        "message": entry["message"] or None,
+        "ts": float(entry["ts"]),
+    }
+
+
+# ─────────────────────────────────────────────
+# Handlers (um por consumidor)
+# ─────────────────────────────────────────────
+
+async def persist_entry(db: AsyncSession, redis: aioredis.Redis, entry: sos_stream.Entry) -> None:
+    """Idempotente: uma entrada reentregue após falha não duplica o evento."""
+    event_id = uuid.UUID(entry["event_id"])
+    if entry["kind"] == sos_stream.RESOLVED:
+        await db.execute(update(SOSEvent).where(SOSEvent.id == event_id).values(resolved=True))
+    elif await db.get(SOSEvent, event_id) is None:
+        db.add(SOSEvent(
+            id=event_id,
+            user_id=uuid.UUID(entry["user_id"]),
+            group_id=uuid.UUID(entry["group_id"]),
+            latitude=float(entry["lat"]),
+            longitude=float(entry["lng"]),
+            message=entry["message"] or None,
+            # A resolução pode ter sido consumida antes (outro consumidor do grupo)
+            resolved=await sos_stream.is_resolved(redis, entry["group_id"], entry["event_id"]),
+            created_at=datetime.fromtimestamp(float(entry["ts"]), UTC).replace(tzinfo=None),
+        ))
+    await db.commit()
+
+
+async def broadcast_entry(manager: ConnectionManager, entry: sos_stream.Entry) -> None:
+    # Quem está com o mapa aberto recebe antes de qualquer posição enfileirada
+    await manager.broadcast(entry["group_id"], sos_frame(entry), priority=True)
+    # Aparelhos do grupo passam a reportar em alta frequência até a resolução
+    await location_sampling.record_sos(entry)
+
+
+async def notify_entry(
+    db: AsyncSession, redis: aioredis.Redis, provider: PushProvider, entry: sos_stream.Entry,
+) -> DispatchReport:
+    report = DispatchReport(event_id=entry["event_id"])
+    if entry["kind"] != sos_stream.TRIGGERED:
+        return report
+    watch = _Stopwatch(report.timings_ms)
+    group_id = uuid.UUID(entry["group_id"])
+
+    tokens = await devices.group_tokens(db, redis, group_id, exclude_user_id=uuid.UUID(entry["user_id"]))
+    watch.lap("lookup")
+
+    if tokens:
+        result = await send_multicast(provider, tokens, PushNotification(
+            title=f"SOS de {entry['user_name']}",
+            body=entry["message"] or "Precisa de ajuda agora",
+            data={"type": "sos", "event_id": report.event_id, "group_id": entry["group_id"],
+                  "lat": entry["lat"], "lng": entry["lng"]},
+            high_priority=True,
+        ))
+        report.notified = result.sent
+        report.failed = result.failed
+        report.invalid_tokens = result.invalid_tokens
+    watch.lap("push")
+
+    await devices.prune(db, redis, report.invalid_tokens)
+    watch.lap("prune")
+    watch.total()
+
+    logger.info("SOS %s notificado: %s tokens, etapas (ms) %s", report.event_id, len(tokens), report.timings_ms)
+    return report
+
+
+# ─────────────────────────────────────────────
+# Workers (tasks do processo da API)
+# ─────────────────────────────────────────────
+
+async def _forever(name: str, step: Callable[[], Awaitable[object]]) -> None:
+    while True:
+        try:
+            await step()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("SOS: worker %s falhou; tentando de novo", name)
+            await asyncio.sleep(1)
+
+
+async def _persist(entry: sos_stream.Entry) -> None:
+    async with AsyncSessionLocal() as db:
+        await persist_entry(db, await get_redis(), entry)
+
+
+async def _notify(entry: sos_stream.Entry) -> None:
+    async with AsyncSessionLocal() as db:
+        await notify_entry(db, await get_redis(), get_push_provider(), entry)
+
+
+async def start_workers(manager: ConnectionManager) -> List[asyncio.Task]:
+    redis = await get_redis()
+    await sos_stream.ensure_groups(redis)
+    consumer = f"{socket.gethostname()}-{os.getpid()}"
+    block = settings.SOS_CONSUMER_BLOCK_MS
+
+    async def persist_step():
+        await sos_stream.consume(redis, sos_stream.PERSIST, consumer, _persist, block)
+
+    async def notify_step():
+        await sos_stream.consume(redis, sos_stream.NOTIFY, consumer, _notify, block)
+
+    last_id = await sos_stream.head(redis)
+
+    async def broadcast_step():
+        nonlocal last_id
+        last_id = await sos_stream.tail(redis, last_id, lambda e: broadcast_entry(manager, e), block)
+
+    return [
+        asyncio.create_task(_forever(sos_stream.PERSIST, persist_step)),
+        asyncio.create_task(_forever(sos_stream.NOTIFY, notify_step)),
+        asyncio.create_task(_forever("broadcast", broadcast_step)),
+    ]
+
+
+async def stop_workers(tasks: List[asyncio.Task]) -> None:
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,213 @@
+"""
+Log durável de eventos SOS em Redis Streams.
+
+  sos:events                 — stream global; cada acionamento/resolução é uma entrada
+  sos:history:{group_id}     — stream limitado por grupo (últimos SOS_HISTORY_SIZE)
+  sos:resolved:{group_id}    — hash event_id → quem resolveu
+  sos:event:{event_id}       — group_id do evento (autorização da resolução)
+  sos:idem:{user_id}:{key}   — Idempotency-Key → event_id
+  sos:dead:{consumer group}  — entradas que o consumer group desistiu de processar
+
+O endpoint só grava no stream (uma transação MULTI) e responde. Os efeitos
+rodam em consumidores independentes:
+  - persist / notify: consumer groups — cada entrada é processada por um único
+    consumidor do grupo e só recebe XACK depois de concluída; se o processo
+    morrer no meio, a entrada fica pendente e outro consumidor a reassume
+    (XAUTOCLAIM) após SOS_CLAIM_IDLE_MS. Uma entrada que falha em
+    SOS_MAX_DELIVERIES entregas vai para sos:dead:{grupo} e é confirmada,
+    para não ser reassumida para sempre.
+  - broadcast: leitura simples (XREAD) em cada processo da API, já que os
+    WebSockets estão espalhados entre os processos e todos precisam do frame.
+"""
+import logging
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+import redis.asyncio as aioredis
+from redis.exceptions import ResponseError
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+EVENTS = "sos:events"
+
+PERSIST = "persist"
+NOTIFY = "notify"
+CONSUMER_GROUPS = (PERSIST, NOTIFY)
+
+# Tipos de entrada
+TRIGGERED = "sos"
+RESOLVED = "resolved"
+
+Entry = Dict[str, str]
+Handler = Callable[[Entry], Awaitable[None]]
+
+
+def history_key(group_id: str) -> str:
+    return f"sos:history:{group_id}"
+
+
+def resolved_key(group_id: str) -> str:
+    return f"sos:resolved:{group_id}"
+
+
+def event_group_key(event_id: str) -> str:
+    return f"sos:event:{event_id}"
+
+
+def idempotency_key(user_id: str, key: str) -> str:
+    return f"sos:idem:{user_id}:{key}"
+
+
+def dead_letter_key(group: str) -> str:
+    return f"sos:dead:{group}"
+
+
+# ─────────────────────────────────────────────
+# Escrita
+# ─────────────────────────────────────────────
+
+async def append(redis: aioredis.Redis, entry: Entry, idempotency: str | None = None) -> Tuple[str, bool]:
+    """
+    Grava a entrada no log. Retorna (event_id, duplicado).
+    Com Idempotency-Key, a repetição da mesma requisição devolve o event_id
+    original sem gerar um segundo alerta.
+    """
+    event_id, group_id = entry["event_id"], entry["group_id"]
+    idem = idempotency_key(entry["user_id"], idempotency) if idempotency else None
+    if idem is not None and not await redis.set(idem, event_id, nx=True, ex=settings.SOS_IDEMPOTENCY_TTL_SECONDS):
+        return await redis.get(idem), True
+
+    ttl = settings.SOS_HISTORY_TTL_SECONDS
+    try:
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.xadd(EVENTS, entry, maxlen=settings.SOS_STREAM_MAXLEN, approximate=True)
+            if entry["kind"] == TRIGGERED:
+                pipe.xadd(history_key(group_id), entry, maxlen=settings.SOS_HISTORY_SIZE, approximate=True)
+                pipe.expire(history_key(group_id), ttl)
+                pipe.set(event_group_key(event_id), group_id, ex=ttl)
+            else:
+                pipe.hset(resolved_key(group_id), event_id, entry["resolved_by"])
+                pipe.expire(resolved_key(group_id), ttl)
+            await pipe.execute()
+    except Exception:
+        # Sem a entrada no log, a chave apontaria para um alerta que não existe
+        if idem is not None:
+            await redis.delete(idem)
+        raise
+    return event_id, False
+
+
+# ─────────────────────────────────────────────
+# Leitura
+# ─────────────────────────────────────────────
+
+async def event_group(redis: aioredis.Redis, event_id: str) -> str | None:
+    return await redis.get(event_group_key(event_id))
+
+
+async def is_resolved(redis: aioredis.Redis, group_id: str, event_id: str) -> bool:
+    return bool(await redis.hexists(resolved_key(group_id), event_id))
+
+
+async def history(redis: aioredis.Redis, group_id: str, limit: int) -> List[Tuple[Entry, bool]]:
+    """
+    Últimos eventos do grupo (mais recentes primeiro) com o status de
+    resolução. O índice pode ter menos que `limit` (Redis reiniciado, TTL):
+    quem chama completa com o banco.
+    """
+    entries = await redis.xrevrange(history_key(group_id), count=limit)
+    if not entries:
+        return []
+    fields = [f for _, f in entries]
+    resolved = await redis.hmget(resolved_key(group_id), [f["event_id"] for f in fields])
+    return [(f, r is not None) for f, r in zip(fields, resolved)]
+
+
+# ─────────────────────────────────────────────
+# Consumidores
+# ─────────────────────────────────────────────
+
+async def ensure_groups(redis: aioredis.Redis) -> None:
+    for group in CONSUMER_GROUPS:
+        try:
+            await redis.xgroup_create(EVENTS, group, id="0", mkstream=True)
+        except ResponseError as exc:
+            if "BUSYGROUP" not in str(exc):
+                raise
+
+
+async def consume(
+    redis: aioredis.Redis,
+    group: str,
+    consumer: str,
+    handler: Handler,
+    block_ms: int | None = None,
+) -> int:
+    """
+    Processa um lote do consumer group: primeiro reassume entradas esquecidas
+    por consumidores mortos, depois lê as novas. Só confirma (XACK) o que o
+    handler concluiu; falhas ficam pendentes para nova tentativa, até
+    SOS_MAX_DELIVERIES. Retorna quantas entradas recebeu.
+    """
+    count = settings.SOS_CONSUMER_BATCH
+    _, entries, *_ = await redis.xautoclaim(
+        EVENTS, group, consumer, min_idle_time=settings.SOS_CLAIM_IDLE_MS, start_id="0-0", count=count,
+    )
+    entries = list(entries)
+    received = len(entries)
+    if entries:
+        entries = await _without_dead(redis, group, entries)
+    else:
+        for _, stream_entries in await redis.xreadgroup(group, consumer, {EVENTS: ">"}, count=count, block=block_ms) or []:
+            entries.extend(stream_entries)
+        received = len(entries)
+
+    for entry_id, entry in entries:
+        try:
+            await handler(entry)
+        except Exception:
+            logger.exception("SOS: falha no consumidor %s ao processar %s", group, entry_id)
+            continue
+        await redis.xack(EVENTS, group, entry_id)
+    return received
+
+
+async def _without_dead(redis: aioredis.Redis, group: str, entries: list) -> list:
+    """Move para sos:dead:{group} as entradas reassumidas além de SOS_MAX_DELIVERIES; retorna as demais."""
+    async with redis.pipeline(transaction=False) as pipe:
+        for entry_id, _ in entries:
+            pipe.xpending_range(EVENTS, group, min=entry_id, max=entry_id, count=1)
+        pending = await pipe.execute()
+
+    alive = []
+    for (entry_id, entry), info in zip(entries, pending):
+        if not info or info[0]["times_delivered"] <= settings.SOS_MAX_DELIVERIES:
+            alive.append((entry_id, entry))
+            continue
+        logger.error("SOS: %s desistiu de %s após %s entregas", group, entry_id, settings.SOS_MAX_DELIVERIES)
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.xadd(dead_letter_key(group), {**entry, "entry_id": entry_id},
+                      maxlen=settings.SOS_STREAM_MAXLEN, approximate=True)
+            pipe.xack(EVENTS, group, entry_id)
+            await pipe.execute()
+    return alive
+
+
+async def head(redis: aioredis.Redis) -> str:
+    """ID da última entrada do log — ponto de partida do tail."""
+    last = await redis.xrevrange(EVENTS, count=1)
+    return last[0][0] if last else "0-0"
+
+
+async def tail(redis: aioredis.Redis, last_id: str, handler: Handler, block_ms: int | None = None) -> str:
+    """Entrega ao handler as entradas posteriores a last_id; retorna o novo last_id."""
+    response = await redis.xread({EVENTS: last_id}, count=settings.SOS_CONSUMER_BATCH, block=block_ms)
+    for _, entries in response or []:
+        for entry_id, entry in entries:
+            last_id = entry_id
+            try:
+                await handler(entry)
+            except Exception:
+                logger.exception("SOS: falha no broadcast de %s", entry_id)
+    return last_id
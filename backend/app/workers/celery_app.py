@@ -0,0 +1,22 @@
+from celery import Celery
+
+from app.core.config import settings
+
+# O worker não importa main.py: registra todos os models para configurar os mappers
+import app.models.user       # noqa: F401
+import app.models.group      # noqa: F401
+import app.models.location   # noqa: F401
+import app.models.message    # noqa: F401
+import app.models.device     # noqa: F401
+
+# Worker: celery -A app.workers.celery_app worker --loglevel=info
+celery_app = Celery(
+    "minhaturma",
+    broker=settings.CELERY_BROKER_URL or settings.REDIS_URL,
+    include=["app.workers.media"],
+)
+celery_app.conf.update(
+    task_ignore_result=True,
+    task_acks_late=True,              # reprocessa se o worker morrer no meio da tarefa
+    worker_prefetch_multiplier=1,     # tarefas de mídia são longas: não acumula no worker
+)
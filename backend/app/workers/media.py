@@ -0,0 +1,26 @@
+"""
+Tarefas Celery de mídia. Só o worker importa este módulo (e o Celery): a API
+enfileira via schedule_processing em app/services/media.py.
+"""
+import asyncio
+import uuid
+
+from app.core.database import engine
+from app.core.redis_client import close_redis
+from app.services import media
+from app.workers.celery_app import celery_app
+
+
+@celery_app.task(name="media.process", autoretry_for=(Exception,), retry_backoff=True, max_retries=3)
+def process_media_task(message_id: str, media_key: str) -> None:
+    derivatives = media.generate_derivatives(media_key)
+
+    async def _run():
+        try:
+            await media.save_derivatives_standalone(uuid.UUID(message_id), derivatives)
+        finally:
+            # Cada tarefa roda num event loop novo: conexões não podem sobreviver a ele
+            await engine.dispose()
+            await close_redis()
+
+    asyncio.run(_run())
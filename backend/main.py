@@ -1,28 +1,84 @@
+import asyncio
+import signal
+import threading
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from contextlib import asynccontextmanager
 
 from app.core.config import settings
-from app.core.database import engine, Base
+from app.core.database import AsyncSessionLocal, dispose_engines, engine
+from app.core.schema import prepare_schema
 
 # Importa todos os models para que o SQLAlchemy possa configurar os mappers
 import app.models.user       # noqa: F401
 import app.models.group      # noqa: F401
 import app.models.location   # noqa: F401
 import app.models.message    # noqa: F401
+import app.models.device     # noqa: F401
+
+from app.api.v1 import auth, devices, groups, locations, messages, sos
+from app.core.redis_client import get_redis
+from app.services import location_stats, media, sessions, sos as sos_service
+from app.services.presence import presence
+
+
+async def drain_websockets() -> None:
+    """Pede aos clientes que reconectem (com jitter) e fecha os sockets deste worker."""
+    await asyncio.gather(*(
+        manager.drain(settings.WS_RECONNECT_BASE_MS, settings.WS_RECONNECT_JITTER_MS)
+        for manager in (locations.manager, messages.chat_manager)
+    ))
+
+
+def _drain_on_sigterm() -> None:
+    """
+    O uvicorn fecha os WebSockets (1012, sem atraso sugerido) antes do shutdown
+    do lifespan — tarde demais para espalhar as reconexões. Encadeia o handler
+    de SIGTERM: primeiro o drain, depois o handler original do servidor.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return  # signal.signal só funciona na thread principal (ex.: TestClient)
+    previous = signal.getsignal(signal.SIGTERM)
+    if not callable(previous):
+        return
+    loop = asyncio.get_running_loop()
+
+    def handler(sig, frame):
+        signal.signal(sig, previous)  # um segundo SIGTERM não espera o drain
+
+        def start() -> None:
+            task = loop.create_task(drain_websockets())
+            task.add_done_callback(lambda _: previous(sig, frame))
+
+        loop.call_soon_threadsafe(start)
 
-from app.api.v1 import auth, groups, locations, messages, sos
+    signal.signal(signal.SIGTERM, handler)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    await prepare_schema(engine)
+    sos_workers = await sos_service.start_workers(locations.manager) if settings.SOS_WORKERS_ENABLED else []
+    revocations_task = asyncio.create_task(sessions.revocations.listen(await get_redis()))
+    presence_task = asyncio.create_task(presence.run(AsyncSessionLocal))
+    stats_task = asyncio.create_task(location_stats.run(AsyncSessionLocal))
+    _drain_on_sigterm()
     yield
     # Shutdown
-    await engine.dispose()
+    await drain_websockets()
+    revocations_task.cancel()
+    presence_task.cancel()
+    stats_task.cancel()
+    await sos_service.stop_workers(sos_workers)
+    await locations.sampling.close()
+    await locations.writer.close()
+    await presence.flush(AsyncSessionLocal)
+    await location_stats.rollup(await get_redis(), AsyncSessionLocal)
+    media.shutdown_pool()
+    await dispose_engines()
 
 
 app = FastAPI(
@@ -48,6 +104,7 @@ app.include_router(groups.router,    prefix=f"{settings.API_V1_STR}/groups",
 app.include_router(locations.router, prefix=f"{settings.API_V1_STR}/locations", tags=["locations"])
 app.include_router(messages.router,  prefix=f"{settings.API_V1_STR}/messages",  tags=["messages"])
 app.include_router(sos.router,       prefix=f"{settings.API_V1_STR}/sos",       tags=["sos"])
+app.include_router(devices.router,   prefix=f"{settings.API_V1_STR}/devices",   tags=["devices"])
 
 
 @app.get("/health")
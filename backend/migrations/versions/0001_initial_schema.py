@@ -0,0 +1,137 @@
+"""initial schema
+
+Exatamente o schema que o create_all do startup criava antes do Alembic.
+Bancos já existentes não rodam esta revisão: `alembic stamp 0001` e depois
+`alembic upgrade head` (ver docs/backend.md).
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-19 03:10:10.539231
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('groups',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('avatar_url', sa.Text(), nullable=True),
+    sa.Column('invite_code', sa.String(length=12), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_groups_invite_code'), 'groups', ['invite_code'], unique=True)
+    op.create_table('users',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('email', sa.String(length=255), nullable=False),
+    sa.Column('name', sa.String(length=255), nullable=False),
+    sa.Column('avatar_url', sa.Text(), nullable=True),
+    sa.Column('phone', sa.String(length=20), nullable=True),
+    sa.Column('hashed_password', sa.String(length=255), nullable=True),
+    sa.Column('google_id', sa.String(length=255), nullable=True),
+    sa.Column('facebook_id', sa.String(length=255), nullable=True),
+    sa.Column('apple_id', sa.String(length=255), nullable=True),
+    sa.Column('microsoft_id', sa.String(length=255), nullable=True),
+    sa.Column('aws_cognito_id', sa.String(length=255), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('is_verified', sa.Boolean(), nullable=True),
+    sa.Column('last_seen_at', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('apple_id'),
+    sa.UniqueConstraint('aws_cognito_id'),
+    sa.UniqueConstraint('facebook_id'),
+    sa.UniqueConstraint('google_id'),
+    sa.UniqueConstraint('microsoft_id')
+    )
+    op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True)
+    op.create_table('geofences',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('group_id', sa.UUID(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('latitude', sa.Float(), nullable=False),
+    sa.Column('longitude', sa.Float(), nullable=False),
+    sa.Column('radius_meters', sa.Integer(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['group_id'], ['groups.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('group_members',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('group_id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('role', sa.Enum('admin', 'member', name='grouprole'), nullable=True),
+    sa.Column('joined_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['group_id'], ['groups.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('locations',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('latitude', sa.Float(), nullable=False),
+    sa.Column('longitude', sa.Float(), nullable=False),
+    sa.Column('accuracy', sa.Float(), nullable=True),
+    sa.Column('speed', sa.Float(), nullable=True),
+    sa.Column('heading', sa.Float(), nullable=True),
+    sa.Column('altitude', sa.Float(), nullable=True),
+    sa.Column('address', sa.String(length=500), nullable=True),
+    sa.Column('recorded_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_locations_recorded_at'), 'locations', ['recorded_at'], unique=False)
+    op.create_table('messages',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('group_id', sa.UUID(), nullable=False),
+    sa.Column('sender_id', sa.UUID(), nullable=False),
+    sa.Column('type', sa.Enum('text', 'image', 'video', 'sos', 'system', name='messagetype'), nullable=True),
+    sa.Column('content', sa.Text(), nullable=True),
+    sa.Column('media_key', sa.String(length=500), nullable=True),
+    sa.Column('is_deleted', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['group_id'], ['groups.id'], ),
+    sa.ForeignKeyConstraint(['sender_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_messages_created_at'), 'messages', ['created_at'], unique=False)
+    op.create_table('sos_events',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('latitude', sa.Float(), nullable=False),
+    sa.Column('longitude', sa.Float(), nullable=False),
+    sa.Column('message', sa.Text(), nullable=True),
+    sa.Column('resolved', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('sos_events')
+    op.drop_index(op.f('ix_messages_created_at'), table_name='messages')
+    op.drop_table('messages')
+    op.drop_index(op.f('ix_locations_recorded_at'), table_name='locations')
+    op.drop_table('locations')
+    op.drop_table('group_members')
+    op.drop_table('geofences')
+    op.drop_index(op.f('ix_users_email'), table_name='users')
+    op.drop_table('users')
+    op.drop_index(op.f('ix_groups_invite_code'), table_name='groups')
+    op.drop_table('groups')
+    sa.Enum(name='messagetype').drop(op.get_bind(), checkfirst=True)
+    sa.Enum(name='grouprole').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,109 @@
+"""performance indexes, device tokens, SOS por grupo e mídia processada
+
+Tudo o que mudou nos models desde o schema inicial (0001):
+  - locations (user_id, recorded_at)            — histórico por usuário
+  - group_members UNIQUE (group_id, user_id)    — filiação única / membros do grupo
+  - group_members (user_id)                     — grupos do usuário
+  - messages (group_id, created_at, id)         — paginação keyset do chat
+  - sos_events.group_id + (group_id, created_at) — SOS por grupo e seu histórico
+  - messages.thumbnail_key / poster_key         — derivados do processamento de mídia
+  - device_tokens                               — tokens FCM por aparelho
+
+Dados existentes:
+  - group_members duplicados (joins concorrentes antes da constraint) são
+    removidos antes do UNIQUE; fica a filiação de admin, senão a mais antiga.
+  - sos_events antigos recebem o grupo mais antigo do usuário; SOS de quem não
+    está em nenhum grupo não tem para quem ser exibido e é removido.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 09:12:40.118532
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('device_tokens',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('device_id', sa.String(length=128), nullable=False),
+    sa.Column('token', sa.String(length=512), nullable=False),
+    sa.Column('platform', sa.String(length=10), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('token'),
+    sa.UniqueConstraint('user_id', 'device_id', name='uq_device_tokens_user_device')
+    )
+    op.create_index(op.f('ix_device_tokens_user_id'), 'device_tokens', ['user_id'], unique=False)
+
+    # Deduplica antes da constraint: o CREATE UNIQUE falharia com os duplicados
+    op.execute(
+        """
+        DELETE FROM group_members WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY group_id, user_id
+                    ORDER BY CASE WHEN role = 'admin' THEN 0 ELSE 1 END, joined_at, id
+                ) AS rn
+                FROM group_members
+            ) ranked
+            WHERE rn > 1
+        )
+        """
+    )
+    with op.batch_alter_table('group_members') as batch_op:
+        batch_op.create_unique_constraint('uq_group_members_group_user', ['group_id', 'user_id'])
+    op.create_index('ix_group_members_user_id', 'group_members', ['user_id'], unique=False)
+
+    op.create_index('ix_locations_user_recorded', 'locations', ['user_id', 'recorded_at'], unique=False)
+
+    op.add_column('messages', sa.Column('thumbnail_key', sa.String(length=500), nullable=True))
+    op.add_column('messages', sa.Column('poster_key', sa.String(length=500), nullable=True))
+    op.create_index('ix_messages_group_created_id', 'messages', ['group_id', 'created_at', 'id'], unique=False)
+
+    op.add_column('sos_events', sa.Column('group_id', sa.UUID(), nullable=True))
+    op.execute(
+        """
+        UPDATE sos_events SET group_id = (
+            SELECT gm.group_id FROM group_members gm
+            WHERE gm.user_id = sos_events.user_id
+            ORDER BY gm.joined_at, gm.id
+            LIMIT 1
+        )
+        """
+    )
+    op.execute("DELETE FROM sos_events WHERE group_id IS NULL")
+    with op.batch_alter_table('sos_events') as batch_op:
+        batch_op.alter_column('group_id', existing_type=sa.UUID(), nullable=False)
+        batch_op.create_foreign_key('sos_events_group_id_fkey', 'groups', ['group_id'], ['id'])
+    op.create_index('ix_sos_events_group_created', 'sos_events', ['group_id', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_sos_events_group_created', table_name='sos_events')
+    with op.batch_alter_table('sos_events') as batch_op:
+        batch_op.drop_constraint('sos_events_group_id_fkey', type_='foreignkey')
+        batch_op.drop_column('group_id')
+
+    op.drop_index('ix_messages_group_created_id', table_name='messages')
+    op.drop_column('messages', 'poster_key')
+    op.drop_column('messages', 'thumbnail_key')
+
+    op.drop_index('ix_locations_user_recorded', table_name='locations')
+
+    op.drop_index('ix_group_members_user_id', table_name='group_members')
+    with op.batch_alter_table('group_members') as batch_op:
+        batch_op.drop_constraint('uq_group_members_group_user', type_='unique')
+
+    op.drop_index(op.f('ix_device_tokens_user_id'), table_name='device_tokens')
+    op.drop_table('device_tokens')
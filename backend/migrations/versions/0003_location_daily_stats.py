@@ -0,0 +1,37 @@
+"""location_daily_stats: agregados diários de deslocamento por usuário
+
+Tabela do rollup de app/services/location_stats.py (distância, tempo em
+movimento/parado, velocidade máxima e posições por usuário e dia UTC).
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 16:40:12.504118
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('location_daily_stats',
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('distance_m', sa.Float(), nullable=False),
+    sa.Column('moving_seconds', sa.Float(), nullable=False),
+    sa.Column('stopped_seconds', sa.Float(), nullable=False),
+    sa.Column('max_speed', sa.Float(), nullable=False),
+    sa.Column('points', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'day')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('location_daily_stats')
@@ -4,23 +4,33 @@ Fixtures compartilhadas para os testes do backend.
 Estratégia:
   - Banco: SQLite in-memory via aiosqlite (novo banco por teste — isolamento total)
   - Redis: FakeRedis (dict em memória, sem TTL real)
+  - S3: FakeS3 (objetos e uploads multipart em memória)
   - API: httpx.AsyncClient com ASGITransport (sem servidor HTTP real)
   - Override de dependências: get_db e get_redis são substituídos via
     dependency_overrides e unittest.mock.patch
 """
+import copy
+import io
+import threading
+import time
 from unittest.mock import patch
 
 import pytest
 from httpx import AsyncClient, ASGITransport
+from redis.exceptions import WatchError
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 # Garante que todos os models estão registrados no metadata
+import app.models.device    # noqa: F401
 import app.models.group     # noqa: F401
 import app.models.location  # noqa: F401
 import app.models.message   # noqa: F401
 import app.models.user      # noqa: F401
-from app.core.database import Base, get_db
+from app.api.dependencies import get_rate_limiter
+from app.core.database import Base, get_db, get_read_db
+from app.core.rate_limit import MemorySlidingWindow
+from app.services.sessions import RevocationCache
 from main import app
 
 TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
@@ -31,12 +41,23 @@ TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
 class FakeRedis:
     """
     Substituto em memória do Redis para testes.
-    Implementa os métodos usados pela aplicação: exists, setex, get, set.
+    Implementa os métodos usados pela aplicação: strings (exists, setex, get,
+    mget, set, delete, rename, incr), listas (lpushx, rpush, ltrim, lrange,
+    lindex), hashes (hset, hgetall, hmget, hexists, hdel), sets (sadd, srem,
+    smembers), sorted sets (zadd, zrem, zcount, zrange, zrangebyscore,
+    zrevrangebyscore, zremrangebyscore, zremrangebyrank), publish (só
+    registra), streams com
+    consumer groups (xadd, xrange, xrevrange, xread, xgroup_create,
+    xreadgroup, xack, xautoclaim, xpending_range) e pipeline (MULTI/EXEC,
+    WATCH).
     Não implementa TTL real — chaves nunca expiram durante o teste.
     """
 
     def __init__(self) -> None:
-        self._store: dict[str, str] = {}
+        self._store: dict[str, str | list[str]] = {}
+        self._stream_groups: dict[str, dict[str, dict]] = {}
+        self._stream_seq = 0
+        self.published: list[tuple[str, str]] = []
 
     async def exists(self, key: str) -> int:
         return 1 if key in self._store else 0
@@ -47,11 +68,340 @@ class FakeRedis:
     async def get(self, key: str) -> str | None:
         return self._store.get(key)
 
-    async def set(self, key: str, value: str, ex: int | None = None) -> None:
+    async def mget(self, keys: list[str]) -> list[str | None]:
+        return [self._store.get(key) for key in keys]
+
+    async def set(self, key: str, value: str, ex: int | None = None, nx: bool = False,
+                  xx: bool = False, get: bool = False) -> bool | str | None:
+        previous = self._store.get(key)
+        if (nx and key in self._store) or (xx and key not in self._store):
+            return previous if get else None
         self._store[key] = value
+        return previous if get else True
+
+    async def delete(self, *keys: str) -> int:
+        return sum(self._store.pop(key, None) is not None for key in keys)
+
+    async def expire(self, key: str, ttl: int) -> bool:
+        return key in self._store
+
+    async def rename(self, src: str, dst: str) -> bool:
+        self._store[dst] = self._store.pop(src)
+        return True
+
+    async def incr(self, key: str) -> int:
+        self._store[key] = str(int(self._store.get(key, 0)) + 1)
+        return int(self._store[key])
+
+    # ── Listas ──
+
+    async def lpushx(self, key: str, *values: str) -> int:
+        if key not in self._store:
+            return 0
+        for value in values:
+            self._store[key].insert(0, value)
+        return len(self._store[key])
+
+    async def lindex(self, key: str, index: int) -> str | None:
+        items = self._store.get(key, [])
+        return items[index] if -len(items) <= index < len(items) else None
+
+    async def rpush(self, key: str, *values: str) -> int:
+        self._store.setdefault(key, []).extend(values)
+        return len(self._store[key])
+
+    async def ltrim(self, key: str, start: int, end: int) -> None:
+        if key in self._store:
+            self._store[key] = self._store[key][start:end + 1 if end != -1 else None]
+
+    async def lrange(self, key: str, start: int, end: int) -> list[str]:
+        return list(self._store.get(key, [])[start:end + 1 if end != -1 else None])
+
+    # ── Hashes ──
+
+    async def hset(self, key: str, field: str | None = None, value: str | None = None,
+                   mapping: dict | None = None) -> int:
+        hash_ = self._store.setdefault(key, {})
+        items = dict(mapping or {})
+        if field is not None:
+            items[field] = value
+        new = sum(f not in hash_ for f in items)
+        hash_.update({f: str(v) for f, v in items.items()})
+        return new
+
+    async def hgetall(self, key: str) -> dict[str, str]:
+        return dict(self._store.get(key, {}))
+
+    async def hmget(self, key: str, fields: list[str]) -> list[str | None]:
+        hash_ = self._store.get(key, {})
+        return [hash_.get(f) for f in fields]
+
+    async def hexists(self, key: str, field: str) -> bool:
+        return field in self._store.get(key, {})
+
+    async def hdel(self, key: str, *fields: str) -> int:
+        hash_ = self._store.get(key, {})
+        return sum(hash_.pop(f, None) is not None for f in fields)
+
+    # ── Sets e pub/sub ──
+
+    async def sadd(self, key: str, *members: str) -> int:
+        set_ = self._store.setdefault(key, set())
+        new = len(set(members) - set_)
+        set_.update(members)
+        return new
+
+    async def srem(self, key: str, *members: str) -> int:
+        set_ = self._store.get(key, set())
+        removed = len(set(members) & set_)
+        set_.difference_update(members)
+        return removed
+
+    async def smembers(self, key: str) -> "set[str]":
+        return set(self._store.get(key, set()))
+
+    # ── Sorted sets ──
+
+    async def zadd(self, key: str, mapping: dict) -> int:
+        zset = self._store.setdefault(key, {})
+        new = sum(m not in zset for m in mapping)
+        zset.update({m: float(score) for m, score in mapping.items()})
+        return new
+
+    async def zrem(self, key: str, *members: str) -> int:
+        zset = self._store.get(key, {})
+        return sum(zset.pop(m, None) is not None for m in members)
+
+    async def zcount(self, key: str, min, max) -> int:
+        return sum(float(min) <= score <= float(max) for score in self._store.get(key, {}).values())
+
+    async def zrangebyscore(self, key: str, min, max) -> list[str]:
+        zset = self._store.get(key, {})
+        return [m for m, score in sorted(zset.items(), key=lambda i: i[1]) if float(min) <= score <= float(max)]
+
+    async def zrange(self, key: str, start: int, end: int, withscores: bool = False) -> list:
+        items = sorted(self._store.get(key, {}).items(), key=lambda i: i[1])
+        items = items[start:end + 1 if end != -1 else None]
+        return items if withscores else [m for m, _ in items]
+
+    async def zrevrangebyscore(self, key: str, max, min, start: int | None = None,
+                               num: int | None = None) -> list[str]:
+        members = list(reversed(await self.zrangebyscore(key, min, max)))
+        if start is not None:
+            members = members[start:start + num if num is not None else None]
+        return members
+
+    async def zremrangebyrank(self, key: str, start: int, end: int) -> int:
+        zset = self._store.get(key, {})
+        ordered = [m for m, _ in sorted(zset.items(), key=lambda i: i[1])]
+        doomed = ordered[start:end + 1 if end != -1 else None]
+        for m in doomed:
+            del zset[m]
+        return len(doomed)
+
+    async def zremrangebyscore(self, key: str, min, max) -> int:
+        zset = self._store.get(key, {})
+        doomed = [m for m, score in zset.items() if float(min) <= score <= float(max)]
+        for m in doomed:
+            del zset[m]
+        return len(doomed)
+
+    async def publish(self, channel: str, message: str) -> int:
+        self.published.append((channel, message))
+        return 0
+
+    # ── Streams ──
+
+    @staticmethod
+    def _sid(entry_id: str) -> tuple[int, int]:
+        ms, _, seq = entry_id.partition("-")
+        return int(ms), int(seq or 0)
+
+    async def xadd(self, name: str, fields: dict, id: str = "*", maxlen: int | None = None,
+                   approximate: bool = True) -> str:
+        self._stream_seq += 1
+        entry_id = f"{self._stream_seq}-0"
+        stream = self._store.setdefault(name, [])
+        stream.append((entry_id, {k: str(v) for k, v in fields.items()}))
+        if maxlen is not None:
+            del stream[:-maxlen]
+        return entry_id
+
+    async def xrange(self, name: str, min: str = "-", max: str = "+", count: int | None = None) -> list:
+        return list(self._store.get(name, []))[:count]
+
+    async def xrevrange(self, name: str, max: str = "+", min: str = "-", count: int | None = None) -> list:
+        return list(reversed(self._store.get(name, [])))[:count]
+
+    async def xread(self, streams: dict, count: int | None = None, block: int | None = None) -> list:
+        response = []
+        for name, last_id in streams.items():
+            if last_id == "$":
+                continue
+            entries = [e for e in self._store.get(name, []) if self._sid(e[0]) > self._sid(last_id)][:count]
+            if entries:
+                response.append([name, entries])
+        return response
+
+    async def xgroup_create(self, name: str, groupname: str, id: str = "$", mkstream: bool = False) -> bool:
+        from redis.exceptions import ResponseError
+        groups = self._stream_groups.setdefault(name, {})
+        if groupname in groups:
+            raise ResponseError("BUSYGROUP Consumer Group name already exists")
+        stream = self._store.setdefault(name, [])
+        last = (stream[-1][0] if stream else "0-0") if id == "$" else id
+        groups[groupname] = {"last": last, "pending": {}}
+        return True
+
+    async def xreadgroup(self, groupname: str, consumername: str, streams: dict,
+                         count: int | None = None, block: int | None = None) -> list:
+        response = []
+        for name in streams:
+            group = self._stream_groups[name][groupname]
+            entries = [e for e in self._store.get(name, [])
+                       if self._sid(e[0]) > self._sid(group["last"])][:count]
+            for entry_id, _ in entries:
+                group["pending"][entry_id] = (consumername, time.monotonic(), 1)
+            if entries:
+                group["last"] = entries[-1][0]
+                response.append([name, entries])
+        return response
+
+    async def xack(self, name: str, groupname: str, *ids: str) -> int:
+        pending = self._stream_groups[name][groupname]["pending"]
+        return sum(pending.pop(i, None) is not None for i in ids)
+
+    async def xautoclaim(self, name: str, groupname: str, consumername: str, min_idle_time: int,
+                         start_id: str = "0-0", count: int | None = None) -> list:
+        pending = self._stream_groups[name][groupname]["pending"]
+        now = time.monotonic()
+        entries = dict(self._store.get(name, []))
+        claimed = []
+        for entry_id, (_, since, deliveries) in sorted(pending.items(), key=lambda p: self._sid(p[0])):
+            if (now - since) * 1000 >= min_idle_time and entry_id in entries:
+                pending[entry_id] = (consumername, now, deliveries + 1)
+                claimed.append((entry_id, entries[entry_id]))
+                if count is not None and len(claimed) == count:
+                    break
+        return ["0-0", claimed, []]
+
+    async def xpending_range(self, name: str, groupname: str, min: str, max: str, count: int,
+                             consumername: str | None = None) -> list:
+        pending = self._stream_groups[name][groupname]["pending"]
+        now = time.monotonic()
+        return [
+            {"message_id": entry_id, "consumer": consumer,
+             "time_since_delivered": int((now - since) * 1000), "times_delivered": deliveries}
+            for entry_id, (consumer, since, deliveries) in sorted(pending.items(), key=lambda p: self._sid(p[0]))
+            if self._sid(min) <= self._sid(entry_id) <= self._sid(max)
+            and consumername in (None, consumer)
+        ][:count]
+
+    def pipeline(self, transaction: bool = True) -> "FakePipeline":
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """
+    Enfileira os comandos e os executa em sequência no execute().
+    Depois de watch(), os comandos rodam na hora até multi(), como no
+    redis-py; execute() levanta WatchError se uma chave observada mudou.
+    """
+
+    def __init__(self, redis: FakeRedis) -> None:
+        self._redis = redis
+        self._commands: list = []
+        self._watched: dict | None = None
+        self._immediate = False
+
+    async def __aenter__(self) -> "FakePipeline":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._commands.clear()
+        self._watched, self._immediate = None, False
+
+    async def watch(self, *keys: str) -> None:
+        self._watched = {key: copy.deepcopy(self._redis._store.get(key)) for key in keys}
+        self._immediate = True
+
+    def multi(self) -> None:
+        self._immediate = False
+
+    def __getattr__(self, name: str):
+        if self._immediate:
+            return getattr(self._redis, name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((name, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self) -> list:
+        commands, self._commands = self._commands, []
+        watched, self._watched = self._watched, None
+        if watched and any(self._redis._store.get(key) != value for key, value in watched.items()):
+            raise WatchError("chave observada alterada")
+        return [await getattr(self._redis, name)(*args, **kwargs) for name, args, kwargs in commands]
 
-    async def delete(self, key: str) -> None:
-        self._store.pop(key, None)
+
+# ── Fake S3 ───────────────────────────────────────────────────────────────────
+
+class FakeS3:
+    """
+    Substituto em memória do cliente boto3 S3 (API síncrona, como o boto3).
+    Registra o pico de partes enviadas em paralelo para testar a concorrência.
+    """
+
+    def __init__(self, part_delay: float = 0.0) -> None:
+        self.objects: dict[str, bytes] = {}
+        self.uploads: dict[str, dict[int, bytes]] = {}
+        self.aborted: list[str] = []
+        self.part_delay = part_delay
+        self.max_parallel_parts = 0
+        self._parallel = 0
+        self._lock = threading.Lock()
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes, **kwargs) -> dict:
+        self.objects[Key] = bytes(Body)
+        return {"ETag": f'"{len(Body)}"'}
+
+    def get_object(self, Bucket: str, Key: str, **kwargs) -> dict:
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+    def create_multipart_upload(self, Bucket: str, Key: str, **kwargs) -> dict:
+        upload_id = f"up-{len(self.uploads) + 1}"
+        self.uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket: str, Key: str, UploadId: str, PartNumber: int, Body: bytes) -> dict:
+        with self._lock:
+            self._parallel += 1
+            self.max_parallel_parts = max(self.max_parallel_parts, self._parallel)
+        try:
+            time.sleep(self.part_delay)
+            self.uploads[UploadId][PartNumber] = bytes(Body)
+            return {"ETag": f'"{UploadId}-{PartNumber}"'}
+        finally:
+            with self._lock:
+                self._parallel -= 1
+
+    def complete_multipart_upload(self, Bucket: str, Key: str, UploadId: str, MultipartUpload: dict) -> dict:
+        parts = self.uploads.pop(UploadId)
+        numbers = [p["PartNumber"] for p in MultipartUpload["Parts"]]
+        self.objects[Key] = b"".join(parts[n] for n in numbers)
+        return {}
+
+    def abort_multipart_upload(self, Bucket: str, Key: str, UploadId: str) -> dict:
+        self.uploads.pop(UploadId, None)
+        self.aborted.append(UploadId)
+        return {}
+
+    def generate_presigned_url(self, method: str, Params: dict, ExpiresIn: int) -> str:
+        return f"https://s3.test/{Params['Key']}?X-Amz-Expires={ExpiresIn}"
+
+    def generate_presigned_post(self, Bucket: str, Key: str, Fields: dict, Conditions: list, ExpiresIn: int) -> dict:
+        return {"url": "https://s3.test/", "fields": {"key": Key, **Fields}, "conditions": Conditions}
 
 
 # ── Fixtures de banco de dados ────────────────────────────────────────────────
@@ -84,6 +434,16 @@ def fake_redis() -> FakeRedis:
     return FakeRedis()
 
 
+# ── Fixture de S3 ─────────────────────────────────────────────────────────────
+
+@pytest.fixture
+def fake_s3():
+    """FakeS3 instalado no lugar do cliente boto3 durante o teste."""
+    s3 = FakeS3()
+    with patch("app.core.storage.get_s3", return_value=s3):
+        yield s3
+
+
 # ── Fixture do cliente HTTP ───────────────────────────────────────────────────
 
 @pytest.fixture
@@ -92,8 +452,10 @@ async def client(db_session: AsyncSession, fake_redis: FakeRedis):
     AsyncClient configurado para chamar o app FastAPI diretamente.
 
     Overrides aplicados:
-      - get_db  → session SQLite in-memory
+      - get_db, get_read_db → session SQLite in-memory (sem réplica)
+      - get_rate_limiter → MemorySlidingWindow (o FakeRedis não roda Lua)
       - get_redis → FakeRedis (patch nos módulos que importam a função)
+      - sessions.revocations → cache de revogações novo por teste
     """
 
     async def override_get_db():
@@ -108,11 +470,20 @@ async def client(db_session: AsyncSession, fake_redis: FakeRedis):
         return fake_redis
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    rate_limiter = MemorySlidingWindow()
+    app.dependency_overrides[get_rate_limiter] = lambda: rate_limiter
 
     with (
         patch("app.api.v1.auth.get_redis", new=override_get_redis),
         patch("app.api.dependencies.get_redis", new=override_get_redis),
         patch("app.api.v1.locations.get_redis", new=override_get_redis),
+        patch("app.api.v1.messages.get_redis", new=override_get_redis),
+        patch("app.api.v1.groups.get_redis", new=override_get_redis),
+        patch("app.api.v1.sos.get_redis", new=override_get_redis),
+        patch("app.api.v1.devices.get_redis", new=override_get_redis),
+        patch("app.services.location_writer.get_redis", new=override_get_redis),
+        patch("app.services.sessions.revocations", new=RevocationCache()),
     ):
         async with AsyncClient(
             transport=ASGITransport(app=app),
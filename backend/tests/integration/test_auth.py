@@ -9,14 +9,21 @@ Endpoints cobertos:
   POST /login       — login correto, senha errada, usuário inexistente
   GET  /me          — autenticado, sem token, token inválido
   POST /logout      — status 204, token blacklistado
-  POST /refresh     — novo par de tokens
+  POST /refresh     — novo par de tokens, rotação com detecção de reuso
+  POST /logout-all  — encerra todas as sessões do usuário
+  Rate limiting     — 429 por e-mail e por IP em /login e /register
 """
+from unittest.mock import patch
+
 import pytest
 
+from app.core.security import create_refresh_token
+
 REGISTER = "/api/v1/auth/register"
 LOGIN    = "/api/v1/auth/login"
 ME       = "/api/v1/auth/me"
 LOGOUT   = "/api/v1/auth/logout"
+LOGOUT_ALL = "/api/v1/auth/logout-all"
 REFRESH  = "/api/v1/auth/refresh"
 
 USER = {
@@ -109,6 +116,37 @@ class TestLogin:
         assert r.status_code == 200
 
 
+class TestAuthRateLimit:
+    async def test_login_bloqueia_o_email_apos_o_limite(self, client):
+        await _register(client)
+        with patch("app.api.dependencies.settings.AUTH_RATE_LIMIT_PER_EMAIL", 3):
+            for _ in range(3):
+                r = await client.post(LOGIN, data={"username": USER["email"], "password": "errada"})
+                assert r.status_code == 401
+
+            # Nem a senha certa passa enquanto a janela não libera
+            r = await client.post(LOGIN, data={"username": USER["email"], "password": USER["password"]})
+            assert r.status_code == 429
+            assert int(r.headers["Retry-After"]) > 0
+
+            # Outro e-mail, mesmo IP: abaixo do limite por IP
+            r = await client.post(LOGIN, data={"username": "Outro@X.com", "password": "qualquer"})
+            assert r.status_code == 401
+
+    async def test_email_normalizado(self, client):
+        with patch("app.api.dependencies.settings.AUTH_RATE_LIMIT_PER_EMAIL", 1):
+            await client.post(LOGIN, data={"username": "ana@x.com", "password": "x"})
+            r = await client.post(LOGIN, data={"username": " ANA@x.com", "password": "x"})
+        assert r.status_code == 429
+
+    async def test_register_limitado_por_ip(self, client):
+        with patch("app.api.dependencies.settings.AUTH_RATE_LIMIT_PER_IP", 2):
+            for i in range(2):
+                await _register(client, {**USER, "email": f"u{i}@example.com"})
+            r = await client.post(REGISTER, json={**USER, "email": "u3@example.com"})
+        assert r.status_code == 429
+
+
 # ── GET /me ───────────────────────────────────────────────────────────────────
 
 class TestMe:
@@ -195,3 +233,67 @@ class TestRefresh:
     async def test_refresh_token_invalido_retorna_401(self, client):
         r = await client.post(REFRESH, json={"refresh_token": "token.invalido"})
         assert r.status_code == 401
+
+    async def test_refresh_token_e_de_uso_unico(self, client):
+        data = await _register(client)
+        r = await client.post(REFRESH, json={"refresh_token": data["refresh_token"]})
+        rotated = r.json()["refresh_token"]
+        assert rotated != data["refresh_token"]
+
+        r = await client.post(REFRESH, json={"refresh_token": rotated})
+        assert r.status_code == 200
+
+    async def test_reuso_encerra_a_sessao(self, client):
+        data = await _register(client)
+        r = await client.post(REFRESH, json={"refresh_token": data["refresh_token"]})
+        rotated = r.json()["refresh_token"]
+
+        # O token antigo reaparece (vazado): a família inteira é encerrada
+        r = await client.post(REFRESH, json={"refresh_token": data["refresh_token"]})
+        assert r.status_code == 401
+        r = await client.post(REFRESH, json={"refresh_token": rotated})
+        assert r.status_code == 401
+
+    async def test_refresh_sem_sessao_retorna_401(self, client):
+        data = await _register(client)
+        legacy = create_refresh_token({"sub": data["user"]["id"]})
+        r = await client.post(REFRESH, json={"refresh_token": legacy})
+        assert r.status_code == 401
+
+    async def test_logout_encerra_o_refresh_do_dispositivo(self, client):
+        data = await _register(client)
+        await client.post(LOGOUT, headers={"Authorization": f"Bearer {data['access_token']}"})
+        r = await client.post(REFRESH, json={"refresh_token": data["refresh_token"]})
+        assert r.status_code == 401
+
+
+# ── POST /logout-all ──────────────────────────────────────────────────────────
+
+class TestLogoutAll:
+    async def test_encerra_todas_as_sessoes(self, client):
+        celular = await _register(client)
+        notebook = await _login(client)
+
+        r = await client.post(LOGOUT_ALL, headers={"Authorization": f"Bearer {celular['access_token']}"})
+        assert r.status_code == 204
+
+        for session in (celular, notebook):
+            r = await client.get(ME, headers={"Authorization": f"Bearer {session['access_token']}"})
+            assert r.status_code == 401
+            r = await client.post(REFRESH, json={"refresh_token": session["refresh_token"]})
+            assert r.status_code == 401
+
+    async def test_novo_login_continua_valendo(self, client):
+        data = await _register(client)
+        await client.post(LOGOUT_ALL, headers={"Authorization": f"Bearer {data['access_token']}"})
+
+        fresh = await _login(client)
+        r = await client.get(ME, headers={"Authorization": f"Bearer {fresh['access_token']}"})
+        assert r.status_code == 200
+
+    async def test_publica_a_revogacao_para_os_outros_workers(self, client, fake_redis):
+        data = await _register(client)
+        await client.post(LOGOUT_ALL, headers={"Authorization": f"Bearer {data['access_token']}"})
+
+        assert [channel for channel, _ in fake_redis.published] == ["auth:revocations"]
+        assert data["user"]["id"] in await fake_redis.hgetall("auth:revoked_before")
@@ -0,0 +1,139 @@
+"""
+Testes de integração do cadastro de tokens de push (/api/v1/devices/*).
+
+Endpoints cobertos:
+  POST   /devices/             — cadastra/atualiza o token do dispositivo
+  DELETE /devices/{device_id}  — remove o token
+
+Também cobre o cache de tokens por grupo (push:tokens:{group_id}) usado pelo SOS.
+"""
+import uuid
+from unittest.mock import patch
+
+from app.services import devices
+
+DEVICES = "/api/v1/devices/"
+
+
+def _auth(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def _register_device(client, token: str, device_id: str, push_token: str):
+    return await client.post(
+        DEVICES,
+        json={"device_id": device_id, "token": push_token, "platform": "android"},
+        headers=_auth(token),
+    )
+
+
+class TestRegisterDevice:
+    async def test_cadastra_token(self, client, group_fixture, db_session, fake_redis):
+        token, group = group_fixture
+        r = await _register_device(client, token, "celular", "fcm-1")
+        assert r.status_code == 200, r.text
+        assert r.json() == {"device_id": "celular", "platform": "android"}
+
+        tokens = await devices.group_tokens(db_session, fake_redis, uuid.UUID(group["id"]))
+        assert tokens == ["fcm-1"]
+
+    async def test_recadastro_substitui_token_do_dispositivo(self, client, group_fixture, db_session, fake_redis):
+        token, group = group_fixture
+        await _register_device(client, token, "celular", "fcm-antigo")
+        await devices.group_tokens(db_session, fake_redis, uuid.UUID(group["id"]))   # aquece o cache
+
+        await _register_device(client, token, "celular", "fcm-novo")
+
+        tokens = await devices.group_tokens(db_session, fake_redis, uuid.UUID(group["id"]))
+        assert tokens == ["fcm-novo"]
+
+    async def test_token_muda_de_dono(self, client, member_fixture, db_session, fake_redis):
+        token_admin, token_member, group = member_fixture
+        await _register_device(client, token_admin, "tablet", "fcm-compartilhado")
+        await _register_device(client, token_member, "tablet", "fcm-compartilhado")
+
+        group_id = uuid.UUID(group["id"])
+        admin_tokens = await devices.group_tokens(db_session, fake_redis, group_id)
+        assert admin_tokens == ["fcm-compartilhado"]
+
+        r = await client.get("/api/v1/auth/me", headers=_auth(token_member))
+        member_id = uuid.UUID(r.json()["id"])
+        assert await devices.group_tokens(db_session, fake_redis, group_id, exclude_user_id=member_id) == []
+
+    async def test_sem_auth_retorna_401(self, client):
+        r = await client.post(DEVICES, json={"device_id": "x", "token": "y"})
+        assert r.status_code == 401
+
+
+class TestUnregisterDevice:
+    async def test_remove_token(self, client, group_fixture, db_session, fake_redis):
+        token, group = group_fixture
+        await _register_device(client, token, "celular", "fcm-1")
+        await devices.group_tokens(db_session, fake_redis, uuid.UUID(group["id"]))
+
+        r = await client.delete(f"{DEVICES}celular", headers=_auth(token))
+        assert r.status_code == 204
+        assert await devices.group_tokens(db_session, fake_redis, uuid.UUID(group["id"])) == []
+
+    async def test_inexistente_retorna_404(self, client, group_fixture):
+        token, _ = group_fixture
+        r = await client.delete(f"{DEVICES}nao-existe", headers=_auth(token))
+        assert r.status_code == 404
+
+
+class TestGroupTokenCache:
+    async def test_entrada_no_grupo_invalida_cache(self, client, group_fixture, db_session, fake_redis):
+        token_admin, group = group_fixture
+        group_id = uuid.UUID(group["id"])
+        await _register_device(client, token_admin, "celular", "fcm-admin")
+        assert await devices.group_tokens(db_session, fake_redis, group_id) == ["fcm-admin"]
+
+        r = await client.post(
+            "/api/v1/auth/register",
+            json={"name": "Novo", "email": "novo@group.com", "password": "senha123"},
+        )
+        token_new = r.json()["access_token"]
+        await _register_device(client, token_new, "celular", "fcm-novo")
+        await client.post(
+            "/api/v1/groups/join",
+            json={"invite_code": group["invite_code"]},
+            headers=_auth(token_new),
+        )
+
+        tokens = await devices.group_tokens(db_session, fake_redis, group_id)
+        assert sorted(tokens) == ["fcm-admin", "fcm-novo"]
+
+    async def test_invalidacao_durante_a_query_nao_grava_cache_velho(
+        self, client, group_fixture, db_session, fake_redis,
+    ):
+        token_admin, group = group_fixture
+        group_id = uuid.UUID(group["id"])
+        await _register_device(client, token_admin, "celular", "fcm-admin")
+        execute = db_session.execute
+
+        async def execute_racing_join(*args, **kwargs):
+            result = await execute(*args, **kwargs)
+            # Um join invalida o cache enquanto a query já leu a composição antiga
+            await devices.invalidate_groups(fake_redis, [group_id])
+            return result
+
+        with patch.object(db_session, "execute", execute_racing_join):
+            assert await devices.group_tokens(db_session, fake_redis, group_id) == ["fcm-admin"]
+        assert await fake_redis.hgetall(devices.group_tokens_key(group_id)) == {}
+
+    async def test_grupo_sem_tokens_fica_em_cache(self, group_fixture, db_session, fake_redis):
+        _, group = group_fixture
+        group_id = uuid.UUID(group["id"])
+        assert await devices.group_tokens(db_session, fake_redis, group_id) == []
+        assert await fake_redis.hgetall(devices.group_tokens_key(group_id)) == {"": ""}
+
+    async def test_prune_remove_tokens_invalidos(self, client, group_fixture, db_session, fake_redis):
+        token, group = group_fixture
+        group_id = uuid.UUID(group["id"])
+        await _register_device(client, token, "celular", "fcm-ok")
+        await _register_device(client, token, "tablet", "invalid-1")
+
+        removed = await devices.prune(db_session, fake_redis, ["invalid-1"])
+
+        assert removed == 1
+        assert await devices.group_tokens(db_session, fake_redis, group_id) == ["fcm-ok"]
@@ -6,9 +6,18 @@ Endpoints cobertos:
   GET  /groups/        — listar grupos
   POST /groups/join    — entrar por código de convite
   DELETE /groups/{id}/leave — sair do grupo
+  GET  /groups/{id}/online — membros com heartbeat recente
+
+Também cobre o cache de nomes dos membros (group:roster:{group_id}).
 """
+import uuid
+from unittest.mock import patch
+
 import pytest
 
+from app.services import roster
+from app.services.presence import Presence
+
 REGISTER = "/api/v1/auth/register"
 LOGIN    = "/api/v1/auth/login"
 GROUPS   = "/api/v1/groups/"
@@ -144,3 +153,62 @@ class TestLeaveGroup:
             headers={"Authorization": f"Bearer {token_b}"},
         )
         assert r.status_code == 404
+
+
+class TestOnlineMembers:
+    async def test_online_lista_quem_mandou_heartbeat(self, client, group_fixture, fake_redis):
+        token, group = group_fixture
+        user_id = group["members"][0]["user_id"]
+        await Presence().heartbeat(fake_redis, uuid.UUID(user_id), [group["id"]])
+
+        r = await client.get(f"/api/v1/groups/{group['id']}/online",
+                             headers={"Authorization": f"Bearer {token}"})
+        assert r.status_code == 200
+        assert r.json()["online"] == [user_id]
+
+    async def test_nao_membro_retorna_403(self, client, group_fixture):
+        _, group = group_fixture
+        r = await client.post("/api/v1/auth/register",
+                              json={"name": "Fora", "email": "fora@x.com", "password": "senha123"})
+        r = await client.get(f"/api/v1/groups/{group['id']}/online",
+                             headers={"Authorization": f"Bearer {r.json()['access_token']}"})
+        assert r.status_code == 403
+
+
+# ── Roster (nomes dos membros em cache) ───────────────────────────────────────
+
+class TestRoster:
+    async def test_join_e_leave_invalidam_o_cache(self, client, db_session, fake_redis):
+        token_a = await _register_and_token(client, USER_A)
+        token_b = await _register_and_token(client, USER_B)
+        group = await _create_group(client, token_a)
+        group_id = uuid.UUID(group["id"])
+        assert sorted((await roster.group_roster(db_session, fake_redis, group_id)).values()) == ["Alice"]
+
+        await client.post(JOIN, json={"invite_code": group["invite_code"]},
+                          headers={"Authorization": f"Bearer {token_b}"})
+        assert sorted((await roster.group_roster(db_session, fake_redis, group_id)).values()) == ["Alice", "Bob"]
+
+        await client.delete(f"/api/v1/groups/{group['id']}/leave", headers={"Authorization": f"Bearer {token_a}"})
+        assert sorted((await roster.group_roster(db_session, fake_redis, group_id)).values()) == ["Bob"]
+
+    async def test_invalidacao_durante_a_query_nao_grava_cache_velho(self, group_fixture, db_session, fake_redis):
+        _, group = group_fixture
+        group_id = uuid.UUID(group["id"])
+        execute = db_session.execute
+
+        async def execute_racing_join(*args, **kwargs):
+            result = await execute(*args, **kwargs)
+            await roster.invalidate_groups(fake_redis, [group_id])
+            return result
+
+        with patch.object(db_session, "execute", execute_racing_join):
+            assert len(await roster.group_roster(db_session, fake_redis, group_id)) == 1
+        assert await fake_redis.hgetall(roster.roster_key(group_id)) == {}
+
+    async def test_leitura_em_cache_nao_consulta_o_banco(self, group_fixture, db_session, fake_redis):
+        _, group = group_fixture
+        group_id = uuid.UUID(group["id"])
+        first = await roster.group_roster(db_session, fake_redis, group_id)
+        await fake_redis.hset(roster.roster_key(group_id), "sentinela", "Cache")
+        assert await roster.group_roster(db_session, fake_redis, group_id) == {**first, "sentinela": "Cache"}
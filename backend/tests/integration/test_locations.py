@@ -3,26 +3,36 @@ Testes de integração dos endpoints de localização (/api/v1/locations/*).
 
 Endpoints cobertos:
   WS  /locations/ws?token=...&group_id=... — WebSocket em tempo real
-  GET /locations/history/{user_id}          — histórico
+  GET /locations/history/{user_id}          — histórico (trajeto recente + Postgres)
   GET /locations/group/{group_id}/last      — última posição de cada membro
+  POST /locations/batch                     — upload do buffer offline
+  GET /locations/stats/{user_id}?day=       — estatísticas do dia
 
 Nota sobre WebSocket: usa fastapi.testclient.TestClient (síncrono)
 para WebSocket e httpx.AsyncClient (assíncrono) para REST.
 """
 import json
+import struct
+import time
+from datetime import datetime, UTC
 from unittest.mock import patch
 
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import delete
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
+import app.models.device    # noqa: F401
 import app.models.group     # noqa: F401
 import app.models.location  # noqa: F401
 import app.models.message   # noqa: F401
 import app.models.user      # noqa: F401
 from app.api.v1.locations import haversine
 from app.core.database import Base, get_db
+from app.models.location import Location
+from app.services import location_last, location_track
+from app.services.location_last import LastPosition
 from main import app
 from tests.conftest import FakeRedis
 
@@ -112,7 +122,7 @@ class TestGroupLastLocations:
         assert r.status_code == 401
 
     async def test_last_retorna_posicao_do_redis(self, client, group_fixture, fake_redis):
-        """Após inserção manual no FakeRedis, o endpoint retorna a posição."""
+        """Após inserção manual no FakeRedis (formato JSON antigo), o endpoint retorna a posição."""
         token_admin, group = group_fixture
         user_id = group["members"][0]["user_id"]
 
@@ -127,3 +137,240 @@ class TestGroupLastLocations:
         members = r.json()["members"]
         assert len(members) == 1
         assert members[0]["lat"] == pytest.approx(-23.5)
+
+    async def test_last_formato_compacto_com_nome_do_roster(self, client, group_fixture, fake_redis):
+        token_admin, group = group_fixture
+        member = group["members"][0]
+        await location_last.write(fake_redis, member["user_id"], LastPosition(1000.0, -23.5, -46.6, 12.5))
+
+        r = await client.get(
+            f"/api/v1/locations/group/{group['id']}/last",
+            headers={"Authorization": f"Bearer {token_admin}"},
+        )
+        assert r.json()["members"] == [{
+            "user_id": member["user_id"], "user_name": member["name"],
+            "lat": pytest.approx(-23.5), "lng": pytest.approx(-46.6), "ts": 1000.0, "accuracy": 12.5,
+        }]
+
+
+# ── Upload em lote ────────────────────────────────────────────────────────────
+
+BATCH = "/api/v1/locations/batch"
+
+
+def _track(n: int, start: float, step_s: float = 5, step_deg: float = 0.001) -> list[dict]:
+    """n fixes a cada step_s segundos, andando ~110 m (0.001°) por fix."""
+    return [{"lat": -23.5 + i * step_deg, "lng": -46.6, "ts": start + i * step_s} for i in range(n)]
+
+
+class TestLocationBatch:
+    async def test_lote_json_gravado_no_historico(self, client, group_fixture):
+        token, group = group_fixture
+        user_id = group["members"][0]["user_id"]
+        auth = {"Authorization": f"Bearer {token}"}
+
+        r = await client.post(BATCH, json={"points": _track(5, time.time() - 600)}, headers=auth)
+        assert r.status_code == 200
+        assert r.json() == {"received": 5, "invalid": 0, "duplicates": 0, "throttled": 0, "stored": 5}
+
+        r = await client.get(f"/api/v1/locations/history/{user_id}", headers=auth)
+        assert len(r.json()) == 5
+
+    async def test_throttle_descarta_parados(self, client, group_fixture):
+        token, _ = group_fixture
+        # Parado, um fix por segundo: só o primeiro e o de 30 s depois são gravados
+        points = _track(31, time.time() - 600, step_s=1, step_deg=0)
+        r = await client.post(BATCH, json={"points": points}, headers={"Authorization": f"Bearer {token}"})
+        assert r.json()["stored"] == 2
+        assert r.json()["throttled"] == 29
+
+    async def test_reenvio_nao_duplica(self, client, group_fixture):
+        token, _ = group_fixture
+        auth = {"Authorization": f"Bearer {token}"}
+        points = _track(10, time.time() - 600)
+
+        await client.post(BATCH, json={"points": points}, headers=auth)
+        r = await client.post(BATCH, json={"points": points}, headers=auth)
+        assert r.json()["stored"] == 0
+        assert r.json()["duplicates"] == 10
+
+    async def test_reenvio_nao_duplica_ts_sem_roundtrip_exato(self, client, group_fixture):
+        # ts cujo float relido do banco difere em 1 µs do enviado
+        token, _ = group_fixture
+        auth = {"Authorization": f"Bearer {token}"}
+        ts = time.time() - 600
+        while round(datetime.fromtimestamp(ts, UTC).timestamp() * 1e6) == round(ts * 1e6):
+            ts += 0.0000013
+        points = [{"lat": -23.5, "lng": -46.6, "ts": ts}]
+
+        await client.post(BATCH, json={"points": points}, headers=auth)
+        r = await client.post(BATCH, json={"points": points}, headers=auth)
+        assert r.json()["duplicates"] == 1
+
+    async def test_invalidos_sao_contados(self, client, group_fixture):
+        token, _ = group_fixture
+        now = time.time()
+        points = [
+            {"lat": 91, "lng": 0, "ts": now - 60},
+            {"lat": 0, "lng": 0, "ts": now + 3600},   # futuro
+            {"lat": 0, "lng": 0, "ts": now - 30 * 86400},  # além do histórico
+            {"lat": 0, "lng": 0, "ts": now - 60},
+        ]
+        r = await client.post(BATCH, json={"points": points}, headers={"Authorization": f"Bearer {token}"})
+        assert r.json()["invalid"] == 3
+        assert r.json()["stored"] == 1
+
+    async def test_loc_last_recebe_o_fix_mais_novo(self, client, group_fixture, fake_redis):
+        token, group = group_fixture
+        user_id = group["members"][0]["user_id"]
+        points = _track(5, time.time() - 600)
+
+        await client.post(BATCH, json={"points": points[::-1]}, headers={"Authorization": f"Bearer {token}"})
+        last = await location_last.read(fake_redis, user_id)
+        assert last.ts == pytest.approx(points[-1]["ts"])
+        assert last.lat == pytest.approx(points[-1]["lat"])
+
+    async def test_loc_last_mais_recente_nao_e_sobrescrito(self, client, group_fixture, fake_redis):
+        token, group = group_fixture
+        user_id = group["members"][0]["user_id"]
+        live = {"user_id": user_id, "user_name": "Admin", "lat": 1.0, "lng": 1.0, "ts": time.time()}
+        await fake_redis.set(f"loc:last:{user_id}", json.dumps(live))
+
+        await client.post(BATCH, json={"points": _track(3, time.time() - 600)},
+                          headers={"Authorization": f"Bearer {token}"})
+        assert json.loads(await fake_redis.get(f"loc:last:{user_id}"))["lat"] == 1.0
+
+    async def test_lote_binario(self, client, group_fixture):
+        token, _ = group_fixture
+        body = b"".join(struct.pack("<ddd", p["ts"], p["lat"], p["lng"]) for p in _track(4, time.time() - 600))
+        r = await client.post(BATCH, content=body, headers={
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/x-minhaturma-locations",
+        })
+        assert r.json()["stored"] == 4
+
+    async def test_binario_truncado_retorna_400(self, client, group_fixture):
+        token, _ = group_fixture
+        r = await client.post(BATCH, content=b"\x00" * 30, headers={
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/x-minhaturma-locations",
+        })
+        assert r.status_code == 400
+
+    async def test_lote_acima_do_maximo_retorna_413(self, client, group_fixture):
+        token, _ = group_fixture
+        with patch("app.services.location_ingest.settings.LOCATION_BATCH_MAX_POINTS", 3):
+            r = await client.post(BATCH, json={"points": _track(4, time.time() - 600)},
+                                  headers={"Authorization": f"Bearer {token}"})
+        assert r.status_code == 413
+
+    async def test_content_length_acima_do_limite_retorna_413(self, client, group_fixture):
+        token, _ = group_fixture
+        with patch("app.services.location_ingest.settings.LOCATION_BATCH_MAX_BYTES", 100):
+            r = await client.post(BATCH, json={"points": _track(4, time.time() - 600)},
+                                  headers={"Authorization": f"Bearer {token}"})
+        assert r.status_code == 413
+
+    async def test_corpo_chunked_acima_do_limite_retorna_413(self, client, group_fixture):
+        token, _ = group_fixture
+        record = struct.pack("<ddd", time.time() - 600, -23.5, -46.6)
+
+        async def chunks():
+            for _ in range(10):
+                yield record
+
+        with patch("app.services.location_ingest.settings.LOCATION_BATCH_MAX_BYTES", 100):
+            r = await client.post(BATCH, content=chunks(), headers={
+                "Authorization": f"Bearer {token}", "Content-Type": "application/x-minhaturma-locations",
+            })
+        assert "content-length" not in r.request.headers
+        assert r.status_code == 413
+
+    async def test_sem_auth_retorna_401(self, client):
+        r = await client.post(BATCH, json={"points": []})
+        assert r.status_code == 401
+
+    async def test_10k_pontos_em_menos_de_um_segundo(self, client, group_fixture):
+        token, _ = group_fixture
+        points = _track(10_000, time.time() - 10_000 * 5 - 60)
+
+        start = time.perf_counter()
+        r = await client.post(BATCH, json={"points": points}, headers={"Authorization": f"Bearer {token}"})
+        elapsed = time.perf_counter() - start
+
+        assert r.json()["stored"] == 10_000
+        assert elapsed < 1.0
+
+
+class TestHistoryTrack:
+    """Histórico com o trajeto recente do Redis na frente do Postgres."""
+
+    async def _upload(self, client, token, points):
+        r = await client.post(BATCH, json={"points": points}, headers={"Authorization": f"Bearer {token}"})
+        assert r.json()["stored"] == len(points)
+
+    async def test_janela_coberta_vem_do_redis(self, client, group_fixture, db_session, fake_redis):
+        token, group = group_fixture
+        user_id = group["members"][0]["user_id"]
+        start = time.time() - 600
+        # Set criado antes das posições: todas cobertas pelo trajeto recente
+        await fake_redis.set(location_track.since_key(user_id), start - 1)
+        await self._upload(client, token, _track(5, start))
+
+        await db_session.execute(delete(Location))
+        r = await client.get(f"/api/v1/locations/history/{user_id}", params={"start": start},
+                             headers={"Authorization": f"Bearer {token}"})
+        assert [p["ts"] for p in r.json()] == pytest.approx([start + i * 5 for i in range(4, -1, -1)])
+
+    async def test_trecho_antigo_vem_do_postgres(self, client, group_fixture, fake_redis):
+        token, group = group_fixture
+        user_id = group["members"][0]["user_id"]
+        auth = {"Authorization": f"Bearer {token}"}
+        start = time.time() - 600
+        await self._upload(client, token, _track(5, start))
+        # O set expirou; o próximo começa depois das 5 primeiras posições
+        await fake_redis.delete(location_track.track_key(user_id), location_track.since_key(user_id))
+        await fake_redis.set(location_track.since_key(user_id), start + 100)
+        await self._upload(client, token, _track(3, start + 300))
+
+        r = await client.get(f"/api/v1/locations/history/{user_id}", headers=auth)
+        expected = [start + 300 + i * 5 for i in range(2, -1, -1)] + [start + i * 5 for i in range(4, -1, -1)]
+        assert [p["ts"] for p in r.json()] == pytest.approx(expected)
+
+        r = await client.get(f"/api/v1/locations/history/{user_id}", params={"limit": 4, "end": start + 305},
+                             headers=auth)
+        assert [p["ts"] for p in r.json()] == pytest.approx(expected[1:5])
+
+    async def test_intervalo_invalido_retorna_422(self, client, group_fixture):
+        token, group = group_fixture
+        user_id = group["members"][0]["user_id"]
+        r = await client.get(f"/api/v1/locations/history/{user_id}", params={"start": 1e20},
+                             headers={"Authorization": f"Bearer {token}"})
+        assert r.status_code == 422
+
+
+class TestLocationStats:
+    async def test_lote_soma_nas_estatisticas_do_dia(self, client, group_fixture):
+        token, group = group_fixture
+        user_id = group["members"][0]["user_id"]
+        auth = {"Authorization": f"Bearer {token}"}
+        today = datetime.now(UTC).date()
+        midnight = datetime.combine(today, datetime.min.time(), UTC).timestamp()
+        await client.post(BATCH, json={"points": _track(5, max(time.time() - 600, midnight + 1))}, headers=auth)
+
+        r = await client.get(f"/api/v1/locations/stats/{user_id}", params={"day": today.isoformat()}, headers=auth)
+        assert r.status_code == 200
+        stats = r.json()
+        assert stats["day"] == today.isoformat() and stats["points"] == 5
+        assert stats["distance_m"] == pytest.approx(4 * 111.2, rel=0.01)
+        assert stats["moving_seconds"] == pytest.approx(20)
+
+    async def test_dia_sem_posicoes_e_id_invalido(self, client, group_fixture):
+        token, group = group_fixture
+        auth = {"Authorization": f"Bearer {token}"}
+        user_id = group["members"][0]["user_id"]
+        r = await client.get(f"/api/v1/locations/stats/{user_id}", params={"day": "2020-01-01"}, headers=auth)
+        assert r.json()["points"] == 0 and r.json()["distance_m"] == 0
+
+        r = await client.get("/api/v1/locations/stats/xyz", headers=auth)
+        assert r.status_code == 400
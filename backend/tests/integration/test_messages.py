@@ -0,0 +1,224 @@
+"""
+Testes de integração dos endpoints de mensagens (/api/v1/messages/*).
+
+Endpoints cobertos:
+  POST /messages/             — envio (texto), validações, membership
+  GET  /messages/{group_id}   — paginação keyset, cache de recentes no Redis
+  POST /messages/upload       — upload em streaming (FakeS3)
+  POST /messages/upload/presign — upload direto ao S3
+"""
+import json
+import uuid
+from unittest.mock import patch
+
+from app.services import message_cache
+
+MESSAGES = "/api/v1/messages/"
+REGISTER = "/api/v1/auth/register"
+
+
+# ── Helpers ───────────────────────────────────────────────────────────────────
+
+def _auth(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def _send(client, token: str, group_id: str, content: str) -> dict:
+    r = await client.post(
+        MESSAGES,
+        json={"group_id": group_id, "content": content},
+        headers=_auth(token),
+    )
+    assert r.status_code == 201, r.text
+    return r.json()
+
+
+def _item(created_at: str, n: int) -> dict:
+    return {"id": str(uuid.UUID(int=n)), "created_at": created_at, "content": f"msg {n}"}
+
+
+# ── POST /messages/ ───────────────────────────────────────────────────────────
+
+class TestSendMessage:
+    async def test_envio_retorna_201_com_mensagem(self, client, group_fixture):
+        token, group = group_fixture
+        msg = await _send(client, token, group["id"], "Oi turma")
+        assert msg["content"] == "Oi turma"
+        assert msg["type"] == "text"
+        assert msg["sender_name"] == "Admin"
+
+    async def test_mensagem_vazia_retorna_400(self, client, group_fixture):
+        token, group = group_fixture
+        r = await client.post(MESSAGES, json={"group_id": group["id"], "content": "  "}, headers=_auth(token))
+        assert r.status_code == 400
+
+    async def test_midia_sem_media_key_retorna_400(self, client, group_fixture):
+        token, group = group_fixture
+        r = await client.post(MESSAGES, json={"group_id": group["id"], "type": "image"}, headers=_auth(token))
+        assert r.status_code == 400
+
+    async def test_nao_membro_retorna_403(self, client, group_fixture):
+        _, group = group_fixture
+        r = await client.post(REGISTER, json={"name": "X", "email": "x@x.com", "password": "senha123"})
+        outsider = r.json()["access_token"]
+
+        r = await client.post(MESSAGES, json={"group_id": group["id"], "content": "oi"}, headers=_auth(outsider))
+        assert r.status_code == 403
+
+
+# ── GET /messages/{group_id} ──────────────────────────────────────────────────
+
+class TestGetMessages:
+    async def test_grupo_sem_mensagens(self, client, group_fixture):
+        token, group = group_fixture
+        r = await client.get(f"{MESSAGES}{group['id']}", headers=_auth(token))
+        assert r.status_code == 200
+        assert r.json()["messages"] == []
+        assert r.json()["next_cursor"] is None
+
+    async def test_paginacao_keyset_percorre_tudo_sem_repetir(self, client, group_fixture):
+        token, group = group_fixture
+        for i in range(7):
+            await _send(client, token, group["id"], f"msg {i}")
+
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 3}
+            if cursor:
+                params["before"] = cursor
+            r = await client.get(f"{MESSAGES}{group['id']}", params=params, headers=_auth(token))
+            assert r.status_code == 200
+            body = r.json()
+            seen.extend(m["content"] for m in body["messages"])
+            cursor = body["next_cursor"]
+            if cursor is None:
+                break
+
+        assert seen == [f"msg {i}" for i in reversed(range(7))]
+
+    async def test_primeira_pagina_aquece_e_usa_cache(self, client, group_fixture, fake_redis):
+        token, group = group_fixture
+        await _send(client, token, group["id"], "original")
+
+        await client.get(f"{MESSAGES}{group['id']}", headers=_auth(token))
+        key = f"msg:recent:{group['id']}"
+        cached = await fake_redis.lrange(key, 0, -1)
+        assert len(cached) == 1
+
+        # Altera o cache: a próxima leitura deve vir do Redis, não do banco
+        item = json.loads(cached[0])
+        item["content"] = "do cache"
+        fake_redis._store[key] = [json.dumps(item)]
+
+        r = await client.get(f"{MESSAGES}{group['id']}", headers=_auth(token))
+        assert r.json()["messages"][0]["content"] == "do cache"
+
+    async def test_leitura_da_replica_nao_vira_cache(self, client, group_fixture, db_session, fake_redis):
+        token, group = group_fixture
+        await _send(client, token, group["id"], "original")
+
+        db_session.info["replica"] = True
+        r = await client.get(f"{MESSAGES}{group['id']}", headers=_auth(token))
+        assert [m["content"] for m in r.json()["messages"]] == ["original"]
+        assert await fake_redis.lrange(f"msg:recent:{group['id']}", 0, -1) == []
+
+    async def test_nova_mensagem_entra_no_topo_do_cache(self, client, group_fixture):
+        token, group = group_fixture
+        await _send(client, token, group["id"], "primeira")
+        await client.get(f"{MESSAGES}{group['id']}", headers=_auth(token))  # aquece
+
+        await _send(client, token, group["id"], "segunda")
+        r = await client.get(f"{MESSAGES}{group['id']}", headers=_auth(token))
+        assert [m["content"] for m in r.json()["messages"]] == ["segunda", "primeira"]
+
+    async def test_rebuild_desiste_se_houve_escrita_depois_da_leitura(self, group_fixture, fake_redis):
+        _, group = group_fixture
+        gid = uuid.UUID(group["id"])
+        stale = [_item("2026-01-01T12:00:00", 1)]
+
+        seen = await message_cache.generation(fake_redis, gid)
+        await message_cache.invalidate(fake_redis, gid)  # ex.: mídia processada
+        assert not await message_cache.rebuild(fake_redis, gid, stale, seen)
+        assert await message_cache.read(fake_redis, gid, 10) == []
+        assert not [k for k in fake_redis._store if ":rebuild:" in k]
+
+    async def test_rebuild_nao_sobrescreve_cache_mais_novo(self, group_fixture, fake_redis):
+        _, group = group_fixture
+        gid = uuid.UUID(group["id"])
+        newer = [_item("2026-01-01T12:00:05", 2), _item("2026-01-01T12:00:00", 1)]
+        assert await message_cache.rebuild(fake_redis, gid, newer, None)
+
+        seen = await message_cache.generation(fake_redis, gid)
+        assert not await message_cache.rebuild(fake_redis, gid, newer[1:], seen)
+        assert [m["id"] for m in await message_cache.read(fake_redis, gid, 10)] == [newer[0]["id"], newer[1]["id"]]
+
+    async def test_cursor_invalido_retorna_400(self, client, group_fixture):
+        token, group = group_fixture
+        r = await client.get(f"{MESSAGES}{group['id']}", params={"before": "lixo"}, headers=_auth(token))
+        assert r.status_code == 400
+
+    async def test_sem_auth_retorna_401(self, client, group_fixture):
+        _, group = group_fixture
+        r = await client.get(f"{MESSAGES}{group['id']}")
+        assert r.status_code == 401
+
+
+# ── POST /messages/upload ─────────────────────────────────────────────────────
+
+class TestUploadMedia:
+    async def test_upload_retorna_media_key_do_grupo(self, client, group_fixture, fake_s3):
+        token, group = group_fixture
+        r = await client.post(
+            f"{MESSAGES}upload",
+            params={"group_id": group["id"]},
+            files={"file": ("foto.png", b"\x89PNG\r\n\x1a\n" + b"0" * 100, "image/png")},
+            headers=_auth(token),
+        )
+        assert r.status_code == 200, r.text
+        key = r.json()["media_key"]
+        assert key.startswith(f"grupos/{group['id']}/")
+        assert key in fake_s3.objects
+
+    async def test_tipo_nao_permitido_retorna_415(self, client, group_fixture, fake_s3):
+        token, group = group_fixture
+        r = await client.post(
+            f"{MESSAGES}upload",
+            params={"group_id": group["id"]},
+            files={"file": ("doc.pdf", b"%PDF", "application/pdf")},
+            headers=_auth(token),
+        )
+        assert r.status_code == 415
+
+    async def test_presign_retorna_post_direto(self, client, group_fixture, fake_s3):
+        token, group = group_fixture
+        r = await client.post(
+            f"{MESSAGES}upload/presign",
+            json={"group_id": group["id"], "content_type": "video/mp4"},
+            headers=_auth(token),
+        )
+        assert r.status_code == 200
+        body = r.json()
+        assert body["upload"]["fields"]["key"] == body["media_key"]
+
+    async def test_media_key_de_outro_grupo_retorna_400(self, client, group_fixture):
+        token, group = group_fixture
+        r = await client.post(
+            MESSAGES,
+            json={"group_id": group["id"], "type": "image", "media_key": "grupos/outro/x.png"},
+            headers=_auth(token),
+        )
+        assert r.status_code == 400
+
+    async def test_mensagem_com_midia_agenda_processamento(self, client, group_fixture):
+        token, group = group_fixture
+        key = f"grupos/{group['id']}/foto.jpg"
+        with patch("app.services.media.schedule_processing") as schedule:
+            r = await client.post(
+                MESSAGES,
+                json={"group_id": group["id"], "type": "image", "media_key": key},
+                headers=_auth(token),
+            )
+        assert r.status_code == 201
+        assert r.json()["thumbnail_key"] is None
+        schedule.assert_called_once()
+        assert schedule.call_args.args[1] == key
@@ -0,0 +1,171 @@
+"""
+Testes de integração dos endpoints de SOS (/api/v1/sos/*).
+
+Endpoints cobertos:
+  POST /sos/trigger            — grava no log (Redis Stream), Idempotency-Key
+  POST /sos/resolve/{sos_id}   — marca como resolvido
+  GET  /sos/history/{group_id} — histórico do grupo (stream limitado, fallback no banco)
+
+Os consumidores (persist/notify/broadcast) são executados pelo helper _run_workers;
+push substituído pelo FakePushProvider.
+"""
+import uuid
+
+import pytest
+
+from app.core.push import FakePushProvider
+from app.models.device import DeviceToken
+from app.models.message import SOSEvent
+from app.services import sos, sos_stream
+
+TRIGGER = "/api/v1/sos/trigger"
+REGISTER = "/api/v1/auth/register"
+
+
+def _auth(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def fake_push():
+    return FakePushProvider()
+
+
+async def _run_workers(db_session, fake_redis, provider) -> list:
+    """Executa uma rodada dos consumidores persist e notify; retorna os relatórios do notify."""
+    reports = []
+
+    async def notify(entry):
+        reports.append(await sos.notify_entry(db_session, fake_redis, provider, entry))
+
+    await sos_stream.ensure_groups(fake_redis)
+    await sos_stream.consume(fake_redis, sos_stream.PERSIST, "test",
+                             lambda e: sos.persist_entry(db_session, fake_redis, e))
+    await sos_stream.consume(fake_redis, sos_stream.NOTIFY, "test", notify)
+    return reports
+
+
+async def _add_token(db_session, group: dict, member_index: int, token: str) -> None:
+    user_id = uuid.UUID(group["members"][member_index]["user_id"])
+    db_session.add(DeviceToken(user_id=user_id, device_id=token, token=token, platform="android"))
+    await db_session.commit()
+
+
+async def _group_with_members(client, member_fixture) -> dict:
+    token_admin, _, group = member_fixture
+    r = await client.get("/api/v1/groups/", headers=_auth(token_admin))
+    return r.json()[0]
+
+
+class TestTriggerSOS:
+    async def test_notifica_os_outros_membros(self, client, member_fixture, db_session, fake_redis, fake_push):
+        token_admin, _, _ = member_fixture
+        group = await _group_with_members(client, member_fixture)
+        admin_index = next(i for i, m in enumerate(group["members"]) if m["role"] == "admin")
+        await _add_token(db_session, group, admin_index, "token-admin")
+        await _add_token(db_session, group, 1 - admin_index, "token-membro")
+
+        r = await client.post(
+            TRIGGER,
+            json={"group_id": group["id"], "latitude": -23.5, "longitude": -46.6},
+            headers=_auth(token_admin),
+        )
+        assert r.status_code == 202, r.text
+        assert fake_push.batches == []   # nada é enviado dentro da request
+
+        reports = await _run_workers(db_session, fake_redis, fake_push)
+        assert [rep.notified for rep in reports] == [1]
+        assert fake_push.batches == [["token-membro"]]
+        assert {"lookup", "push", "prune", "total"} <= set(reports[0].timings_ms)
+        assert await db_session.get(SOSEvent, uuid.UUID(r.json()["event_id"])) is not None
+
+    async def test_idempotency_key_nao_duplica_alerta(self, client, group_fixture, db_session, fake_redis, fake_push):
+        token, group = group_fixture
+        payload = {"group_id": group["id"], "latitude": -23.5, "longitude": -46.6}
+        headers = {**_auth(token), "Idempotency-Key": "tentativa-1"}
+
+        first = await client.post(TRIGGER, json=payload, headers=headers)
+        retry = await client.post(TRIGGER, json=payload, headers=headers)
+
+        assert retry.json()["event_id"] == first.json()["event_id"]
+        assert retry.json()["duplicate"] is True
+        assert len(await fake_redis.xrevrange(sos_stream.EVENTS)) == 1
+
+        other = await client.post(TRIGGER, json=payload, headers={**_auth(token), "Idempotency-Key": "tentativa-2"})
+        assert other.json()["event_id"] != first.json()["event_id"]
+
+    async def test_nao_membro_retorna_403(self, client, group_fixture, fake_push):
+        _, group = group_fixture
+        r = await client.post(REGISTER, json={"name": "X", "email": "x@x.com", "password": "senha123"})
+        outsider = r.json()["access_token"]
+
+        r = await client.post(
+            TRIGGER,
+            json={"group_id": group["id"], "latitude": 0, "longitude": 0},
+            headers=_auth(outsider),
+        )
+        assert r.status_code == 403
+
+    async def test_sem_auth_retorna_401(self, client, group_fixture):
+        _, group = group_fixture
+        r = await client.post(TRIGGER, json={"group_id": group["id"], "latitude": 0, "longitude": 0})
+        assert r.status_code == 401
+
+
+class TestHistoryAndResolve:
+    async def test_historico_e_resolucao(self, client, group_fixture, db_session, fake_redis, fake_push):
+        token, group = group_fixture
+        r = await client.post(
+            TRIGGER,
+            json={"group_id": group["id"], "latitude": -23.5, "longitude": -46.6, "message": "socorro"},
+            headers=_auth(token),
+        )
+        event_id = r.json()["event_id"]
+
+        r = await client.post(f"/api/v1/sos/resolve/{event_id}", headers=_auth(token))
+        assert r.status_code == 200
+
+        # Servido pelo stream, antes mesmo de os consumidores rodarem
+        r = await client.get(f"/api/v1/sos/history/{group['id']}", headers=_auth(token))
+        events = r.json()["events"]
+        assert len(events) == 1
+        assert events[0]["id"] == event_id
+        assert events[0]["message"] == "socorro"
+        assert events[0]["resolved"] is True
+
+        await _run_workers(db_session, fake_redis, fake_push)
+        event = await db_session.get(SOSEvent, uuid.UUID(event_id))
+        await db_session.refresh(event)
+        assert event.resolved is True
+
+    async def test_historico_cai_para_o_banco_sem_indice(self, client, group_fixture, db_session, fake_redis, fake_push):
+        token, group = group_fixture
+        await client.post(TRIGGER, json={"group_id": group["id"], "latitude": 1, "longitude": 2}, headers=_auth(token))
+        await _run_workers(db_session, fake_redis, fake_push)
+        await fake_redis.delete(sos_stream.history_key(group["id"]))
+
+        r = await client.get(f"/api/v1/sos/history/{group['id']}", headers=_auth(token))
+        events = r.json()["events"]
+        assert [(e["lat"], e["lng"]) for e in events] == [(1.0, 2.0)]
+
+    async def test_indice_curto_e_completado_pelo_banco(self, client, group_fixture, db_session, fake_redis, fake_push):
+        token, group = group_fixture
+        for lat in (1, 2):
+            await client.post(TRIGGER, json={"group_id": group["id"], "latitude": lat, "longitude": 0},
+                              headers=_auth(token))
+        await _run_workers(db_session, fake_redis, fake_push)
+        # Redis reiniciado: o índice recomeça só com os eventos novos
+        await fake_redis.delete(sos_stream.history_key(group["id"]))
+        await client.post(TRIGGER, json={"group_id": group["id"], "latitude": 3, "longitude": 0}, headers=_auth(token))
+        await _run_workers(db_session, fake_redis, fake_push)
+
+        r = await client.get(f"/api/v1/sos/history/{group['id']}", headers=_auth(token))
+        assert [e["lat"] for e in r.json()["events"]] == [3.0, 2.0, 1.0]
+
+        r = await client.get(f"/api/v1/sos/history/{group['id']}?limit=2", headers=_auth(token))
+        assert [e["lat"] for e in r.json()["events"]] == [3.0, 2.0]
+
+    async def test_resolver_inexistente_retorna_404(self, client, group_fixture):
+        token, _ = group_fixture
+        r = await client.post(f"/api/v1/sos/resolve/{uuid.uuid4()}", headers=_auth(token))
+        assert r.status_code == 404
@@ -0,0 +1,152 @@
+"""
+Testes unitários do perfil do engine (app/core/database.py): parâmetros de
+pool, cache de prepared statements e statement_timeout por driver; e do
+roteamento primário/réplica com read-your-writes (dois bancos SQLite).
+"""
+import uuid
+from dataclasses import replace
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+
+from app.core import database
+from app.core.database import DatabaseProfile, WriteSession, make_engine
+from app.core.security import create_access_token
+from app.models.user import User
+
+PG_URL = "postgresql+asyncpg://u:p@db/app"
+
+
+class TestDatabaseProfile:
+    def test_asyncpg_recebe_cache_e_statement_timeout(self):
+        profile = replace(DatabaseProfile.from_settings(), statement_cache_size=0, statement_timeout_ms=2500)
+        kwargs = profile.engine_kwargs(PG_URL)
+
+        assert kwargs["connect_args"]["statement_cache_size"] == 0
+        assert kwargs["connect_args"]["server_settings"] == {"statement_timeout": "2500"}
+        assert kwargs["pool_size"] == profile.pool_size
+        assert kwargs["pool_timeout"] == profile.pool_timeout
+
+    def test_sem_statement_timeout(self):
+        profile = replace(DatabaseProfile.from_settings(), statement_timeout_ms=0)
+        assert profile.engine_kwargs(PG_URL)["connect_args"]["server_settings"] == {}
+
+    def test_sqlite_nao_recebe_parametros_de_pool(self):
+        kwargs = DatabaseProfile.from_settings().engine_kwargs("sqlite+aiosqlite:///:memory:")
+        assert "pool_size" not in kwargs
+        assert "connect_args" not in kwargs
+
+    async def test_make_engine_aplica_perfil(self):
+        profile = replace(DatabaseProfile.from_settings(), pool_pre_ping=False, pool_recycle=60, statement_cache_size=7)
+        engine = make_engine(PG_URL, profile)
+        try:
+            assert engine.pool._pre_ping is False
+            assert engine.pool._recycle == 60
+            assert engine.url.query["prepared_statement_cache_size"] == "7"
+        finally:
+            await engine.dispose()
+
+
+# ── Réplica de leitura ────────────────────────────────────────────────────────
+
+def _request(user_id: uuid.UUID | None = None) -> Request:
+    headers = []
+    if user_id is not None:
+        token = create_access_token({"sub": str(user_id)})
+        headers.append((b"authorization", f"Bearer {token}".encode()))
+    return Request({"type": "http", "headers": headers})
+
+
+@pytest.fixture
+async def two_databases(tmp_path, fake_redis):
+    """Primário e "réplica" em dois arquivos SQLite; cada um se identifica em db_name."""
+    primary = make_engine(f"sqlite+aiosqlite:///{tmp_path / 'primary.db'}")
+    replica = make_engine(f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}")
+    for eng, name in ((primary, "primary"), (replica, "replica")):
+        async with eng.begin() as conn:
+            await conn.execute(text("CREATE TABLE db_name (name TEXT)"))
+            await conn.execute(text("CREATE TABLE notes (body TEXT)"))
+            await conn.execute(text("INSERT INTO db_name VALUES (:n)"), {"n": name})
+
+    async def get_fake_redis():
+        return fake_redis
+
+    with (
+        patch.object(database, "engine", primary),
+        patch.object(database, "read_engine", replica),
+        patch.object(database, "AsyncSessionLocal", sessionmaker(
+            bind=primary, class_=AsyncSession, sync_session_class=WriteSession, expire_on_commit=False)),
+        patch.object(database, "ReadSessionLocal", sessionmaker(
+            bind=replica, class_=AsyncSession, expire_on_commit=False)),
+        patch.object(database, "get_redis", get_fake_redis),
+    ):
+        yield
+    await primary.dispose()
+    await replica.dispose()
+
+
+async def _read_db_name(request: Request) -> str:
+    gen = database.get_read_db(request)
+    session = await gen.__anext__()
+    try:
+        name = (await session.execute(text("SELECT name FROM db_name"))).scalar_one()
+        assert session.info["replica"] == (name == "replica")
+        return name
+    finally:
+        await gen.aclose()
+
+
+async def _write_as(user_id: uuid.UUID | None, write: bool) -> None:
+    gen = database.get_db()
+    session = await gen.__anext__()
+    if user_id is not None:
+        session.info["user_id"] = user_id
+    if write:
+        # SQL textual não passa pelo flush do ORM: marca como WriteSession faria
+        await session.execute(text("INSERT INTO notes VALUES ('x')"))
+        session.info["wrote"] = True
+    with pytest.raises(StopAsyncIteration):
+        await gen.__anext__()
+
+
+class TestReadReplica:
+    async def test_leitura_vai_para_a_replica(self, two_databases):
+        assert await _read_db_name(_request(uuid.uuid4())) == "replica"
+        assert await _read_db_name(_request()) == "replica"
+
+    async def test_quem_gravou_le_do_primario(self, two_databases):
+        writer, other = uuid.uuid4(), uuid.uuid4()
+        await _write_as(writer, write=True)
+
+        assert await _read_db_name(_request(writer)) == "primary"
+        assert await _read_db_name(_request(other)) == "replica"
+
+    async def test_requisicao_sem_gravacao_nao_fixa(self, two_databases, fake_redis):
+        reader = uuid.uuid4()
+        await _write_as(reader, write=False)
+
+        assert not await database.is_pinned(fake_redis, reader)
+        assert await _read_db_name(_request(reader)) == "replica"
+
+    async def test_token_invalido_le_da_replica(self, two_databases):
+        request = Request({"type": "http", "headers": [(b"authorization", b"Bearer lixo")]})
+        assert await _read_db_name(request) == "replica"
+
+    async def test_flush_marca_sessao_como_gravada(self, tmp_path):
+        engine = make_engine(f"sqlite+aiosqlite:///{tmp_path / 'w.db'}")
+        SessionLocal = sessionmaker(bind=engine, class_=AsyncSession, sync_session_class=WriteSession)
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(database.Base.metadata.create_all)
+            async with SessionLocal() as session:
+                await session.flush()
+                assert "wrote" not in session.info
+                session.add(User(name="Ana", email="ana@x.com"))
+                await session.flush()
+                assert session.info["wrote"] is True
+        finally:
+            await engine.dispose()
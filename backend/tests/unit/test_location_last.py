@@ -0,0 +1,55 @@
+"""
+Testes do formato de loc:last (app/services/location_last.py).
+
+Coberturas:
+  - versão atual: ida e volta, precisão ausente, tamanho fixo
+  - leitura do formato JSON antigo (migração sem downtime)
+  - versão desconhecida ou valor corrompido contam como ausentes
+  - read_many num único MGET, sem quem não tem posição
+"""
+import json
+
+import pytest
+
+from app.services import location_last
+from app.services.location_last import LastPosition
+
+LEGACY = {
+    "user_id": "6f1c1a8e-4d1b-4c55-9a43-3c2b9d0e7f10", "user_name": "Maria Aparecida",
+    "lat": -23.5505199, "lng": -46.6333094, "ts": 1_760_000_000.123456,
+}
+
+
+class TestCodec:
+    def test_ida_e_volta(self):
+        pos = LastPosition(1_760_000_000.123456, -23.5505199, -46.6333094, 8.5)
+        decoded = location_last.decode(location_last.encode(pos))
+        assert decoded.ts == pos.ts and decoded.accuracy == 8.5
+        assert decoded.lat == pytest.approx(pos.lat, abs=1e-7)
+        assert decoded.lng == pytest.approx(pos.lng, abs=1e-7)
+
+    def test_sem_precisao(self):
+        raw = location_last.encode(LastPosition(1.0, 0.0, 0.0))
+        assert location_last.decode(raw).accuracy is None
+
+    def test_varias_vezes_menor_que_o_json(self):
+        raw = location_last.encode(LastPosition(LEGACY["ts"], LEGACY["lat"], LEGACY["lng"]))
+        assert len(raw) == 28
+        assert len(json.dumps(LEGACY)) > 4 * len(raw)
+
+    def test_le_o_json_antigo(self):
+        assert location_last.decode(json.dumps(LEGACY)) == LastPosition(LEGACY["ts"], LEGACY["lat"], LEGACY["lng"])
+
+    @pytest.mark.parametrize("raw", [None, "", "AgAAAAAAAAAAAAAAAAAAAAAAAAAA", "não é base64!", "AAAA"])
+    def test_versao_desconhecida_ou_corrompido(self, raw):
+        assert location_last.decode(raw) is None
+
+
+class TestRedis:
+    async def test_read_many(self, fake_redis):
+        await location_last.write(fake_redis, "a", LastPosition(1.0, 1.0, 1.0))
+        await fake_redis.set(location_last.last_key("b"), json.dumps({"lat": 2.0, "lng": 2.0, "ts": 2.0}))
+
+        positions = await location_last.read_many(fake_redis, ["a", "b", "c"])
+        assert positions == {"a": LastPosition(1.0, 1.0, 1.0), "b": LastPosition(2.0, 2.0, 2.0)}
+        assert await location_last.read_many(fake_redis, []) == {}
@@ -0,0 +1,253 @@
+"""
+Testes do WebSocket de localização multiplexado (app/api/v1/locations.py).
+
+Coberturas:
+  - sem group_id, a conexão assina todos os grupos do usuário
+  - cada posição é processada uma vez e chega a todos os grupos
+  - subscribe/unsubscribe em banda (com verificação de membership)
+  - com group_id, continua assinando só aquele grupo
+  - sem nenhum grupo assinado, a conexão continua aberta (fila de saída e ping)
+  - frame inválido fecha com 1003
+  - a conexão recebe o intervalo de envio ({"type": "config"}) ao abrir
+  - viewport em banda: só recebe posições dentro da área; inválido retorna erro
+"""
+import asyncio
+import uuid
+from unittest.mock import patch
+
+import pytest
+from fastapi import WebSocketDisconnect
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.api.v1 import locations
+from app.core.config import settings
+from app.core.database import Base
+from app.core.security import create_access_token
+from app.core.ws_manager import ConnectionManager
+from app.models.group import Group, GroupMember, GroupRole
+from app.models.user import User
+from app.services.location_sampling import SamplingController
+
+
+class QueueWebSocket:
+    """WebSocket dirigido pelo teste: frames entram por push(), saem em sent."""
+
+    def __init__(self) -> None:
+        self.incoming: asyncio.Queue = asyncio.Queue()
+        self.sent: list[dict] = []
+        self.close_code: int | None = None
+
+    def push(self, frame: dict | None) -> None:
+        self.incoming.put_nowait(frame)
+
+    async def accept(self) -> None:
+        pass
+
+    async def receive_json(self) -> dict:
+        frame = await self.incoming.get()
+        if frame is None:
+            raise WebSocketDisconnect()
+        return frame
+
+    async def send_json(self, data: dict) -> None:
+        self.sent.append(data)
+
+    async def close(self, code: int = 1000) -> None:
+        self.close_code = code
+
+
+class RecordingWriter:
+    def __init__(self) -> None:
+        self.rows: list[tuple] = []
+
+    async def add(self, *row) -> None:
+        self.rows.append(row)
+
+
+@pytest.fixture
+async def setup(tmp_path, fake_redis):
+    """Usuário em 3 grupos + um grupo do qual não é membro."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'mux.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    SessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with SessionLocal() as db:
+        user = User(name="Ana", email="ana@x.com")
+        groups = [Group(name=f"G{i}", invite_code=f"MUX{i:05d}") for i in range(4)]
+        db.add_all([user, *groups])
+        await db.flush()
+        db.add_all([GroupMember(group_id=g.id, user_id=user.id, role=GroupRole.member) for g in groups[:3]])
+        await db.commit()
+
+    async def get_fake_redis():
+        return fake_redis
+
+    manager, writer, sampling = ConnectionManager(), RecordingWriter(), SamplingController()
+    with (
+        patch.object(locations, "AsyncSessionLocal", SessionLocal),
+        patch.object(locations, "writer", writer),
+        patch.object(locations, "manager", manager),
+        patch.object(locations, "sampling", sampling),
+        patch.object(locations, "get_redis", get_fake_redis),
+    ):
+        yield user, [str(g.id) for g in groups], manager, writer
+    for ws in list(manager._outboxes):
+        manager.close(ws)
+    await sampling.close()
+    await asyncio.sleep(0)
+    await engine.dispose()
+
+
+async def _until(condition, timeout: float = 1.0) -> None:
+    async def _wait():
+        while not condition():
+            await asyncio.sleep(0)
+    await asyncio.wait_for(_wait(), timeout)
+
+
+def _replies(ws: QueueWebSocket, kind: str) -> list[dict]:
+    return [f for f in ws.sent if f["type"] == kind]
+
+
+def _watcher(manager: ConnectionManager, group_id: str) -> QueueWebSocket:
+    """Outro socket assinando o grupo, para ver os broadcasts."""
+    ws = QueueWebSocket()
+    manager.subscribe(group_id, ws)
+    return ws
+
+
+class TestMultiplexedSocket:
+    async def test_assina_todos_os_grupos(self, setup):
+        user, groups, manager, writer = setup
+        member_groups = groups[:3]
+        watchers = [_watcher(manager, gid) for gid in member_groups]
+        outsider = _watcher(manager, groups[3])
+
+        ws = QueueWebSocket()
+        task = asyncio.create_task(locations.location_ws(
+            ws, token=create_access_token({"sub": str(user.id)}), group_id=None,
+        ))
+        ws.push({"lat": -23.5, "lng": -46.6})
+        await _until(lambda: all(w.sent for w in watchers))
+        ws.push(None)
+        await task
+
+        assert len(writer.rows) == 1  # processada uma vez
+        for w in watchers:
+            assert len(w.sent) == 1
+            assert w.sent[0]["type"] == "location_update"
+            assert w.sent[0]["user_id"] == str(user.id)
+        assert outsider.sent == []
+
+    async def test_subscribe_e_unsubscribe_em_banda(self, setup):
+        user, groups, manager, _ = setup
+        ws = QueueWebSocket()
+        token = create_access_token({"sub": str(user.id)})
+        task = asyncio.create_task(locations.location_ws(ws, token=token, group_id=groups[0]))
+
+        ws.push({"type": "subscribe", "group_id": groups[1]})
+        await _until(lambda: _replies(ws, "subscriptions"))
+        assert _replies(ws, "subscriptions")[-1] == {"type": "subscriptions", "group_ids": sorted(groups[:2])}
+
+        ws.push({"type": "unsubscribe", "group_id": groups[0]})
+        await _until(lambda: len(_replies(ws, "subscriptions")) == 2)
+        assert _replies(ws, "subscriptions")[-1] == {"type": "subscriptions", "group_ids": [groups[1]]}
+        assert ws not in manager.active.get(groups[0], [])
+
+        ws.push(None)
+        await task
+        assert manager.active.get(groups[1], []) == []
+
+    async def test_subscribe_sem_ser_membro_retorna_erro(self, setup):
+        user, groups, manager, _ = setup
+        ws = QueueWebSocket()
+        token = create_access_token({"sub": str(user.id)})
+        task = asyncio.create_task(locations.location_ws(ws, token=token, group_id=groups[0]))
+
+        ws.push({"type": "subscribe", "group_id": groups[3]})
+        await _until(lambda: _replies(ws, "error"))
+        assert groups[3] not in manager.active
+
+        ws.push(None)
+        await task
+
+    async def test_com_group_id_assina_so_o_grupo(self, setup):
+        user, groups, manager, _ = setup
+        ws = QueueWebSocket()
+        token = create_access_token({"sub": str(user.id)})
+        task = asyncio.create_task(locations.location_ws(ws, token=token, group_id=groups[1]))
+        await _until(lambda: groups[1] in manager.active)
+
+        assert [gid for gid, conns in manager.active.items() if ws in conns] == [groups[1]]
+        ws.push(None)
+        await task
+
+    async def test_unsubscribe_do_ultimo_grupo_mantem_a_conexao(self, setup):
+        user, groups, manager, _ = setup
+        manager.ping_interval = 0.01
+        ws = QueueWebSocket()
+        token = create_access_token({"sub": str(user.id)})
+        task = asyncio.create_task(locations.location_ws(ws, token=token, group_id=groups[0]))
+
+        ws.push({"type": "unsubscribe", "group_id": groups[0]})
+        await _until(lambda: {"type": "subscriptions", "group_ids": []} in ws.sent)
+        assert ws in manager._outboxes
+        assert groups[0] not in manager.active
+
+        # Continua recebendo ping e pode voltar a assinar
+        await _until(lambda: any(f["type"] == "ping" for f in ws.sent))
+        ws.push({"type": "subscribe", "group_id": groups[1]})
+        await _until(lambda: {"type": "subscriptions", "group_ids": [groups[1]]} in ws.sent)
+        assert manager.active[groups[1]] == [ws]
+
+        ws.push(None)
+        await task
+        assert ws not in manager._outboxes
+
+    async def test_frame_invalido_fecha_com_1003(self, setup):
+        user, groups, manager, writer = setup
+        ws = QueueWebSocket()
+        token = create_access_token({"sub": str(user.id)})
+        task = asyncio.create_task(locations.location_ws(ws, token=token, group_id=groups[0]))
+
+        ws.push({"lng": -46.6})  # sem lat
+        await asyncio.wait_for(task, 1.0)
+        assert ws.close_code == locations.WS_CLOSE_UNSUPPORTED_DATA
+        assert writer.rows == []
+        assert ws not in manager._outboxes
+
+    async def test_recebe_o_intervalo_ao_conectar(self, setup):
+        user, groups, _, _ = setup
+        ws = QueueWebSocket()
+        token = create_access_token({"sub": str(user.id)})
+        task = asyncio.create_task(locations.location_ws(ws, token=token, group_id=None))
+
+        await _until(lambda: ws.sent)
+        assert ws.sent[0] == {"type": "config", "interval": settings.LOCATION_IDLE_INTERVAL_SECONDS}
+        ws.push(None)
+        await task
+
+    async def test_viewport_em_banda(self, setup):
+        user, groups, manager, _ = setup
+        viewer, device = QueueWebSocket(), QueueWebSocket()
+        token = create_access_token({"sub": str(user.id)})
+        viewer_task = asyncio.create_task(locations.location_ws(viewer, token=token, group_id=groups[0]))
+
+        viewer.push({"type": "viewport", "bbox": [10, 10]})
+        await _until(lambda: _replies(viewer, "error"))
+        viewer.push({"type": "viewport", "lat": -23.5, "lng": -46.6, "radius_m": 2000})
+        await _until(lambda: _replies(viewer, "viewport"))
+        assert _replies(viewer, "viewport") == [{"type": "viewport", "active": True}]
+
+        device_task = asyncio.create_task(locations.location_ws(device, token=token, group_id=groups[0]))
+        device.push({"lat": -22.9, "lng": -43.2})   # Rio: fora do raio
+        device.push({"lat": -23.501, "lng": -46.6})  # dentro
+        await _until(lambda: _replies(viewer, "location_update"))
+        await asyncio.sleep(0.01)
+        assert [f["lat"] for f in _replies(viewer, "location_update")] == [-23.501]
+
+        for ws, task in ((viewer, viewer_task), (device, device_task)):
+            ws.push(None)
+            await task
@@ -0,0 +1,153 @@
+"""
+Testes unitários da amostragem adaptativa (app/services/location_sampling.py).
+
+Coberturas:
+  - interval_for: grupo observado, SOS ativo, SOS expirado (e removido), normal
+  - watch liga/desliga o observador no Redis (ZADD / ZREM)
+  - refresh enxerga observadores de outros workers e descarta os vencidos
+  - SOS disparado acelera na hora os aparelhos do grupo; resolvido, volta
+  - o frame de config só é enviado quando o intervalo muda
+"""
+import time
+import uuid
+
+import pytest
+
+from app.core.config import settings
+from app.services import location_sampling, sos_stream
+from app.services.location_sampling import SamplingController, fast_interval, watchers_key
+
+
+class RecordingManager:
+    def __init__(self) -> None:
+        self.sent: list[tuple[object, dict]] = []
+
+    async def send(self, ws, data: dict) -> None:
+        self.sent.append((ws, data))
+
+    def configs(self, ws) -> list[int]:
+        return [data["interval"] for target, data in self.sent if target is ws and data["type"] == "config"]
+
+
+@pytest.fixture(autouse=True)
+def clean_sos(monkeypatch):
+    monkeypatch.setattr(location_sampling, "_active_sos", {})
+
+
+@pytest.fixture
+async def controller():
+    controller = SamplingController()
+    yield controller
+    await controller.close()
+
+
+def _sos(group_id: str, kind: str = sos_stream.TRIGGERED, ts: float | None = None, event_id: str = "ev1") -> dict:
+    return {"group_id": group_id, "kind": kind, "event_id": event_id, "ts": str(time.time() if ts is None else ts)}
+
+
+class TestIntervalFor:
+    def test_normal_usa_o_intervalo_ocioso(self, controller):
+        assert controller.interval_for({"g1"}) == settings.LOCATION_IDLE_INTERVAL_SECONDS
+
+    def test_grupo_observado_acelera(self, controller):
+        controller._watched = {"g2"}
+        assert controller.interval_for({"g1", "g2"}) == fast_interval()
+        assert fast_interval() < settings.LOCATION_IDLE_INTERVAL_SECONDS
+
+    async def test_sos_ativo_acelera(self, controller):
+        await location_sampling.record_sos(_sos("g1"))
+        assert controller.interval_for({"g1"}) == fast_interval()
+
+    async def test_sos_expirado_volta_ao_normal_e_sai_da_memoria(self, controller):
+        old = time.time() - settings.LOCATION_SOS_FAST_SECONDS - 1
+        await location_sampling.record_sos(_sos("g1", ts=old))
+        assert controller.interval_for({"g1"}) == settings.LOCATION_IDLE_INTERVAL_SECONDS
+        assert location_sampling._active_sos == {}
+
+    def test_intervalo_rapido_respeita_o_throttle(self, monkeypatch):
+        monkeypatch.setattr(settings, "LOCATION_WATCHED_INTERVAL_SECONDS", 1)
+        floor = settings.LOCATION_UPDATE_INTERVAL_SECONDS / settings.LOCATION_FRAMES_PER_INTERVAL
+        assert fast_interval() == round(floor)
+
+
+class TestWatch:
+    async def test_liga_e_desliga_o_observador(self, controller, fake_redis):
+        manager, ws = RecordingManager(), object()
+        await controller.register(fake_redis, manager, ws, {"g1", "g2"})
+
+        await controller.set_watching(ws, True)
+        viewer_id = controller._devices[ws].viewer_id
+        for gid in ("g1", "g2"):
+            assert await fake_redis.zrangebyscore(watchers_key(gid), "-inf", "+inf") == [viewer_id]
+        assert manager.configs(ws) == [settings.LOCATION_IDLE_INTERVAL_SECONDS, fast_interval()]
+
+        await controller.set_watching(ws, False)
+        for gid in ("g1", "g2"):
+            assert await fake_redis.zrangebyscore(watchers_key(gid), "-inf", "+inf") == []
+
+    async def test_unregister_remove_o_observador(self, controller, fake_redis):
+        ws = object()
+        await controller.register(fake_redis, RecordingManager(), ws, {"g1"})
+        await controller.set_watching(ws, True)
+
+        await controller.unregister(ws)
+        assert await fake_redis.zrangebyscore(watchers_key("g1"), "-inf", "+inf") == []
+        assert controller._task is None
+
+
+class TestRefresh:
+    async def test_observador_de_outro_worker_acelera(self, controller, fake_redis):
+        manager, ws = RecordingManager(), object()
+        await controller.register(fake_redis, manager, ws, {"g1"})
+        await fake_redis.zadd(watchers_key("g1"), {uuid.uuid4().hex: time.time() + 30})
+
+        await controller.refresh()
+        assert manager.configs(ws)[-1] == fast_interval()
+
+    async def test_observador_vencido_e_descartado(self, controller, fake_redis):
+        manager, ws = RecordingManager(), object()
+        await controller.register(fake_redis, manager, ws, {"g1"})
+        await fake_redis.zadd(watchers_key("g1"), {"morto": time.time() - 1})
+
+        await controller.refresh()
+        assert manager.configs(ws) == [settings.LOCATION_IDLE_INTERVAL_SECONDS]
+        assert await fake_redis.zrangebyscore(watchers_key("g1"), "-inf", "+inf") == []
+
+    async def test_observador_deixa_de_valer_no_proximo_refresh(self, controller, fake_redis):
+        manager, viewer, device = RecordingManager(), object(), object()
+        await controller.register(fake_redis, manager, viewer, {"g1"})
+        await controller.register(fake_redis, manager, device, {"g1"})
+        await controller.set_watching(viewer, True)
+        await controller.set_watching(viewer, False)
+
+        await controller.refresh()
+        assert manager.configs(device)[-1] == settings.LOCATION_IDLE_INTERVAL_SECONDS
+
+
+class TestSOS:
+    async def test_disparo_acelera_na_hora_e_resolucao_volta(self, controller, fake_redis):
+        manager, in_group, other = RecordingManager(), object(), object()
+        await controller.register(fake_redis, manager, in_group, {"g1"})
+        await controller.register(fake_redis, manager, other, {"g2"})
+
+        await location_sampling.record_sos(_sos("g1"))
+        assert manager.configs(in_group)[-1] == fast_interval()
+        assert manager.configs(other) == [settings.LOCATION_IDLE_INTERVAL_SECONDS]
+
+        await location_sampling.record_sos(_sos("g1", kind=sos_stream.RESOLVED))
+        assert manager.configs(in_group)[-1] == settings.LOCATION_IDLE_INTERVAL_SECONDS
+        assert "g1" not in location_sampling._active_sos
+
+
+class TestUpdate:
+    async def test_config_so_quando_o_intervalo_muda(self, controller, fake_redis):
+        manager, ws = RecordingManager(), object()
+        await controller.register(fake_redis, manager, ws, {"g1"})
+        await controller.update(ws)
+        await controller.update(ws)
+        assert manager.configs(ws) == [settings.LOCATION_IDLE_INTERVAL_SECONDS]
+
+        controller._watched = {"g1"}
+        await controller.update(ws)
+        await controller.update(ws)
+        assert manager.configs(ws) == [settings.LOCATION_IDLE_INTERVAL_SECONDS, fast_interval()]
@@ -0,0 +1,163 @@
+"""
+Testes das estatísticas diárias de deslocamento (app/services/location_stats.py).
+
+Coberturas:
+  - distância, tempo em movimento/parado e velocidade máxima por trecho
+  - trecho longo demais (aparelho desligado) não conta; virada do dia
+  - gravação incremental igual à de uma vez só; WATCH refaz a soma
+  - posições fora de ordem marcam o dia e o rollup recalcula do banco
+  - rollup grava a tabela; leitura usa Redis, tabela ou os dois
+"""
+from datetime import date, datetime, timedelta, UTC
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base
+from app.models.location import Location, LocationDailyStats
+from app.models.user import User
+from app.services import location_stats
+from app.services.location_stats import DayStats
+
+DAY = date(2026, 3, 1)
+T0 = datetime(2026, 3, 1, 12, tzinfo=UTC).timestamp()
+STEP_DEG = 0.001  # ~111 m em latitude
+
+
+def _walk(n: int, start: float = T0, step_s: float = 60, step_deg: float = STEP_DEG) -> list:
+    return [(start + i * step_s, -23.5 + i * step_deg, -46.6) for i in range(n)]
+
+
+@pytest.fixture
+async def db(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'stats.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    SessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with SessionLocal() as session:
+        user = User(name="Ana", email="ana@x.com")
+        session.add(user)
+        await session.commit()
+    yield SessionLocal, user.id
+    await engine.dispose()
+
+
+class TestAccumulate:
+    def test_caminhada_e_parada(self):
+        days = {}
+        # 3 trechos de ~111 m em 60 s (movimento) e 2 parados
+        points = _walk(4) + [(T0 + 240, -23.497, -46.6), (T0 + 300, -23.497, -46.6)]
+        last = location_stats.accumulate(days, None, points)
+        stats = days[DAY]
+        assert last == points[-1]
+        assert stats.points == 6
+        assert stats.distance_m == pytest.approx(3 * 111.2, rel=0.01)
+        assert stats.moving_seconds == 180 and stats.stopped_seconds == 120
+        assert stats.max_speed == pytest.approx(111.2 / 60, rel=0.01)
+
+    def test_lacuna_longa_nao_conta(self):
+        days = {}
+        location_stats.accumulate(days, None, [(T0, 0.0, 0.0), (T0 + 3600, 0.1, 0.0)])
+        assert days[DAY].distance_m == 0 and days[DAY].moving_seconds == 0
+
+    def test_trecho_conta_para_o_dia_em_que_termina(self):
+        midnight = T0 + 12 * 3600
+        days = {}
+        location_stats.accumulate(days, None, _walk(2, start=midnight - 30))
+        assert days[DAY].distance_m == 0
+        assert days[DAY + timedelta(days=1)].distance_m == pytest.approx(111.2, rel=0.01)
+
+    def test_fora_de_ordem_marca_o_dia(self):
+        days = {}
+        last = location_stats.accumulate(days, None, _walk(3))
+        location_stats.accumulate(days, last, [(T0 + 30, -23.5, -46.6)])
+        assert days[DAY].late == 1 and days[DAY].points == 4
+
+
+class TestRecord:
+    async def test_incremental_igual_a_de_uma_vez(self, fake_redis):
+        points = _walk(10)
+        await location_stats.record(fake_redis, {"a": points[:4]})
+        await location_stats.record(fake_redis, {"a": points[4:]})
+        await location_stats.record(fake_redis, {"b": points})
+
+        a = DayStats.from_hash(await fake_redis.hgetall(location_stats.stats_key("a", DAY)))
+        b = DayStats.from_hash(await fake_redis.hgetall(location_stats.stats_key("b", DAY)))
+        assert a == b and a.points == 10
+        assert await fake_redis.smembers(location_stats.DIRTY_KEY) == {f"a:{DAY}", f"b:{DAY}"}
+
+    async def test_watch_refaz_a_soma(self, fake_redis):
+        await location_stats.record(fake_redis, {"a": _walk(2)})
+        original = fake_redis.hgetall
+        raced = []
+
+        async def hgetall_with_race(key):
+            if not raced:
+                # Outro worker grava o mesmo usuário entre a leitura e o EXEC
+                raced.append(key)
+                await location_stats.record(fake_redis, {"a": [_walk(3)[2]]})
+            return await original(key)
+
+        with patch.object(fake_redis, "hgetall", hgetall_with_race):
+            await location_stats.record(fake_redis, {"a": [_walk(4)[3]]})
+
+        stats = DayStats.from_hash(await fake_redis.hgetall(location_stats.stats_key("a", DAY)))
+        assert stats.points == 4 and stats.late == 0
+        assert stats.distance_m == pytest.approx(3 * 111.2, rel=0.01)
+
+
+class TestRollup:
+    async def test_grava_a_tabela_e_leitura_cai_nela(self, fake_redis, db):
+        SessionLocal, user_id = db
+        await location_stats.record(fake_redis, {user_id: _walk(5)})
+        assert await location_stats.rollup(fake_redis, SessionLocal) == 1
+        assert await fake_redis.smembers(location_stats.DIRTY_KEY) == set()
+
+        expected = DayStats.from_hash(await fake_redis.hgetall(location_stats.stats_key(user_id, DAY)))
+        await fake_redis.delete(location_stats.stats_key(user_id, DAY))  # expirou no Redis
+        async with SessionLocal() as session:
+            assert await location_stats.day_stats(session, fake_redis, user_id, DAY) == expected
+            assert await location_stats.day_stats(session, fake_redis, user_id, DAY + timedelta(days=1)) == DayStats()
+
+    async def test_dia_fora_de_ordem_e_recalculado(self, fake_redis, db):
+        SessionLocal, user_id = db
+        points = _walk(6)
+        # O WebSocket grava as posições pares; o lote offline traz as ímpares depois
+        arrival = points[::2] + points[1::2]
+        async with SessionLocal() as session:
+            session.add_all([
+                Location(user_id=user_id, latitude=lat, longitude=lng,
+                         recorded_at=datetime(1970, 1, 1) + timedelta(seconds=ts))
+                for ts, lat, lng in arrival
+            ])
+            await session.commit()
+        await location_stats.record(fake_redis, {user_id: arrival[:3]})
+        await location_stats.record(fake_redis, {user_id: arrival[3:]})
+
+        async with SessionLocal() as session:
+            partial = await location_stats.day_stats(session, fake_redis, user_id, DAY)
+        assert partial.late == 2
+
+        await location_stats.rollup(fake_redis, SessionLocal)
+        async with SessionLocal() as session:
+            row = await session.get(LocationDailyStats, (user_id, DAY))
+            exact = await location_stats.day_stats(session, fake_redis, user_id, DAY)
+        assert row.points == 6
+        assert exact.distance_m == pytest.approx(5 * 111.2, rel=0.01)
+        assert exact.moving_seconds == 300
+
+    async def test_falha_devolve_os_dias(self, fake_redis, db):
+        _, user_id = db
+        await location_stats.record(fake_redis, {user_id: _walk(2)})
+
+        def broken_session():
+            raise ConnectionError
+
+        assert await location_stats.rollup(fake_redis, broken_session) == 0
+        assert await fake_redis.smembers(location_stats.DIRTY_KEY) == {f"{user_id}:{DAY}"}
+
+    async def test_sem_dias_pendentes(self, fake_redis, db):
+        SessionLocal, _ = db
+        assert await location_stats.rollup(fake_redis, SessionLocal) == 0
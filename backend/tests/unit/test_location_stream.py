@@ -0,0 +1,151 @@
+"""
+Testes do stream SSE de posições (GET /locations/group/{id}/stream) e do
+buffer de retomada (app/services/location_events.py, app/core/sse.py).
+
+Coberturas:
+  - formato dos eventos (id/event/data, ping como comentário, retry no reconnect)
+  - o stream recebe o mesmo broadcast dos WebSockets do grupo
+  - Last-Event-ID: replay do buffer e sem duplicar o que chega ao vivo
+  - buffer que não cobre mais o Last-Event-ID gera "reset"
+  - drain encerra o stream com retry; cliente que sai libera a conexão
+  - quem não é membro recebe 403
+"""
+import asyncio
+import json
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.api.v1 import locations
+from app.core.database import Base
+from app.core.sse import format_event
+from app.core.ws_manager import ConnectionManager
+from app.models.group import Group, GroupMember, GroupRole
+from app.models.user import User
+from app.services import location_events
+
+
+@pytest.fixture
+async def setup(tmp_path, fake_redis):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'sse.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    SessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with SessionLocal() as db:
+        user, outsider = User(name="Ana", email="ana@x.com"), User(name="Bia", email="bia@x.com")
+        group = Group(name="G", invite_code="SSE00001")
+        db.add_all([user, outsider, group])
+        await db.flush()
+        db.add(GroupMember(group_id=group.id, user_id=user.id, role=GroupRole.member))
+        await db.commit()
+
+    async def get_fake_redis():
+        return fake_redis
+
+    manager = ConnectionManager()
+    with (
+        patch.object(locations, "manager", manager),
+        patch.object(locations, "get_redis", get_fake_redis),
+    ):
+        yield SessionLocal, user, outsider, str(group.id), manager, fake_redis
+    for conn in list(manager._outboxes):
+        manager.close(conn)
+    await engine.dispose()
+
+
+async def _open(setup, last_event_id: str | None = None):
+    SessionLocal, user, _, group_id, _, _ = setup
+    async with SessionLocal() as db:
+        response = await locations.stream_group_locations(
+            group_id, last_event_id=last_event_id, db=db, current_user=user,
+        )
+    body = response.body_iterator
+    assert (await _next(body)).startswith("retry:")
+    return response, body
+
+
+async def _next(body) -> str:
+    return await asyncio.wait_for(body.__anext__(), 1.0)
+
+
+def _data(chunk: str) -> dict:
+    line = next(line for line in chunk.splitlines() if line.startswith("data: "))
+    return json.loads(line.removeprefix("data: "))
+
+
+def _position(n: int) -> dict:
+    return {"type": "location_update", "user_id": "u", "user_name": "U", "lat": n, "lng": n, "ts": n}
+
+
+class TestFormat:
+    def test_evento_com_id(self):
+        chunk = format_event({"type": "location_update", "event_id": "5-0", "lat": 1})
+        assert chunk.startswith("id: 5-0\nevent: location_update\ndata: {")
+        assert chunk.endswith("\n\n")
+
+    def test_ping_e_reconnect(self):
+        assert format_event({"type": "ping", "ts": 1}) == ": ping\n\n"
+        assert format_event({"type": "reconnect", "retry_after_ms": 1500}) == "retry: 1500\n\n"
+
+
+class TestStream:
+    async def test_recebe_o_broadcast_do_grupo(self, setup):
+        *_, group_id, manager, redis = setup
+        response, body = await _open(setup)
+        assert response.media_type == "text/event-stream"
+
+        event_ids = await location_events.append(redis, [group_id], _position(1))
+        await manager.broadcast(group_id, {**_position(1), "event_id": event_ids[group_id]})
+        chunk = await _next(body)
+        assert chunk.startswith(f"id: {event_ids[group_id]}\nevent: location_update")
+        assert _data(chunk)["lat"] == 1
+        await body.aclose()
+
+    async def test_last_event_id_reenvia_o_que_faltou(self, setup):
+        *_, group_id, manager, redis = setup
+        ids = [(await location_events.append(redis, [group_id], _position(n)))[group_id] for n in range(3)]
+
+        _, body = await _open(setup, last_event_id=ids[0])
+        assert [_data(await _next(body))["lat"] for _ in range(2)] == [1, 2]
+
+        # Frame já reenviado chegando pelo broadcast não é repetido
+        await manager.broadcast(group_id, {**_position(2), "event_id": ids[2]})
+        new_id = (await location_events.append(redis, [group_id], _position(3)))[group_id]
+        await manager.broadcast(group_id, {**_position(3), "event_id": new_id})
+        assert _data(await _next(body))["lat"] == 3
+        await body.aclose()
+
+    async def test_buffer_sem_o_ponto_de_retomada_envia_reset(self, setup):
+        *_, group_id, _, redis = setup
+        await location_events.append(redis, [group_id], _position(1))
+        _, body = await _open(setup, last_event_id="0-1")
+        assert (await _next(body)).startswith("event: reset")
+        await body.aclose()
+
+    async def test_drain_encerra_com_retry(self, setup):
+        *_, manager, _ = setup
+        _, body = await _open(setup)
+        drain = asyncio.create_task(manager.drain(base_ms=2000, jitter_ms=0))
+        assert await _next(body) == "retry: 2000\n\n"
+        with pytest.raises(StopAsyncIteration):
+            await _next(body)
+        assert await drain == 1
+        assert manager._outboxes == {}
+
+    async def test_cliente_que_sai_libera_a_conexao(self, setup):
+        *_, group_id, manager, _ = setup
+        _, body = await _open(setup)
+        assert group_id in manager.active
+        await body.aclose()
+        assert group_id not in manager.active and manager._outboxes == {}
+
+    async def test_nao_membro_recebe_403(self, setup):
+        SessionLocal, _, outsider, group_id, manager, _ = setup
+        async with SessionLocal() as db:
+            with pytest.raises(HTTPException) as exc:
+                await locations.stream_group_locations(group_id, last_event_id=None, db=db, current_user=outsider)
+        assert exc.value.status_code == 403
+        assert manager._outboxes == {}
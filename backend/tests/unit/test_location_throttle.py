@@ -0,0 +1,137 @@
+"""
+Testes unitários do limite de frames de localização:
+app/core/rate_limit.py (TokenBucket) e app/services/location_throttle.py.
+
+Coberturas:
+  - bucket aceita a rajada, depois repõe à taxa configurada
+  - frames acima do limite são agregados: só o mais recente é processado
+  - conexões do mesmo usuário dividem o bucket por usuário
+  - limite global no Redis adia o frame até a próxima janela
+"""
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from app.core.rate_limit import TokenBucket
+from app.services import location_throttle
+from app.services.location_throttle import FrameThrottle
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestTokenBucket:
+    def test_rajada_e_reposicao(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, capacity=3, clock=clock)
+
+        assert [bucket.take() for _ in range(4)] == [True, True, True, False]
+        assert bucket.wait_time() == pytest.approx(0.5)
+
+        clock.now = 0.5
+        assert bucket.take() is True
+        assert bucket.take() is False
+
+    def test_nao_acumula_acima_da_capacidade(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=1, capacity=2, clock=clock)
+        clock.now = 100
+        assert [bucket.take() for _ in range(3)] == [True, True, False]
+
+
+@pytest.fixture
+def fast_limits():
+    """Rajada de 2 frames e reposição rápida (10 frames/s por conexão) para os testes."""
+    with (
+        patch.object(location_throttle.settings, "LOCATION_UPDATE_INTERVAL_SECONDS", 1),
+        patch.object(location_throttle.settings, "LOCATION_FRAME_BURST", 2),
+        patch.object(location_throttle.settings, "LOCATION_FRAMES_PER_INTERVAL", 10),
+        patch.object(location_throttle.settings, "LOCATION_USER_FRAMES_PER_INTERVAL", 10),
+    ):
+        yield
+
+
+class TestFrameThrottle:
+    async def test_excesso_e_agregado_no_mais_recente(self, fast_limits):
+        processed = []
+
+        async def process(frame):
+            processed.append(frame["n"])
+
+        throttle = FrameThrottle("u1", process)
+        for n in range(10):
+            await throttle.submit({"n": n})
+
+        # Rajada processada na hora; o resto vira um único pendente (o último)
+        assert processed == [0, 1]
+        await asyncio.sleep(0.2)
+        assert processed == [0, 1, 9]
+        assert throttle.stats.received == 10
+        assert throttle.stats.processed == 3
+        assert throttle.stats.throttled == 8
+        assert throttle.stats.coalesced == 7
+        await throttle.close()
+
+    async def test_conexoes_do_mesmo_usuario_dividem_o_limite(self, fast_limits):
+        processed = []
+
+        async def process(frame):
+            processed.append(frame)
+
+        a = FrameThrottle("u1", process)
+        b = FrameThrottle("u1", process)
+        outro = FrameThrottle("u2", process)
+        await a.submit({"c": "a"})
+        await b.submit({"c": "b"})
+        await b.submit({"c": "b"})   # bucket do usuário u1 (rajada de 2) vazio
+        await outro.submit({"c": "outro"})
+
+        assert [f["c"] for f in processed] == ["a", "b", "outro"]
+        assert b.stats.throttled == 1
+        for throttle in (a, b, outro):
+            await throttle.close()
+        assert location_throttle._user_buckets == {}
+
+    async def test_close_descarta_pendente(self, fast_limits):
+        processed = []
+
+        async def process(frame):
+            processed.append(frame)
+
+        throttle = FrameThrottle("u1", process)
+        for n in range(3):
+            await throttle.submit({"n": n})
+        await throttle.close()
+        await asyncio.sleep(0.2)
+
+        assert len(processed) == 2
+
+    async def test_limite_global_no_redis(self, fast_limits, fake_redis):
+        processed = []
+
+        async def process(frame):
+            processed.append(frame)
+
+        with (
+            patch.object(location_throttle.settings, "LOCATION_GLOBAL_LIMIT", True),
+            patch.object(location_throttle.settings, "LOCATION_USER_FRAMES_PER_INTERVAL", 1),
+        ):
+            # Duas conexões em "workers" diferentes: buckets locais separados, contador comum
+            a = FrameThrottle("u1", process, fake_redis)
+            location_throttle._user_buckets.clear()
+            b = FrameThrottle("u1", process, fake_redis)
+
+            await a.submit({"c": "a"})
+            await b.submit({"c": "b"})
+
+        assert [f["c"] for f in processed] == ["a"]
+        assert b.stats.throttled == 1
+        await a.close()
+        await b.close()
+        location_throttle._user_buckets.clear()
@@ -0,0 +1,86 @@
+"""
+Testes do trajeto recente no Redis (app/services/location_track.py).
+
+Coberturas:
+  - registro compacto: ida e volta com precisão de 1e-7 grau
+  - leitura da mais recente para a mais antiga, com limite e intervalo
+  - limite de posições: a cobertura sobe junto com a mais antiga
+  - posições anteriores à criação do set não contam como cobertas
+  - escrita que falha recomeça o set na próxima
+"""
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from app.services import location_track
+
+T0 = 1_700_000_000.0
+
+
+@pytest.fixture(autouse=True)
+def clean_dirty():
+    location_track._dirty.clear()
+    yield
+    location_track._dirty.clear()
+
+
+async def _created_at(redis, user_id: str, ts: float) -> None:
+    """Simula um set criado em `ts` (cobre tudo que veio depois)."""
+    await redis.set(location_track.since_key(user_id), ts)
+
+
+class TestCodec:
+    def test_ida_e_volta(self):
+        member = location_track.encode((T0 + 0.123456, -23.5505199, -46.6333094))
+        assert len(member) == 24
+        ts, lat, lng = location_track.decode(member)
+        assert ts == T0 + 0.123456
+        assert lat == pytest.approx(-23.5505199, abs=1e-7)
+        assert lng == pytest.approx(-46.6333094, abs=1e-7)
+
+    def test_recorded_at_e_inverso_de_stored_ts(self):
+        at = datetime(2026, 3, 1, 12, 30, 0, 123457)
+        assert location_track.recorded_at(location_track.stored_ts(at)) == at
+
+
+class TestAppendRead:
+    async def test_mais_recente_primeiro_com_limite_e_intervalo(self, fake_redis):
+        await location_track.append(fake_redis, {"u": [(T0 + i, -23.5, -46.6 + i / 100) for i in range(10)]})
+        await _created_at(fake_redis, "u", T0)
+
+        points, covered_from = await location_track.read(fake_redis, "u", T0 + 2, T0 + 7, 3)
+        assert [p[0] for p in points] == [T0 + 7, T0 + 6, T0 + 5]
+        assert covered_from == T0
+
+    async def test_sem_set_nao_cobre_nada(self, fake_redis):
+        assert await location_track.read(fake_redis, "u", 0, float("inf"), 10) == ([], None)
+
+    async def test_anteriores_a_criacao_nao_sao_cobertos(self, fake_redis):
+        # Posições antigas de um lote offline: o Postgres pode ter outras no mesmo trecho
+        await location_track.append(fake_redis, {"u": [(T0 + i, -23.5, -46.6) for i in range(3)]})
+        points, covered_from = await location_track.read(fake_redis, "u", 0, float("inf"), 10)
+        assert points == [] and covered_from > T0 + 2
+
+    async def test_limite_de_posicoes_sobe_a_cobertura(self, fake_redis):
+        with patch.object(location_track.settings, "LOCATION_TRACK_MAX_POINTS", 5):
+            await location_track.append(fake_redis, {"u": [(T0 + i, -23.5, -46.6) for i in range(8)]})
+        await _created_at(fake_redis, "u", T0)
+
+        points, covered_from = await location_track.read(fake_redis, "u", 0, float("inf"), 10)
+        assert covered_from == T0 + 3
+        assert [p[0] for p in points] == [T0 + i for i in range(7, 2, -1)]
+
+    async def test_falha_recomeca_o_set(self, fake_redis):
+        await location_track.append(fake_redis, {"u": [(T0, -23.5, -46.6)]})
+        await _created_at(fake_redis, "u", T0)
+
+        with patch.object(fake_redis, "pipeline", side_effect=ConnectionError):
+            await location_track.append(fake_redis, {"u": [(T0 + 1, -23.5, -46.6)]})
+        assert "u" in location_track._dirty
+
+        # A posição T0 + 1 se perdeu: o set recomeça e T0 deixa de contar como coberto
+        await location_track.append(fake_redis, {"u": [(T0 + 2, -23.5, -46.6)]})
+        points, covered_from = await location_track.read(fake_redis, "u", 0, float("inf"), 10)
+        assert covered_from > T0 + 2 and points == []
+        assert location_track._dirty == set()
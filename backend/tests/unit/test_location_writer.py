@@ -0,0 +1,252 @@
+"""
+Testes unitários da gravação em lote de posições (app/services/location_writer.py)
+e do WebSocket de localização sem sessão presa ao socket.
+
+Coberturas:
+  - lote cheio vira um único INSERT
+  - posições que não enchem o lote são gravadas após max_delay
+  - close() grava o restante
+  - mais sockets abertos do que o pool comporta, todos gravando
+  - lote gravado entra no trajeto recente do Redis
+  - falha no INSERT devolve o lote ao buffer, com backoff e limite de tamanho
+"""
+import asyncio
+import uuid
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+from fastapi import WebSocketDisconnect
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.api.v1 import locations
+from app.core.database import Base
+from app.core.security import create_access_token
+from app.core.ws_manager import ConnectionManager
+from app.models.group import Group, GroupMember, GroupRole
+from app.models.location import Location
+from app.models.user import User
+from app.services import location_track
+from app.services.location_writer import LocationWriter
+
+POOL_SIZE = 2
+
+
+@pytest.fixture
+async def small_pool(tmp_path):
+    """Banco SQLite em arquivo com pool de POOL_SIZE conexões e sem overflow."""
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'ws.db'}",
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=POOL_SIZE,
+        max_overflow=0,
+        pool_timeout=0.5,
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine, sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def writer_redis(fake_redis):
+    """O writer acrescenta o lote gravado ao trajeto recente no Redis."""
+    async def get_fake_redis():
+        return fake_redis
+
+    with patch("app.services.location_writer.get_redis", get_fake_redis):
+        yield fake_redis
+
+
+async def _count(SessionLocal) -> int:
+    async with SessionLocal() as db:
+        return (await db.execute(select(func.count()).select_from(Location))).scalar_one()
+
+
+async def _user(SessionLocal) -> uuid.UUID:
+    async with SessionLocal() as db:
+        user = User(name="Ana", email=f"{uuid.uuid4()}@x.com")
+        db.add(user)
+        await db.commit()
+        return user.id
+
+
+class TestLocationWriter:
+    async def test_lote_cheio_vira_um_insert(self, small_pool):
+        engine, SessionLocal = small_pool
+        user_id = await _user(SessionLocal)
+        writer = LocationWriter(SessionLocal, batch_size=5, max_delay=60)
+
+        inserts = []
+
+        @event.listens_for(engine.sync_engine, "before_cursor_execute")
+        def count_inserts(conn, cursor, statement, *args):
+            if statement.startswith("INSERT"):
+                inserts.append(statement)
+
+        for i in range(5):
+            await writer.add(user_id, -23.5 + i / 1000, -46.6, datetime(2026, 1, 1, 12, 0, i))
+
+        assert writer.pending == 0
+        assert await _count(SessionLocal) == 5
+        assert len(inserts) == 1
+        await writer.close()
+
+    async def test_lote_entra_no_trajeto_recente(self, small_pool, writer_redis):
+        _, SessionLocal = small_pool
+        user_id = await _user(SessionLocal)
+        writer = LocationWriter(SessionLocal, batch_size=2, max_delay=60)
+        # Set criado antes das posições: todas cobertas
+        await writer_redis.set(location_track.since_key(user_id), 0)
+
+        await writer.add(user_id, -23.5, -46.6, datetime(2026, 1, 1, 12, 0, 0))
+        await writer.add(user_id, -23.6, -46.6, datetime(2026, 1, 1, 12, 0, 1))
+
+        points, _ = await location_track.read(writer_redis, user_id, 0, float("inf"), 10)
+        assert [p[1] for p in points] == [-23.6, -23.5]
+        await writer.close()
+
+    async def test_grava_apos_max_delay(self, small_pool):
+        _, SessionLocal = small_pool
+        user_id = await _user(SessionLocal)
+        writer = LocationWriter(SessionLocal, batch_size=100, max_delay=0.01)
+
+        await writer.add(user_id, -23.5, -46.6, datetime(2026, 1, 1))
+        assert await _count(SessionLocal) == 0
+
+        await asyncio.sleep(0.05)
+        assert await _count(SessionLocal) == 1
+
+    async def test_close_grava_o_restante(self, small_pool):
+        _, SessionLocal = small_pool
+        user_id = await _user(SessionLocal)
+        writer = LocationWriter(SessionLocal, batch_size=100, max_delay=60)
+
+        await writer.add(user_id, -23.5, -46.6, datetime(2026, 1, 1))
+        await writer.close()
+
+        assert await _count(SessionLocal) == 1
+
+
+def _failing(SessionLocal, failures: int):
+    """session_factory cujas primeiras `failures` sessões não conectam."""
+    calls = []
+
+    def factory():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise ConnectionError("banco fora")
+        return SessionLocal()
+
+    return factory, calls
+
+
+class TestLocationWriterFailure:
+    async def test_falha_devolve_o_lote_e_tenta_de_novo(self, small_pool):
+        _, SessionLocal = small_pool
+        user_id = await _user(SessionLocal)
+        factory, calls = _failing(SessionLocal, failures=2)
+        writer = LocationWriter(factory, batch_size=2, max_delay=0, retry_delay=0.01)
+
+        await writer.add(user_id, -23.5, -46.6, datetime(2026, 1, 1, 12, 0, 0))
+        await writer.add(user_id, -23.6, -46.6, datetime(2026, 1, 1, 12, 0, 1))
+        assert writer.pending == 2 and len(calls) == 1
+
+        await asyncio.sleep(0.1)  # 2ª tentativa falha após 10 ms, a 3ª grava após mais 20 ms
+        assert writer.pending == 0 and len(calls) == 3
+        assert await _count(SessionLocal) == 2
+        await writer.close()
+
+    async def test_lote_cheio_nao_forca_flush_durante_o_backoff(self, small_pool):
+        _, SessionLocal = small_pool
+        user_id = await _user(SessionLocal)
+        factory, calls = _failing(SessionLocal, failures=1)
+        writer = LocationWriter(factory, batch_size=1, max_delay=0, retry_delay=60)
+
+        for i in range(3):
+            await writer.add(user_id, -23.5, -46.6, datetime(2026, 1, 1, 12, 0, i))
+        assert len(calls) == 1 and writer.pending == 3
+
+        await writer.close()  # shutdown tenta uma última vez
+        assert await _count(SessionLocal) == 3
+
+    async def test_buffer_limitado_descarta_as_mais_antigas(self, small_pool):
+        _, SessionLocal = small_pool
+        user_id = await _user(SessionLocal)
+        factory, _ = _failing(SessionLocal, failures=1)
+        writer = LocationWriter(factory, batch_size=4, max_delay=60, max_pending=3, retry_delay=60)
+
+        for i in range(4):
+            await writer.add(user_id, -23.5, -46.6, datetime(2026, 1, 1, 12, 0, i))
+        assert writer.pending == 3
+
+        await writer.close()
+        async with SessionLocal() as db:
+            seconds = (await db.execute(select(Location.recorded_at).order_by(Location.recorded_at))).scalars()
+            assert [at.second for at in seconds] == [1, 2, 3]
+
+
+# ── WebSocket ────────────────────────────────────────────────────────────────
+
+class FakeWebSocket:
+    """Envia os frames dados e só desconecta depois que todos os sockets abriram."""
+
+    def __init__(self, frames: list[dict], all_open: asyncio.Barrier):
+        self.frames = list(frames)
+        self.all_open = all_open
+        self.sent: list[dict] = []
+
+    async def accept(self) -> None:
+        pass
+
+    async def receive_json(self) -> dict:
+        if self.frames:
+            return self.frames.pop(0)
+        await self.all_open.wait()
+        raise WebSocketDisconnect()
+
+    async def send_json(self, data: dict) -> None:
+        self.sent.append(data)
+
+
+class TestLocationWebSocket:
+    async def test_mais_sockets_que_o_pool(self, small_pool, fake_redis):
+        _, SessionLocal = small_pool
+        sockets = POOL_SIZE * 3
+
+        async with SessionLocal() as db:
+            group = Group(name="Turma", invite_code="WSPOOL01")
+            users = [User(name=f"U{i}", email=f"u{i}@x.com") for i in range(sockets)]
+            db.add_all([group, *users])
+            await db.flush()
+            db.add_all([GroupMember(group_id=group.id, user_id=u.id, role=GroupRole.member) for u in users])
+            await db.commit()
+
+        # Cada socket manda 3 posições ~1 km distantes (todas persistidas pelo throttle)
+        all_open = asyncio.Barrier(sockets)
+        frames = [{"lat": -23.5 + i / 100, "lng": -46.6} for i in range(3)]
+
+        async def get_fake_redis():
+            return fake_redis
+
+        writer = LocationWriter(SessionLocal, batch_size=4, max_delay=60)
+        with (
+            patch.object(locations, "AsyncSessionLocal", SessionLocal),
+            patch.object(locations, "writer", writer),
+            patch.object(locations, "manager", ConnectionManager()),
+            patch.object(locations, "get_redis", get_fake_redis),
+        ):
+            await asyncio.wait_for(asyncio.gather(*(
+                locations.location_ws(
+                    FakeWebSocket(frames, all_open),
+                    token=create_access_token({"sub": str(u.id)}),
+                    group_id=str(group.id),
+                )
+                for u in users
+            )), timeout=10)
+            await writer.close()
+
+        assert await _count(SessionLocal) == sockets * len(frames)
@@ -0,0 +1,111 @@
+"""
+Testes unitários de app/services/media.py
+
+Coberturas:
+  - generate_derivatives: thumbnail de JPEG/PNG, poster + thumbnail de vídeo,
+    vídeo sem quadro extraível
+  - save_derivatives: grava as chaves na mensagem e invalida o cache do grupo
+  - schedule_processing: publish no broker fora do event loop; falha só é logada
+
+S3 substituído pelo FakeS3; ffmpeg substituído por patch em _extract_frame.
+"""
+import asyncio
+import io
+import threading
+import time
+import uuid
+from unittest.mock import patch
+
+from PIL import Image
+
+from app.core.config import settings
+from app.models.group import Group
+from app.models.message import Message
+from app.models.user import User
+from app.services import media
+
+
+def _image_bytes(fmt: str, size=(1600, 900), mode="RGB") -> bytes:
+    buf = io.BytesIO()
+    Image.new(mode, size, "red").save(buf, fmt)
+    return buf.getvalue()
+
+
+def _dimensions(data: bytes) -> tuple[int, int]:
+    return Image.open(io.BytesIO(data)).size
+
+
+class TestGenerateDerivatives:
+    def test_jpeg_gera_thumbnail_reduzido(self, fake_s3):
+        fake_s3.objects["grupos/g/a.jpg"] = _image_bytes("JPEG")
+        result = media.generate_derivatives("grupos/g/a.jpg")
+
+        assert result == {"thumbnail_key": "grupos/g/a_thumb.jpg"}
+        assert max(_dimensions(fake_s3.objects["grupos/g/a_thumb.jpg"])) == settings.MEDIA_THUMBNAIL_SIZE
+
+    def test_png_com_transparencia_vira_jpeg(self, fake_s3):
+        fake_s3.objects["grupos/g/b.png"] = _image_bytes("PNG", mode="RGBA")
+        result = media.generate_derivatives("grupos/g/b.png")
+
+        thumb = Image.open(io.BytesIO(fake_s3.objects[result["thumbnail_key"]]))
+        assert thumb.format == "JPEG"
+
+    def test_video_gera_poster_e_thumbnail(self, fake_s3):
+        fake_s3.objects["grupos/g/v.mp4"] = b"\0\0\0\x18ftypmp42"
+        frame = _image_bytes("JPEG", size=(1920, 1080))
+        with patch.object(media, "_extract_frame", return_value=frame):
+            result = media.generate_derivatives("grupos/g/v.mp4")
+
+        assert result == {
+            "poster_key": "grupos/g/v_poster.jpg",
+            "thumbnail_key": "grupos/g/v_thumb.jpg",
+        }
+        assert max(_dimensions(fake_s3.objects["grupos/g/v_poster.jpg"])) == settings.MEDIA_POSTER_SIZE
+
+    def test_video_sem_quadro_nao_gera_nada(self, fake_s3):
+        fake_s3.objects["grupos/g/v.mp4"] = b"corrompido"
+        with patch.object(media, "_extract_frame", return_value=None):
+            assert media.generate_derivatives("grupos/g/v.mp4") == {}
+
+
+class TestSaveDerivatives:
+    async def test_grava_chaves_e_invalida_cache(self, db_session, fake_redis):
+        user = User(name="U", email="u@x.com")
+        group = Group(name="G", invite_code="ABC123")
+        db_session.add_all([user, group])
+        await db_session.flush()
+        message = Message(group_id=group.id, sender_id=user.id, type="image", media_key="grupos/g/a.jpg")
+        db_session.add(message)
+        await db_session.commit()
+        await fake_redis.rpush(f"msg:recent:{group.id}", "{}")
+
+        await media.save_derivatives(db_session, fake_redis, message.id, {"thumbnail_key": "grupos/g/a_thumb.jpg"})
+
+        await db_session.refresh(message)
+        assert message.thumbnail_key == "grupos/g/a_thumb.jpg"
+        assert await fake_redis.exists(f"msg:recent:{group.id}") == 0
+
+
+class TestScheduleProcessing:
+    async def test_delay_roda_fora_do_event_loop(self):
+        threads = []
+
+        def slow_delay(message_id, media_key):
+            time.sleep(0.2)  # broker lento
+            threads.append(threading.current_thread())
+
+        with patch("app.workers.media.process_media_task") as task:
+            task.delay.side_effect = slow_delay
+            started = time.perf_counter()
+            media.schedule_processing(uuid.uuid4(), "grupos/g/a.jpg")
+            assert time.perf_counter() - started < 0.1
+            await asyncio.gather(*media._running)
+
+        assert threads and threads[0] is not threading.main_thread()
+
+    async def test_broker_fora_so_loga(self, caplog):
+        with patch("app.workers.media.process_media_task") as task:
+            task.delay.side_effect = ConnectionError
+            media.schedule_processing(uuid.uuid4(), "grupos/g/a.jpg")
+            await asyncio.gather(*media._running)
+        assert "Falha ao enfileirar processamento de grupos/g/a.jpg" in caplog.text
@@ -0,0 +1,118 @@
+"""
+Testes unitários da presença (app/services/presence.py).
+
+Coberturas:
+  - heartbeat entra no sorted set do grupo e aparece em online()
+  - heartbeats repetidos no intervalo não voltam ao Redis
+  - quem saiu da janela não está online
+  - flush grava last_seen_at de vários usuários num único UPDATE em lote
+  - flush não regride um last_seen_at mais novo
+"""
+import time
+import uuid
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base
+from app.models.user import User
+from app.services.presence import Presence, online, presence_key
+from tests.conftest import FakeRedis
+
+
+@pytest.fixture
+async def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'presence.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine, sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+async def _users(SessionLocal, n: int) -> list[uuid.UUID]:
+    async with SessionLocal() as db:
+        users = [User(name=f"U{i}", email=f"{uuid.uuid4()}@x.com") for i in range(n)]
+        db.add_all(users)
+        await db.commit()
+        return [u.id for u in users]
+
+
+class TestHeartbeat:
+    async def test_heartbeat_aparece_online(self):
+        redis, gid, uid = FakeRedis(), uuid.uuid4(), uuid.uuid4()
+        await Presence().heartbeat(redis, uid, [gid])
+        assert await online(redis, gid) == [str(uid)]
+
+    async def test_heartbeats_no_intervalo_nao_vao_ao_redis(self):
+        redis, gid, uid = FakeRedis(), uuid.uuid4(), uuid.uuid4()
+        tracker = Presence()
+        await tracker.heartbeat(redis, uid, [gid])
+        await redis.delete(presence_key(gid))
+
+        await tracker.heartbeat(redis, uid, [gid])
+        assert await online(redis, gid) == []
+
+    async def test_fora_da_janela_esta_offline(self):
+        redis, gid = FakeRedis(), uuid.uuid4()
+        await redis.zadd(presence_key(gid), {"antigo": time.time() - 3600})
+        assert await online(redis, gid) == []
+
+    async def test_heartbeat_em_varios_grupos(self):
+        redis, uid = FakeRedis(), uuid.uuid4()
+        groups = [uuid.uuid4() for _ in range(3)]
+        await Presence().heartbeat(redis, uid, groups)
+        for gid in groups:
+            assert await online(redis, gid) == [str(uid)]
+
+
+class TestFlush:
+    async def test_flush_grava_em_um_update(self, session_factory):
+        engine, SessionLocal = session_factory
+        ids = await _users(SessionLocal, 5)
+        tracker = Presence()
+        for uid in ids:
+            tracker.touch(uid)
+
+        statements = []
+        event.listen(engine.sync_engine, "before_cursor_execute",
+                     lambda conn, cursor, stmt, params, ctx, many: statements.append((stmt, many)))
+        assert await tracker.flush(SessionLocal) == 5
+        assert tracker.pending == 0
+
+        updates = [(stmt, many) for stmt, many in statements if stmt.startswith("UPDATE")]
+        assert len(updates) == 1 and updates[0][1]  # executemany
+        async with SessionLocal() as db:
+            seen = (await db.execute(select(User.last_seen_at))).scalars().all()
+        assert all(at is not None for at in seen)
+
+    async def test_flush_nao_regride_last_seen(self, session_factory):
+        _, SessionLocal = session_factory
+        (uid,) = await _users(SessionLocal, 1)
+        future = datetime.utcnow() + timedelta(hours=1)
+        async with SessionLocal() as db:
+            user = await db.get(User, uid)
+            user.last_seen_at = future
+            await db.commit()
+
+        tracker = Presence()
+        tracker.touch(uid)
+        await tracker.flush(SessionLocal)
+        async with SessionLocal() as db:
+            assert (await db.get(User, uid)).last_seen_at == future
+
+    async def test_flush_sem_pendentes_nao_abre_sessao(self):
+        def boom():
+            raise AssertionError("sessão aberta sem nada a gravar")
+        assert await Presence().flush(boom) == 0
+
+    async def test_falha_devolve_ao_buffer(self, session_factory):
+        _, SessionLocal = session_factory
+        tracker = Presence()
+        tracker.touch(uuid.uuid4())
+        with patch.object(AsyncSession, "commit", side_effect=RuntimeError("db fora")):
+            assert await tracker.flush(SessionLocal) == 0
+        assert tracker.pending == 1
@@ -0,0 +1,57 @@
+"""
+Testes unitários de app/core/push.py (send_multicast)
+
+Coberturas:
+  - divisão em lotes de PUSH_BATCH_SIZE
+  - tokens inválidos são reportados para remoção
+  - falha transitória é reenviada só para os tokens afetados
+  - retries esgotados contam como falha
+
+Usa o FakePushProvider do próprio módulo.
+"""
+from unittest.mock import patch
+
+from app.core import push
+from app.core.config import settings
+from app.core.push import FakePushProvider, PushNotification, send_multicast
+
+NOTIFICATION = PushNotification(title="SOS", body="ajuda")
+
+
+class TestSendMulticast:
+    async def test_divide_em_lotes(self):
+        provider = FakePushProvider()
+        tokens = [f"t{i}" for i in range(1200)]
+        result = await send_multicast(provider, tokens, NOTIFICATION)
+
+        assert result.sent == 1200
+        assert sorted(len(b) for b in provider.batches) == [200, 500, 500]
+
+    async def test_tokens_invalidos_sao_reportados(self):
+        provider = FakePushProvider()
+        result = await send_multicast(provider, ["ok1", "invalid-1", "ok2"], NOTIFICATION)
+
+        assert result.sent == 2
+        assert result.invalid_tokens == ["invalid-1"]
+
+    async def test_falha_transitoria_reenvia_so_o_token_afetado(self):
+        provider = FakePushProvider()
+        provider.overrides["t2"] = [push.RETRY, push.RETRY]
+        with patch.object(settings, "PUSH_RETRY_BASE_SECONDS", 0.0):
+            result = await send_multicast(provider, ["t1", "t2"], NOTIFICATION)
+
+        assert result.sent == 2
+        assert provider.batches == [["t1", "t2"], ["t2"], ["t2"]]
+
+    async def test_retries_esgotados_contam_como_falha(self):
+        provider = FakePushProvider()
+        provider.overrides["t1"] = [push.RETRY] * 10
+        with (
+            patch.object(settings, "PUSH_RETRY_BASE_SECONDS", 0.0),
+            patch.object(settings, "PUSH_MAX_RETRIES", 2),
+        ):
+            result = await send_multicast(provider, ["t1"], NOTIFICATION)
+
+        assert result.sent == 0
+        assert result.failed == 1
+        assert len(provider.batches) == 3
@@ -0,0 +1,47 @@
+"""
+Testes unitários da janela deslizante em memória (app/core/rate_limit.py).
+O RedisSlidingWindow tem a mesma semântica, num script Lua — medido em
+benchmarks/rate_limit.py contra um Redis real.
+"""
+import pytest
+
+from app.core.rate_limit import MemorySlidingWindow
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestMemorySlidingWindow:
+    async def test_limite_e_retry_after(self):
+        clock = FakeClock()
+        limiter = MemorySlidingWindow(clock)
+
+        assert [await limiter.hit([("k", 2)], 60) for _ in range(2)] == [0, 0]
+        assert await limiter.hit([("k", 2)], 60) == pytest.approx(60)
+
+        clock.now += 30
+        assert await limiter.hit([("k", 2)], 60) == pytest.approx(30)
+
+    async def test_janela_desliza(self):
+        clock = FakeClock()
+        limiter = MemorySlidingWindow(clock)
+        await limiter.hit([("k", 2)], 60)
+        clock.now += 40
+        await limiter.hit([("k", 2)], 60)
+
+        clock.now += 21  # a primeira tentativa saiu da janela, a segunda não
+        assert await limiter.hit([("k", 2)], 60) == 0
+        assert await limiter.hit([("k", 2)], 60) > 0
+
+    async def test_tentativa_bloqueada_nao_conta_em_nenhuma_chave(self):
+        limiter = MemorySlidingWindow(FakeClock())
+        await limiter.hit([("email", 1)], 60)
+
+        # IP ainda livre, mas o e-mail estourou: nada é registrado para o IP
+        assert await limiter.hit([("ip", 2), ("email", 1)], 60) > 0
+        assert await limiter.hit([("ip", 1)], 60) == 0
@@ -0,0 +1,119 @@
+"""
+Testes unitários das migrações (migrations/) e da checagem de schema no
+startup (app/core/schema.py).
+"""
+import uuid
+
+import pytest
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core import schema
+from app.core.database import Base
+
+
+def _alembic_config(db_path) -> Config:
+    cfg = Config("alembic.ini")
+    cfg.set_main_option("sqlalchemy.url", f"sqlite+aiosqlite:///{db_path}")
+    cfg.attributes["configure_logger"] = False
+    return cfg
+
+
+class TestMigrations:
+    def test_revisao_do_codigo_e_o_head(self):
+        head = ScriptDirectory.from_config(Config("alembic.ini")).get_current_head()
+        assert schema.SCHEMA_REVISION == head
+
+    def test_upgrade_gera_o_schema_dos_models(self, tmp_path):
+        db_path = tmp_path / "migrated.db"
+        command.upgrade(_alembic_config(db_path), "head")
+
+        engine = create_engine(f"sqlite:///{db_path}")
+        with engine.connect() as conn:
+            # Tipos não são comparados: o SQLite reflete UUID como NUMERIC
+            context = MigrationContext.configure(conn, opts={"compare_type": False})
+            diff = compare_metadata(context, Base.metadata)
+        engine.dispose()
+        assert diff == []
+
+    def test_0002_deduplica_membros_e_preenche_grupo_do_sos(self, tmp_path):
+        # Banco criado pelo create_all antigo (= 0001), com dados legados
+        db_path = tmp_path / "legacy.db"
+        cfg = _alembic_config(db_path)
+        command.upgrade(cfg, "0001")
+        user, group, orphan = (uuid.uuid4().hex for _ in range(3))
+        engine = create_engine(f"sqlite:///{db_path}")
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO users (id, email, name) VALUES (:a, 'a@x.com', 'A'), (:b, 'b@x.com', 'B')"),
+                         {"a": user, "b": orphan})
+            conn.execute(text("INSERT INTO groups (id, name) VALUES (:g, 'G')"), {"g": group})
+            for role, joined in (("member", "2026-01-01"), ("admin", "2026-02-01"), ("member", "2026-03-01")):
+                conn.execute(
+                    text("INSERT INTO group_members (id, group_id, user_id, role, joined_at) VALUES (:id, :g, :u, :r, :j)"),
+                    {"id": uuid.uuid4().hex, "g": group, "u": user, "r": role, "j": joined},
+                )
+            for owner in (user, orphan):
+                conn.execute(text("INSERT INTO sos_events (id, user_id, latitude, longitude) VALUES (:id, :u, 0, 0)"),
+                             {"id": uuid.uuid4().hex, "u": owner})
+
+        command.upgrade(cfg, "head")
+        with engine.connect() as conn:
+            members = conn.execute(text("SELECT role FROM group_members")).scalars().all()
+            sos = conn.execute(text("SELECT user_id, group_id FROM sos_events")).all()
+        engine.dispose()
+        assert members == ["admin"]
+        assert sos == [(user, group)]  # SOS sem grupo é descartado
+
+    def test_downgrade_remove_tudo(self, tmp_path):
+        db_path = tmp_path / "migrated.db"
+        cfg = _alembic_config(db_path)
+        command.upgrade(cfg, "head")
+        command.downgrade(cfg, "base")
+
+        engine = create_engine(f"sqlite:///{db_path}")
+        with engine.connect() as conn:
+            tables = conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'")).scalars().all()
+        engine.dispose()
+        assert set(tables) <= {"alembic_version"}
+
+
+class TestVerifySchema:
+    @pytest.fixture
+    async def engine(self):
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        yield engine
+        await engine.dispose()
+
+    async def _stamp(self, engine, revision: str) -> None:
+        async with engine.begin() as conn:
+            await conn.execute(text("CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL)"))
+            await conn.execute(text("INSERT INTO alembic_version VALUES (:r)"), {"r": revision})
+
+    async def test_banco_nao_migrado_falha(self, engine):
+        with pytest.raises(schema.SchemaMismatchError, match="alembic upgrade head"):
+            await schema.verify_schema(engine)
+
+    async def test_revisao_atual_passa(self, engine):
+        await self._stamp(engine, schema.SCHEMA_REVISION)
+        await schema.prepare_schema(engine, "verify")
+
+    async def test_revisao_antiga_falha(self, engine):
+        await self._stamp(engine, "0000")
+        with pytest.raises(schema.SchemaMismatchError):
+            await schema.verify_schema(engine)
+
+    async def test_revisao_mais_nova_passa(self, engine):
+        # Rolling deploy: migração já aplicada, worker antigo reiniciando
+        await self._stamp(engine, "9999")
+        await schema.verify_schema(engine)
+
+    async def test_modo_create_cria_tabelas(self, engine):
+        await schema.prepare_schema(engine, "create")
+        async with engine.connect() as conn:
+            tables = (await conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'"))).scalars().all()
+        assert "users" in tables
@@ -7,10 +7,13 @@ Coberturas:
   - create_access_token: payload correto, tipo "access"
   - create_refresh_token: tipo "refresh"
   - decode_token: payload retornado, token expirado (401), token inválido (401)
+  - TokenService: EdDSA com chave pública, adulteração, cache de verificação
 
 Nenhuma dependência externa (banco/Redis) necessária.
 """
+import time
 from datetime import timedelta
+from unittest.mock import patch
 
 import jwt
 import pytest
@@ -18,6 +21,7 @@ from fastapi import HTTPException
 
 from app.core.config import settings
 from app.core.security import (
+    TokenService,
     create_access_token,
     create_refresh_token,
     decode_token,
@@ -144,3 +148,76 @@ class TestDecodeToken:
         with pytest.raises(HTTPException) as exc:
             decode_token("isto_nao_e_um_jwt")
         assert exc.value.status_code == 401
+
+
+# ── TokenService ──────────────────────────────────────────────────────────────
+
+def _ed25519_pems() -> tuple[str, str]:
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+    key = Ed25519PrivateKey.generate()
+    private = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    public = key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    return private, public
+
+
+class TestTokenService:
+    def test_tokens_do_mesmo_segundo_sao_distintos(self):
+        assert create_access_token({"sub": "u"}) != create_access_token({"sub": "u"})
+
+    def test_eddsa_verificado_so_com_a_chave_publica(self):
+        private, public = _ed25519_pems()
+        issuer = TokenService("EdDSA", private, public, key_id="k1")
+        verifier = TokenService("EdDSA", "", public)
+
+        token = issuer.encode({"sub": "abc"}, "access", timedelta(minutes=5))
+
+        assert verifier.decode(token)["sub"] == "abc"
+        # Interoperável com o PyJWT (outros serviços)
+        assert jwt.decode(token, public, algorithms=["EdDSA"])["type"] == "access"
+        assert jwt.get_unverified_header(token)["kid"] == "k1"
+        assert issuer.jwks()["keys"][0]["kty"] == "OKP"
+
+    def test_algoritmo_diferente_e_rejeitado(self):
+        _, public = _ed25519_pems()
+        token = jwt.encode({"sub": "x"}, "outra-chave", algorithm="HS256")
+        with pytest.raises(HTTPException):
+            TokenService("EdDSA", "", public).decode(token)
+
+    def test_assinatura_adulterada_lanca_401(self):
+        service = TokenService("HS256", "segredo", "segredo")
+        header, payload, signature = service.encode({"sub": "a"}, "access", timedelta(minutes=5)).split(".")
+        forged = jwt.utils.base64url_encode(b'{"sub":"admin","type":"access"}').decode()
+        with pytest.raises(HTTPException):
+            service.decode(f"{header}.{forged}.{signature}")
+
+    def test_cache_evita_reverificacao(self):
+        service = TokenService("HS256", "segredo", "segredo")
+        token = service.encode({"sub": "a"}, "access", timedelta(minutes=5))
+
+        with patch.object(service, "_verify", wraps=service._verify) as verify:
+            first = service.decode(token)
+            first["sub"] = "alterado"   # cópia: não contamina o cache
+            assert service.decode(token)["sub"] == "a"
+        assert verify.call_count == 1
+
+    def test_cache_nao_passa_do_exp(self):
+        service = TokenService("HS256", "segredo", "segredo", cache_ttl=3600)
+        token = service.encode({"sub": "a"}, "access", timedelta(seconds=1))
+        service.decode(token)
+
+        with patch("app.core.security.time.time", return_value=time.time() + 5):
+            with pytest.raises(HTTPException) as exc:
+                service.decode(token)
+        assert exc.value.detail == "Token expirado"
+
+    def test_cache_limitado(self):
+        service = TokenService("HS256", "segredo", "segredo", cache_size=2)
+        for _ in range(3):
+            service.decode(service.encode({"sub": "a"}, "access", timedelta(minutes=5)))
+        assert len(service._cache) == 2
@@ -0,0 +1,35 @@
+"""
+Testes unitários do cache de revogações (app/services/sessions.py).
+O fluxo completo (rotação, reuso, logout-all) está em tests/integration/test_auth.py.
+"""
+import time
+
+from app.services.sessions import REVOKED_BEFORE_KEY, RevocationCache
+
+
+class TestRevocationCache:
+    def test_revoga_so_tokens_anteriores(self):
+        cache = RevocationCache()
+        cache.apply("u1", 100.0)
+
+        assert cache.is_revoked("u1", 99.9)
+        assert cache.is_revoked("u1", None)      # token sem iat
+        assert not cache.is_revoked("u1", 100.0)
+        assert not cache.is_revoked("u2", 0)
+
+    def test_watermark_nunca_recua(self):
+        cache = RevocationCache()
+        cache.apply("u1", 200.0)
+        cache.apply("u1", 100.0)   # mensagem atrasada do pub/sub
+        assert cache.is_revoked("u1", 150.0)
+
+    async def test_load_poda_revogacoes_antigas(self, fake_redis):
+        now = time.time()
+        await fake_redis.hset(REVOKED_BEFORE_KEY, mapping={"recente": now - 60, "antigo": now - 400 * 86400})
+
+        cache = RevocationCache()
+        await cache.load(fake_redis)
+
+        assert cache.is_revoked("recente", now - 120)
+        assert not cache.is_revoked("antigo", 0)
+        assert list(await fake_redis.hgetall(REVOKED_BEFORE_KEY)) == ["recente"]
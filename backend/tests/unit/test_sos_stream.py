@@ -0,0 +1,111 @@
+"""
+Testes unitários do log de SOS em Redis Streams (app/services/sos_stream.py):
+reentrega após falha do consumidor, dead-letter após SOS_MAX_DELIVERIES, tail
+do broadcast e persistência idempotente.
+"""
+import uuid
+from unittest.mock import patch
+
+from app.core.ws_manager import ConnectionManager
+from app.models.group import Group
+from app.models.message import SOSEvent
+from app.models.user import User
+from app.services import sos, sos_stream
+
+
+def _entry(user_id=None, group_id=None) -> dict:
+    user = User(id=user_id or uuid.uuid4(), name="Ana")
+    return sos.triggered_entry(user, group_id or uuid.uuid4(), -23.5, -46.6, None)
+
+
+class TestConsume:
+    async def test_confirma_so_o_que_foi_processado(self, fake_redis):
+        await sos_stream.ensure_groups(fake_redis)
+        await sos_stream.append(fake_redis, _entry())
+
+        async def crash(entry):
+            raise RuntimeError("worker morreu")
+
+        assert await sos_stream.consume(fake_redis, sos_stream.NOTIFY, "a", crash) == 1
+
+        # Entrada continua pendente: outro consumidor a reassume após o tempo ocioso
+        handled = []
+
+        async def ok(entry):
+            handled.append(entry["event_id"])
+
+        with patch("app.services.sos_stream.settings.SOS_CLAIM_IDLE_MS", 0):
+            assert await sos_stream.consume(fake_redis, sos_stream.NOTIFY, "b", ok) == 1
+            assert await sos_stream.consume(fake_redis, sos_stream.NOTIFY, "b", ok) == 0
+        assert len(handled) == 1
+
+    async def test_desiste_apos_max_entregas(self, fake_redis):
+        await sos_stream.ensure_groups(fake_redis)
+        entry = _entry()
+        await sos_stream.append(fake_redis, entry)
+        attempts = []
+
+        async def always_fails(e):
+            attempts.append(e["event_id"])
+            raise RuntimeError("entrada envenenada")
+
+        with (
+            patch("app.services.sos_stream.settings.SOS_CLAIM_IDLE_MS", 0),
+            patch("app.services.sos_stream.settings.SOS_MAX_DELIVERIES", 3),
+        ):
+            for _ in range(4):
+                assert await sos_stream.consume(fake_redis, sos_stream.NOTIFY, "a", always_fails) == 1
+            assert await sos_stream.consume(fake_redis, sos_stream.NOTIFY, "a", always_fails) == 0
+
+        assert len(attempts) == 3
+        [(_, dead)] = await fake_redis.xrange(sos_stream.dead_letter_key(sos_stream.NOTIFY))
+        assert dead["event_id"] == entry["event_id"] and dead["entry_id"]
+        # Só o grupo que desistiu: o persist ainda recebe a entrada
+        assert await fake_redis.xrange(sos_stream.dead_letter_key(sos_stream.PERSIST)) == []
+
+    async def test_grupos_consomem_independentemente(self, fake_redis):
+        await sos_stream.ensure_groups(fake_redis)
+        await sos_stream.ensure_groups(fake_redis)   # BUSYGROUP é ignorado
+        await sos_stream.append(fake_redis, _entry())
+
+        async def noop(entry):
+            pass
+
+        assert await sos_stream.consume(fake_redis, sos_stream.PERSIST, "a", noop) == 1
+        assert await sos_stream.consume(fake_redis, sos_stream.NOTIFY, "a", noop) == 1
+
+
+class TestTail:
+    async def test_broadcast_parte_do_head(self, fake_redis):
+        await sos_stream.append(fake_redis, _entry())
+        last_id = await sos_stream.head(fake_redis)
+        entry = _entry()
+        await sos_stream.append(fake_redis, entry)
+
+        manager = ConnectionManager()
+        frames = []
+
+        async def broadcast(e):
+            frames.append(sos.sos_frame(e))
+
+        last_id = await sos_stream.tail(fake_redis, last_id, broadcast)
+        assert [f["event_id"] for f in frames] == [entry["event_id"]]
+        assert await sos_stream.tail(fake_redis, last_id, broadcast) == last_id
+        assert len(frames) == 1
+        assert manager.active == {}
+
+
+class TestPersist:
+    async def test_reentrega_nao_duplica(self, db_session, fake_redis):
+        user = User(name="Ana", email="ana@x.com")
+        group = Group(name="G", invite_code="PERSIST1")
+        db_session.add_all([user, group])
+        await db_session.commit()
+        entry = _entry(user.id, group.id)
+
+        await sos.persist_entry(db_session, fake_redis, entry)
+        await sos.persist_entry(db_session, fake_redis, entry)
+
+        event = await db_session.get(SOSEvent, uuid.UUID(entry["event_id"]))
+        assert event.latitude == -23.5
+        assert event.resolved is False
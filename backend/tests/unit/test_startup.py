@@ -0,0 +1,18 @@
+"""
+Testes unitários do boot do worker (benchmarks/startup_time.py):
+clientes pesados (boto3, firebase-admin, httpx, Celery, Pillow) não podem
+ser importados por `import main` — só no primeiro uso.
+"""
+from benchmarks.startup_time import LAZY_MODULES, profile_once
+
+
+class TestStartupImports:
+    def test_main_nao_importa_clientes_pesados(self):
+        profile = profile_once("main")
+        assert profile.loaded_lazy_modules() == []
+        assert "app.api.v1.messages" in profile.cumulative_us
+
+    def test_worker_celery_carrega_a_tarefa_de_midia(self):
+        profile = profile_once("app.workers.media")
+        assert "celery" in profile.loaded_lazy_modules()
+        assert "celery" in LAZY_MODULES
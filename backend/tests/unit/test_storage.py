@@ -0,0 +1,87 @@
+"""
+Testes unitários de app/core/storage.py
+
+Coberturas:
+  - check_content_type: tipos permitidos e recusados (415)
+  - stream_upload: PUT simples, multipart em partes, concorrência limitada,
+    tamanho máximo (413) com abort do multipart, magic bytes (415)
+  - presigned_upload: condições de tipo e tamanho
+
+S3 substituído pelo FakeS3 (ver conftest.py).
+"""
+import io
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from starlette.datastructures import Headers
+
+from app.core import storage
+from app.core.config import settings
+
+MB = 1024 * 1024
+PNG = b"\x89PNG\r\n\x1a\n"
+
+
+def _upload_file(data: bytes, content_type: str = "image/png") -> UploadFile:
+    return UploadFile(
+        file=io.BytesIO(data),
+        size=len(data),
+        headers=Headers({"content-type": content_type}),
+    )
+
+
+class TestCheckContentType:
+    def test_tipo_permitido(self):
+        assert storage.check_content_type("image/png") == "image/png"
+
+    def test_tipo_nao_permitido_lanca_415(self):
+        with pytest.raises(HTTPException) as exc:
+            storage.check_content_type("application/pdf")
+        assert exc.value.status_code == 415
+
+
+class TestStreamUpload:
+    async def test_arquivo_pequeno_vai_em_put_simples(self, fake_s3):
+        data = PNG + b"x" * 1000
+        size = await storage.stream_upload(_upload_file(data), "k/small.png", "image/png")
+        assert size == len(data)
+        assert fake_s3.objects["k/small.png"] == data
+        assert fake_s3.uploads == {}
+
+    async def test_arquivo_grande_vai_em_partes(self, fake_s3):
+        data = PNG + bytes(range(256)) * (12 * MB // 256)
+        size = await storage.stream_upload(_upload_file(data), "k/big.png", "image/png")
+        assert size == len(data)
+        assert fake_s3.objects["k/big.png"] == data
+
+    async def test_concorrencia_limitada(self, fake_s3):
+        fake_s3.part_delay = 0.05
+        data = PNG + b"\0" * (26 * MB)
+        with patch.object(settings, "S3_UPLOAD_CONCURRENCY", 2):
+            await storage.stream_upload(_upload_file(data), "k/video.png", "image/png")
+        assert fake_s3.max_parallel_parts <= 2
+        assert fake_s3.objects["k/video.png"] == data
+
+    async def test_excede_tamanho_lanca_413_e_aborta(self, fake_s3):
+        data = PNG + b"\0" * (12 * MB)
+        file = _upload_file(data)
+        file.size = None  # sem Content-Length conhecido: detecta durante a leitura
+        with patch.object(settings, "MAX_UPLOAD_SIZE_MB", 8):
+            with pytest.raises(HTTPException) as exc:
+                await storage.stream_upload(file, "k/huge.png", "image/png")
+        assert exc.value.status_code == 413
+        assert fake_s3.aborted
+        assert "k/huge.png" not in fake_s3.objects
+
+    async def test_conteudo_diferente_do_tipo_lanca_415(self, fake_s3):
+        with pytest.raises(HTTPException) as exc:
+            await storage.stream_upload(_upload_file(b"GIF89a..."), "k/x.png", "image/png")
+        assert exc.value.status_code == 415
+
+
+class TestPresignedUpload:
+    def test_condicoes_de_tipo_e_tamanho(self, fake_s3):
+        post = storage.presigned_upload("k/v.mp4", "video/mp4")
+        assert post["fields"]["key"] == "k/v.mp4"
+        assert ["content-length-range", 1, settings.MAX_UPLOAD_SIZE_MB * MB] in post["conditions"]
@@ -0,0 +1,79 @@
+"""
+Testes unitários do índice de viewports (app/core/ws_interest.py).
+
+Coberturas:
+  - contains: retângulo, raio e retângulo que cruza o antimeridiano
+  - viewports inválidos são recusados
+  - o índice só devolve conexões cujo viewport contém a posição
+  - conexões sem viewport recebem tudo; viewports enormes vão para a lista larga
+  - remove/add limpam as células antigas
+"""
+import pytest
+
+from app.core.ws_interest import InterestIndex, Viewport
+
+
+class TestViewport:
+    def test_bbox(self):
+        vp = Viewport.from_bbox(-24.0, -47.0, -23.0, -46.0)
+        assert vp.contains(-23.5, -46.6)
+        assert not vp.contains(-22.9, -43.2)
+
+    def test_raio_usa_a_distancia_e_nao_so_o_retangulo(self):
+        vp = Viewport.from_radius(0.0, 0.0, 1000)
+        assert vp.contains(0.005, 0.005)      # ~790 m
+        assert not vp.contains(0.008, 0.008)  # ~1260 m: dentro do retângulo, fora do raio
+
+    def test_antimeridiano(self):
+        vp = Viewport.from_bbox(-20.0, 170.0, -10.0, -170.0)
+        assert vp.contains(-15.0, 179.0)
+        assert vp.contains(-15.0, -175.0)
+        assert not vp.contains(-15.0, 0.0)
+
+    @pytest.mark.parametrize("bbox", [(10, 0, 5, 1), (-91, 0, 0, 1), (0, 0, 1, 181)])
+    def test_bbox_invalido(self, bbox):
+        with pytest.raises(ValueError):
+            Viewport.from_bbox(*bbox)
+
+    def test_raio_invalido(self):
+        with pytest.raises(ValueError):
+            Viewport.from_radius(0, 0, 0)
+
+
+class TestInterestIndex:
+    def test_so_quem_contem_a_posicao(self):
+        index = InterestIndex(cell_deg=0.05, max_cells=400)
+        index.add("sp", Viewport.from_bbox(-24.0, -47.0, -23.0, -46.0))
+        index.add("rio", Viewport.from_radius(-22.9, -43.2, 5000))
+        index.add("todos", None)
+
+        assert sorted(index.receivers(-23.5, -46.6)) == ["sp", "todos"]
+        assert sorted(index.receivers(-22.9, -43.2)) == ["rio", "todos"]
+        assert list(index.receivers(40.0, 40.0)) == ["todos"]
+
+    def test_viewport_grande_vai_para_a_lista_larga(self):
+        index = InterestIndex(cell_deg=0.05, max_cells=10)
+        index.add("mundo", Viewport.from_bbox(-90, -180, 90, 180))
+        assert index.grid == {} and "mundo" in index.wide
+        assert list(index.receivers(12.0, 34.0)) == ["mundo"]
+
+    def test_reposicionar_e_remover_limpa_as_celulas(self):
+        index = InterestIndex(cell_deg=0.05, max_cells=400)
+        index.add("a", Viewport.from_bbox(0, 0, 0.1, 0.1))
+        index.add("a", Viewport.from_bbox(10, 10, 10.1, 10.1))
+        assert list(index.receivers(0.05, 0.05)) == []
+        assert list(index.receivers(10.05, 10.05)) == ["a"]
+
+        index.remove("a")
+        assert index.grid == {} and len(index) == 0
+
+    def test_custo_acompanha_os_interessados(self):
+        # 10 mil conexões espalhadas: uma posição só toca a célula onde caiu
+        index = InterestIndex(cell_deg=0.05, max_cells=400)
+        for i in range(10_000):
+            lat = -30 + (i % 100) * 0.2
+            lng = -60 + (i // 100) * 0.2
+            index.add(i, Viewport.from_bbox(lat, lng, lat + 0.01, lng + 0.01))
+        cell = index.grid[(-600, -1200)]
+        assert len(cell) == 1
+        assert list(index.receivers(-29.995, -59.995)) == [0]
@@ -0,0 +1,227 @@
+"""
+Testes unitários de app/core/ws_manager.py
+
+Coberturas:
+  - broadcast entrega a todas as conexões do grupo
+  - frames prioritários (SOS) passam à frente dos frames normais na fila
+  - limite de frames normais pendentes descarta os mais antigos
+  - conexão que falha no envio é removida do grupo
+  - heartbeat: pings periódicos, pongs consumidos, socket ocioso fechado
+  - drain: reconexão com atraso sorteado, 1012 e novas conexões recusadas
+  - viewport: broadcast com posição só chega a quem a tem na área de interesse
+"""
+import asyncio
+
+import pytest
+from fastapi import WebSocketDisconnect, WebSocketException
+
+from app.core.ws_interest import Viewport
+from app.core.ws_manager import WS_CLOSE_IDLE, WS_CLOSE_SERVICE_RESTART, ConnectionManager
+
+
+class FakeWebSocket:
+    """WebSocket mínimo: registra os frames e permite travar o envio."""
+
+    def __init__(self, fail: bool = False) -> None:
+        self.sent: list[dict] = []
+        self.fail = fail
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.incoming: asyncio.Queue[dict] = asyncio.Queue()
+        self.close_code: int | None = None
+
+    async def accept(self) -> None:
+        pass
+
+    async def receive_json(self) -> dict:
+        return await self.incoming.get()
+
+    async def close(self, code: int = 1000) -> None:
+        self.close_code = code
+
+    async def send_json(self, data: dict) -> None:
+        await self.gate.wait()
+        if self.fail:
+            raise RuntimeError("conexão perdida")
+        self.sent.append(data)
+
+
+async def _until(condition, timeout: float = 1.0) -> None:
+    async def _wait():
+        while not condition():
+            await asyncio.sleep(0)
+    await asyncio.wait_for(_wait(), timeout)
+
+
+async def _close_all(manager: ConnectionManager) -> None:
+    for group_id, connections in list(manager.active.items()):
+        for ws in list(connections):
+            manager.disconnect(group_id, ws)
+    await asyncio.sleep(0)  # deixa as tasks de envio canceladas terminarem
+
+
+class TestConnectionManager:
+    async def test_broadcast_entrega_a_todos_do_grupo(self):
+        manager = ConnectionManager()
+        a, b, outro = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        await manager.connect("g1", a)
+        await manager.connect("g1", b)
+        await manager.connect("g2", outro)
+
+        await manager.broadcast("g1", {"n": 1})
+        await _until(lambda: a.sent and b.sent)
+
+        assert a.sent == b.sent == [{"n": 1}]
+        assert outro.sent == []
+        await _close_all(manager)
+
+    async def test_prioritario_fura_a_fila(self):
+        manager = ConnectionManager()
+        ws = FakeWebSocket()
+        ws.gate.clear()
+        await manager.connect("g", ws)
+
+        for n in range(3):
+            await manager.broadcast("g", {"n": n})
+        await asyncio.sleep(0)  # writer pega o primeiro frame e trava no envio
+        await manager.broadcast("g", {"type": "sos"}, priority=True)
+        ws.gate.set()
+        await _until(lambda: len(ws.sent) == 4)
+
+        assert ws.sent == [{"n": 0}, {"type": "sos"}, {"n": 1}, {"n": 2}]
+        await _close_all(manager)
+
+    async def test_limite_de_pendentes_descarta_os_mais_antigos(self):
+        manager = ConnectionManager(max_pending=2)
+        ws = FakeWebSocket()
+        ws.gate.clear()
+        await manager.connect("g", ws)
+
+        await manager.broadcast("g", {"n": 0})
+        await asyncio.sleep(0)
+        for n in range(1, 5):
+            await manager.broadcast("g", {"n": n})
+        ws.gate.set()
+        await _until(lambda: len(ws.sent) == 3)
+        await asyncio.sleep(0)
+
+        assert ws.sent == [{"n": 0}, {"n": 3}, {"n": 4}]
+        await _close_all(manager)
+
+    async def test_conexao_com_falha_e_removida(self):
+        manager = ConnectionManager()
+        ws = FakeWebSocket(fail=True)
+        await manager.connect("g", ws)
+
+        await manager.broadcast("g", {"n": 1})
+        await _until(lambda: "g" not in manager.active)
+
+
+class TestViewport:
+    async def test_posicao_so_para_quem_esta_olhando(self):
+        manager = ConnectionManager()
+        sp, rio, todos = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        for ws in (sp, rio, todos):
+            await manager.connect("g", ws)
+        manager.set_viewport(sp, Viewport.from_bbox(-24.0, -47.0, -23.0, -46.0))
+        manager.set_viewport(rio, Viewport.from_radius(-22.9, -43.2, 5000))
+
+        await manager.broadcast("g", {"n": 1}, at=(-23.5, -46.6))
+        await manager.broadcast("g", {"type": "sos"}, priority=True)
+        await _until(lambda: len(todos.sent) == 2)
+
+        assert sp.sent == [{"type": "sos"}, {"n": 1}]
+        assert rio.sent == [{"type": "sos"}]
+        assert len(todos.sent) == 2
+        await _close_all(manager)
+
+    async def test_viewport_vale_para_grupos_assinados_depois(self):
+        manager = ConnectionManager()
+        ws = FakeWebSocket()
+        await manager.connect("g1", ws)
+        manager.set_viewport(ws, Viewport.from_bbox(0, 0, 1, 1))
+        manager.subscribe("g2", ws)
+
+        await manager.broadcast("g2", {"n": "fora"}, at=(10.0, 10.0))
+        await manager.broadcast("g2", {"n": "dentro"}, at=(0.5, 0.5))
+        await _until(lambda: ws.sent)
+        assert ws.sent == [{"n": "dentro"}]
+
+        manager.set_viewport(ws, None)
+        await manager.broadcast("g2", {"n": "fora"}, at=(10.0, 10.0))
+        await _until(lambda: len(ws.sent) == 2)
+        await _close_all(manager)
+
+    async def test_saida_do_grupo_limpa_o_indice(self):
+        manager = ConnectionManager()
+        ws = FakeWebSocket()
+        await manager.connect("g", ws)
+        manager.set_viewport(ws, Viewport.from_bbox(0, 0, 1, 1))
+        manager.close(ws)
+        assert manager._interest == {}
+
+
+class TestHeartbeat:
+    async def test_ping_periodico(self):
+        manager = ConnectionManager(ping_interval=0.01)
+        ws = FakeWebSocket()
+        await manager.connect("g", ws)
+
+        await _until(lambda: len(ws.sent) >= 2)
+        assert all(frame["type"] == "ping" for frame in ws.sent)
+        await _close_all(manager)
+
+    async def test_pong_nao_chega_ao_endpoint(self):
+        manager = ConnectionManager(idle_timeout=1)
+        ws = FakeWebSocket()
+        await manager.connect("g", ws)
+        ws.incoming.put_nowait({"type": "pong"})
+        ws.incoming.put_nowait({"lat": 1, "lng": 2})
+
+        assert await manager.receive_json(ws) == {"lat": 1, "lng": 2}
+        await _close_all(manager)
+
+    async def test_socket_ocioso_e_fechado(self):
+        manager = ConnectionManager(idle_timeout=0.05)
+        ws = FakeWebSocket()
+        await manager.connect("g", ws)
+
+        with pytest.raises(WebSocketDisconnect):
+            await manager.receive_json(ws)
+        assert ws.close_code == WS_CLOSE_IDLE
+        await _close_all(manager)
+
+
+class TestDrain:
+    async def test_drain_pede_reconexao_com_jitter(self):
+        manager = ConnectionManager()
+        sockets = [FakeWebSocket() for _ in range(20)]
+        for ws in sockets:
+            await manager.connect("g", ws)
+
+        assert await manager.drain(base_ms=1000, jitter_ms=5000) == 20
+
+        delays = set()
+        for ws in sockets:
+            assert ws.sent[-1]["type"] == "reconnect"
+            assert 1000 <= ws.sent[-1]["retry_after_ms"] <= 6000
+            assert ws.close_code == WS_CLOSE_SERVICE_RESTART
+            delays.add(ws.sent[-1]["retry_after_ms"])
+        assert len(delays) > 1  # clientes não voltam todos juntos
+        assert manager.active == {}
+
+    async def test_drain_recusa_novas_conexoes(self):
+        manager = ConnectionManager()
+        await manager.drain()
+        with pytest.raises(WebSocketException) as exc:
+            await manager.connect("g", FakeWebSocket())
+        assert exc.value.code == WS_CLOSE_SERVICE_RESTART
+
+    async def test_cliente_travado_nao_segura_o_drain(self):
+        manager = ConnectionManager()
+        ws = FakeWebSocket()
+        ws.gate.clear()  # send_json nunca retorna
+        await manager.connect("g", ws)
+
+        assert await asyncio.wait_for(manager.drain(timeout=0.05), 1) == 1
+        assert manager.active == {}